@@ -0,0 +1,3 @@
+"""
+性能測定用のスクリプト
+"""
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Flask（スレッド）と ASGI（非同期）の /api/combinations の同時処理性能の比較
+
+DB の読み込みに latency 秒かかるリポジトリ（カタログなし、毎回 DB から読み込む構成）で、
+concurrency 件の同時リクエストを処理したときのスループットと遅延を比較する：
+- flask: threads 個のスレッド（gunicorn の gthread ワーカーに相当）で Flask アプリを実行する
+- asgi: 1つのイベントループで ASGI アプリを実行する（DB は非同期に待ち、選択は
+  ASYNC_SELECTION_WORKERS 個のスレッドで実行する）
+
+HTTP サーバーは介さず、アプリケーションを直接呼び出す。
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.bench_async [--videos 10000] [--latency 0.02] [--concurrency 8 64 256]
+        [--threads 8] [--requests 512]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from unittest.mock import patch
+
+from src.jaljalgotcha import main as flask_main
+from src.jaljalgotcha.asgi import CombinationsApp
+from src.jaljalgotcha.config import ASYNC_SELECTION_WORKERS
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.interfaces import AsyncVideoRepository, VideoRepository
+from src.jaljalgotcha.services.async_video_service import AsyncVideoService
+from src.jaljalgotcha.services.video_service import VideoService
+
+from .synthetic import synthetic_videos
+
+URL = '/api/combinations'
+QUERY = 'duration=60&attempts=3'
+
+
+class SlowRepository(VideoRepository):
+    """DB の読み込みに latency 秒かかる同期のリポジトリ"""
+
+    def __init__(self, videos: List[Video], latency: float):
+        self.videos = videos
+        self.latency = latency
+
+    def get_videos(self, filters=None) -> List[Video]:
+        time.sleep(self.latency)
+        return self.videos
+
+
+class AsyncSlowRepository(AsyncVideoRepository):
+    """DB の読み込みに latency 秒かかる非同期のリポジトリ"""
+
+    def __init__(self, videos: List[Video], latency: float):
+        self.videos = videos
+        self.latency = latency
+
+    async def get_videos(self, filters=None) -> List[Video]:
+        await asyncio.sleep(self.latency)
+        return self.videos
+
+
+def summarize(name: str, concurrency: int, elapsed: float, latencies: List[float]) -> None:
+    """スループットと遅延を表示する"""
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {name:<6} concurrency={concurrency:<5} {len(latencies) / elapsed:8.1f} req/s"
+          f"  p50 {statistics.median(latencies) * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms")
+
+
+def run_flask(videos: List[Video], latency: float, threads: int, concurrency: int, requests: int) -> None:
+    """Flask アプリを threads 個のスレッドで実行する（同時リクエストはスレッドの空きを待つ）"""
+    service = VideoService(SlowRepository(videos, latency))
+    app = flask_main.create_app()
+
+    def request(submitted: float) -> float:
+        with app.test_client() as client:
+            response = client.get(f'{URL}?{QUERY}')
+            assert response.status_code == 200
+        return time.perf_counter() - submitted
+
+    with patch.object(flask_main, 'get_db_video_service', lambda: service), \
+            ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        latencies = []
+        # concurrency 件ずつ同時に送る
+        for offset in range(0, requests, concurrency):
+            submitted = time.perf_counter()
+            futures = [executor.submit(request, submitted) for _ in range(min(concurrency, requests - offset))]
+            latencies.extend(future.result() for future in futures)
+        summarize('flask', concurrency, time.perf_counter() - start, latencies)
+
+
+def run_asgi(videos: List[Video], latency: float, concurrency: int, requests: int,
+             workers: Optional[int] = None) -> None:
+    """ASGI アプリを1つのイベントループで実行する"""
+    service = AsyncVideoService(
+        VideoService(SlowRepository(videos, latency)),
+        async_repository=AsyncSlowRepository(videos, latency),
+        max_workers=workers or ASYNC_SELECTION_WORKERS,
+    )
+    app = CombinationsApp(lambda: service)
+    scope = {'type': 'http', 'method': 'GET', 'path': URL, 'query_string': QUERY.encode(), 'headers': []}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def request(submitted: float) -> float:
+        statuses = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        await app(scope, receive, send)
+        assert statuses == [200]
+        return time.perf_counter() - submitted
+
+    async def run() -> None:
+        start = time.perf_counter()
+        latencies = []
+        for offset in range(0, requests, concurrency):
+            submitted = time.perf_counter()
+            latencies.extend(await asyncio.gather(
+                *(request(submitted) for _ in range(min(concurrency, requests - offset)))
+            ))
+        summarize('asgi', concurrency, time.perf_counter() - start, latencies)
+
+    try:
+        asyncio.run(run())
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask と ASGI の同時処理性能を比較する')
+    parser.add_argument('--videos', type=int, default=10000, help='動画の件数')
+    parser.add_argument('--latency', type=float, default=0.02, help='DB の読み込みにかかる時間（秒）')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 64, 256], help='同時リクエスト数')
+    parser.add_argument('--threads', type=int, default=8, help='Flask のスレッド数')
+    parser.add_argument('--requests', type=int, default=512, help='リクエスト数')
+    args = parser.parse_args()
+
+    videos = synthetic_videos(args.videos)
+    print(f"videos={args.videos} latency={args.latency * 1000:.0f}ms threads={args.threads}"
+          f" selection_workers={ASYNC_SELECTION_WORKERS} requests={args.requests}")
+    for concurrency in args.concurrency:
+        run_flask(videos, args.latency, args.threads, concurrency, args.requests)
+        run_asgi(videos, args.latency, concurrency, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+DbVideoRepository.get_videos の読み込み経路の性能測定
+
+SQLite の一時データベースに動画を用意し、以下を比較する：
+- orm: VideoModel を ORM で読み込み getattr で Video に変換する（従来の実装）
+- projected: 必要な列のみを選択し、Video の型変換を行う
+- trusted: 必要な列のみを選択し、Video の型変換を省略する（既定）
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.bench_get_videos [--rows 10000 100000] [--repeat 5]
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.jaljalgotcha.db.models_db import Base, VideoModel
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+
+
+def populate(engine, rows: int, seed: int = 0) -> None:
+    """ランダムな動画を rows 件保存する"""
+    rng = random.Random(seed)
+    repository = DbVideoRepository(MagicMock(), db_engine=engine)
+    repository.upsert_videos([
+        VideoModel(
+            video_id=f"video{i:07d}",
+            channel_id="channel",
+            title=f"動画タイトル {i}",
+            duration_seconds=rng.randint(30, 1800),
+            view_count=rng.randint(0, 10 ** 6),
+            like_count=rng.randint(0, 10 ** 4),
+            comment_count=rng.randint(0, 10 ** 3),
+            thumbnail_url=f"https://i.ytimg.com/vi/video{i:07d}/default.jpg",
+            published_at=datetime(2020, 1, 1),
+            updated_at=datetime(2024, 1, 1)
+        )
+        for i in range(rows)
+    ], chunk_size=2000)
+
+
+def read_with_orm(engine):
+    """従来の実装と同じく ORM のインスタンスから Video を作成する"""
+    with Session(engine) as session:
+        return [
+            Video(
+                id=getattr(db_video, 'video_id'),
+                title=getattr(db_video, 'title'),
+                duration=getattr(db_video, 'duration_seconds'),
+                url=f"https://www.youtube.com/watch?v={db_video.video_id}",
+                thumbnail_url=getattr(db_video, 'thumbnail_url', None)
+            )
+            for db_video in session.query(VideoModel).order_by(VideoModel.duration_seconds).all()
+        ]
+
+
+def best_time(func, repeat: int) -> float:
+    """repeat 回実行した中で最短の実行時間（秒）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='get_videos の読み込み経路の性能を測定する')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='動画の件数')
+    parser.add_argument('--repeat', type=int, default=5, help='繰り返し回数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            engine = create_engine(f"sqlite:///{Path(directory) / f'videos_{rows}.db'}")
+            Base.metadata.create_all(bind=engine)
+            populate(engine, rows)
+
+            projected = DbVideoRepository(MagicMock(), db_engine=engine, trust_rows=False)
+            trusted = DbVideoRepository(MagicMock(), db_engine=engine)
+            results = {
+                'orm': best_time(lambda: read_with_orm(engine), args.repeat),
+                'projected': best_time(projected.get_videos, args.repeat),
+                'trusted': best_time(trusted.get_videos, args.repeat),
+            }
+
+            baseline = results['orm']
+            print(f"rows={rows}")
+            for name, seconds in results.items():
+                print(f"  {name:<10} {seconds * 1000:9.1f} ms  x{baseline / seconds:.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
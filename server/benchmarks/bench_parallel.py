@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+組み合わせの並列生成（ParallelSelector）のワーカー数ごとのスループットの比較
+
+合成カタログから attempts 個の組み合わせを生成する時間を、1つのプロセスでの生成
+（DurationIndex.select_many と並べ替え）とワーカー数ごとの並列生成で比較する。
+並列生成はプロセスプールの起動と共有メモリの作成を除くため、1回実行してから計測する。
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.bench_parallel [--videos 100000] [--attempts 20000] [--workers 1 2 4]
+        [--batch-size 1000] [--repeat 3]
+"""
+import argparse
+import os
+import time
+from operator import attrgetter
+
+from src.jaljalgotcha.selection.index import DurationIndex
+from src.jaljalgotcha.selection.parallel import DEFAULT_BATCH_SIZE, ParallelSelector
+
+from .synthetic import synthetic_durations
+
+TARGET_DURATION = 3600
+
+
+def best_of(repeat: int, run) -> float:
+    """repeat 回実行した最短の時間（秒）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='組み合わせの並列生成のスループットを比較する')
+    parser.add_argument('--videos', type=int, default=100000, help='動画の件数')
+    parser.add_argument('--attempts', type=int, default=20000, help='生成する組み合わせの数')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='ワーカープロセスの数')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='1つのタスクの組み合わせの数')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の繰り返し回数')
+    args = parser.parse_args()
+
+    durations = synthetic_durations(args.videos)
+    print(f"videos={args.videos} attempts={args.attempts} batch_size={args.batch_size} cpus={os.cpu_count()}")
+
+    index = DurationIndex(durations)
+    serial = best_of(args.repeat, lambda: sorted(
+        index.select_many(TARGET_DURATION, args.attempts), key=attrgetter('remaining_time')
+    ))
+    print(f"  serial     {args.attempts / serial:10.0f} combinations/s")
+
+    for workers in args.workers:
+        selector = ParallelSelector(workers, batch_size=args.batch_size)
+        try:
+            # プロセスプールの起動とワーカーでのインデックスの作成を計測から除く
+            selector.select_many(1, durations, TARGET_DURATION, args.batch_size * workers)
+            elapsed = best_of(args.repeat, lambda: selector.select_many(
+                1, durations, TARGET_DURATION, args.attempts
+            ))
+        finally:
+            selector.close()
+        print(f"  workers={workers:<3} {args.attempts / elapsed:10.0f} combinations/s"
+              f"  ({serial / elapsed:.2f}x serial)")
+
+
+if __name__ == "__main__":
+    main()
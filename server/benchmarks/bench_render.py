@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+/api/combinations のレスポンス生成の性能測定
+
+以下を比較する（どちらも同じバイト列を出力することを確認する）：
+- jsonify: video_collection_to_dict で辞書を作り jsonify で変換する（従来の実装）
+- fragments: CombinationRenderer でキャッシュした動画ごとの JSON 断片から組み立てる
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.bench_render [--videos 10000] [--attempts 10 100 1000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from flask import Flask, jsonify
+
+from src.jaljalgotcha.models import VideoTable
+from src.jaljalgotcha.serialization import CombinationRenderer, orjson
+from src.jaljalgotcha.utils import video_collection_to_dict
+from src.jaljalgotcha.video import build_duration_index, selection_to_collection
+
+
+def make_table(videos: int, seed: int = 0) -> VideoTable:
+    """ランダムな動画の一覧"""
+    rng = random.Random(seed)
+    return VideoTable.from_rows(
+        (f"v{i:010d}", f"動画タイトル {i}", rng.randint(30, 1800), f"https://i.ytimg.com/vi/v{i:010d}/default.jpg")
+        for i in range(videos)
+    )
+
+
+def best_time(func, repeat: int) -> float:
+    """repeat 回実行した中で最短の実行時間（秒）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='組み合わせのレスポンス生成の性能を測定する')
+    parser.add_argument('--videos', type=int, default=10000, help='カタログの動画の件数')
+    parser.add_argument('--attempts', type=int, nargs='+', default=[10, 100, 1000], help='組み合わせの数')
+    parser.add_argument('--target', type=int, default=3600, help='目標時間（秒）')
+    parser.add_argument('--repeat', type=int, default=5, help='繰り返し回数')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    table = make_table(args.videos)
+    index = build_duration_index(table)
+    print(f"videos={args.videos} target={args.target}s backend={'orjson' if orjson else 'json'}")
+
+    with app.app_context():
+        for attempts in args.attempts:
+            combinations = [
+                selection_to_collection(table, selection)
+                for selection in index.select_many(args.target, attempts, rng=random.Random(attempts))
+            ]
+            renderer = CombinationRenderer()
+
+            def render_jsonify():
+                return jsonify([video_collection_to_dict(combo) for combo in combinations]).get_data()
+
+            def render_fragments():
+                return app.response_class(renderer.render(combinations, 1), mimetype='application/json').get_data()
+
+            # 1回目で断片をキャッシュし、出力が一致することを確認する
+            assert render_fragments() == render_jsonify()
+
+            baseline = best_time(render_jsonify, args.repeat)
+            fragments = best_time(render_fragments, args.repeat)
+            print(f"  attempts={attempts:<5} jsonify {baseline * 1000:8.2f} ms"
+                  f"  fragments {fragments * 1000:8.2f} ms  x{baseline / fragments:.1f}")
+
+
+if __name__ == "__main__":
+    main()
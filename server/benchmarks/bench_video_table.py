@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+動画カタログの表現ごとのメモリ使用量と構築時間の測定
+
+DB から読み込んだ行（文字列は行ごとに新しく作られる）から以下を構築して比較する：
+- videos: Video のリスト（従来のカタログ）
+- table: VideoTable（列指向、Video は参照時にのみ作成）
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.bench_video_table [--rows 10000 100000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from src.jaljalgotcha.models import WATCH_URL, Video, VideoTable
+
+
+def iter_rows(rows: int, seed: int = 0):
+    """DB から読み込んだ行と同じ形式のランダムな行"""
+    rng = random.Random(seed)
+    for i in range(rows):
+        video_id = f"v{i:010d}"
+        yield (video_id, f"動画タイトル {i} {'あ' * rng.randint(5, 40)}", rng.randint(30, 1800),
+               f"https://i.ytimg.com/vi/{video_id}/default.jpg")
+
+
+def build_videos(rows):
+    """行ごとに Video を作成する"""
+    return [
+        Video.from_trusted(video_id, title, duration, WATCH_URL + video_id, thumbnail_url)
+        for video_id, title, duration, thumbnail_url in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='動画カタログの表現ごとのメモリ使用量と構築時間を測定する')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='動画の件数')
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        print(f"rows={rows}")
+        for name, build in (('videos', build_videos), ('table', VideoTable.from_rows)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            catalog = build(iter_rows(rows))
+            elapsed = time.perf_counter() - start
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {name:<7} build {elapsed * 1000:8.1f} ms  retained {size / 2 ** 20:7.1f} MiB")
+            del catalog
+
+
+if __name__ == "__main__":
+    main()
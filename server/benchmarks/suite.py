@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+性能測定スイート
+
+合成カタログ（benchmarks/synthetic.py）に対して、選択処理・リポジトリの読み込み・
+レスポンスの変換を測定し、結果を JSON に書き出す。基準の結果を指定した場合は
+ケースごとに中央値を比較し、しきい値を超えて遅くなったものを回帰として表示する。
+
+実行方法（server ディレクトリで）:
+    python -m benchmarks.suite [--sizes 1000 10000 100000 1000000] [--db-sizes 1000 10000 100000]
+        [--output benchmarks/results.json] [--baseline benchmarks/baseline.json] [--threshold 1.25]
+        [--fail-on-regression]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from unittest.mock import MagicMock
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine
+
+from src.jaljalgotcha.db.models_db import Base
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+from src.jaljalgotcha.selection.best_fit import find_best_fit_selections
+from src.jaljalgotcha.serialization import CombinationRenderer
+from src.jaljalgotcha.services.video_service import VideoService
+from src.jaljalgotcha.utils import video_collection_to_dict
+from src.jaljalgotcha.video import build_duration_index, get_video_combinations, selection_to_collection
+
+from .synthetic import synthetic_table, synthetic_video_models, synthetic_videos
+
+# 結果の形式のバージョン（互換性のない変更をしたら増やす）
+RESULT_FORMAT = 1
+# 選択処理の目標時間（秒）
+TARGET_DURATION = 3600
+# レスポンス変換で使用する組み合わせの数
+RENDER_ATTEMPTS = 100
+
+
+class Case:
+    """1つの測定ケース（名前、カタログの件数、測定する関数）"""
+
+    def __init__(self, name: str, size: int, func: Callable[[], Any], repeat: int):
+        self.name = name
+        self.size = size
+        self.func = func
+        self.repeat = repeat
+
+    def run(self) -> Dict[str, Any]:
+        """repeat 回実行し、実行時間（秒）の中央値と最小値を返す"""
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            self.func()
+            times.append(time.perf_counter() - start)
+        return {
+            "name": self.name,
+            "size": self.size,
+            "repeat": self.repeat,
+            "median_s": statistics.median(times),
+            "min_s": min(times),
+        }
+
+
+def repeat_for(size: int) -> int:
+    """カタログの大きさに応じた繰り返し回数"""
+    return 3 if size >= 1_000_000 else 5 if size >= 100_000 else 10
+
+
+def selection_cases(sizes: Iterable[int], seed: int) -> Iterable[Case]:
+    """選択処理のケース"""
+    for size in sizes:
+        videos = synthetic_videos(size, seed)
+        table = synthetic_table(size, seed)
+        index = build_duration_index(table)
+        service = VideoService(MagicMock(spec=VideoRepository))
+        rng = random.Random(seed)
+        repeat = repeat_for(size)
+
+        yield Case("selection.service_select_videos", size,
+                   lambda: service._select_videos(videos, TARGET_DURATION), repeat)
+        yield Case("selection.get_video_combinations", size,
+                   lambda: get_video_combinations(table, TARGET_DURATION, attempts=3), repeat)
+        yield Case("selection.build_duration_index", size, lambda: build_duration_index(table), repeat)
+        yield Case("selection.index_select_many", size,
+                   lambda: index.select_many(TARGET_DURATION, 100, rng=rng), repeat)
+        yield Case("selection.best_fit", size,
+                   lambda: find_best_fit_selections(table.durations, TARGET_DURATION, 3, 10.0, rng=rng), repeat)
+        if size <= 100_000:
+            # NumPy の一括生成は候補数 × 動画数に比例するため大きなカタログでは測定しない
+            from src.jaljalgotcha.selection.batch import generate_best_selections
+            yield Case("selection.batch_1000_candidates", size,
+                       lambda: generate_best_selections(table.durations, TARGET_DURATION, 3, 1000), repeat)
+
+
+def repository_cases(sizes: Iterable[int], seed: int, directory: Path) -> Iterable[Case]:
+    """SQLite を使用したリポジトリのケース"""
+    for size in sizes:
+        engine = create_engine(f"sqlite:///{directory / f'videos_{size}.db'}")
+        Base.metadata.create_all(bind=engine)
+        repository = DbVideoRepository(MagicMock(), db_engine=engine)
+        models = list(synthetic_video_models(size, seed))
+        repeat = repeat_for(size * 10)
+
+        yield Case("repository.upsert_insert", size, lambda: repository.upsert_videos(models), 1)
+        yield Case("repository.upsert_unchanged", size, lambda: repository.upsert_videos(models), repeat)
+        yield Case("repository.get_videos", size, repository.get_videos, repeat)
+        yield Case("repository.get_video_table", size, repository.get_video_table, repeat)
+        yield Case("repository.get_videos_filtered", size,
+                   lambda: repository.get_videos({'max_duration': 600, 'order_by': 'views', 'order_dir': 'desc'}),
+                   repeat)
+
+
+def serialization_cases(sizes: Iterable[int], seed: int, app: Flask) -> Iterable[Case]:
+    """レスポンス変換のケース"""
+    for size in sizes:
+        table = synthetic_table(size, seed)
+        index = build_duration_index(table)
+        combinations = [
+            selection_to_collection(table, selection)
+            for selection in index.select_many(TARGET_DURATION, RENDER_ATTEMPTS, rng=random.Random(seed))
+        ]
+        renderer = CombinationRenderer()
+        repeat = 20
+
+        def render_jsonify():
+            with app.app_context():
+                return jsonify([video_collection_to_dict(combo) for combo in combinations]).get_data()
+
+        yield Case("serialization.video_collection_to_dict", size,
+                   lambda: [video_collection_to_dict(combo) for combo in combinations], repeat)
+        yield Case("serialization.jsonify", size, render_jsonify, repeat)
+        yield Case("serialization.fragments", size, lambda: renderer.render(combinations, 1), repeat)
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any],
+            threshold: float) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    基準の結果と比較し、しきい値を超えて遅くなったケースを返す
+
+    Args:
+        results: 今回の結果
+        baseline: 基準の結果（load_results の戻り値）
+        threshold: 回帰とみなす中央値の比率
+
+    Returns:
+        (今回の結果, 基準に対する比率) のリスト
+    """
+    baseline_medians = {(result["name"], result["size"]): result["median_s"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        reference = baseline_medians.get((result["name"], result["size"]))
+        if reference:
+            ratio = result["median_s"] / reference
+            result["baseline_median_s"] = reference
+            result["ratio"] = ratio
+            if ratio > threshold:
+                regressions.append((result, ratio))
+    return regressions
+
+
+def load_results(path: Path) -> Optional[Dict[str, Any]]:
+    """結果の JSON を読み込む（存在しない場合は None）"""
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text())
+    if data.get("format") != RESULT_FORMAT:
+        raise ValueError(f"結果の形式が異なります: {path}")
+    return data
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """コマンドライン引数を解析する"""
+    benchmarks_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description='選択処理・リポジトリ・レスポンス変換の性能を測定する')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='選択処理とレスポンス変換のカタログの件数')
+    parser.add_argument('--db-sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='リポジトリのケースで SQLite に保存する件数')
+    parser.add_argument('--only', choices=['selection', 'repository', 'serialization'], nargs='+',
+                        help='実行するケースの種類（省略時はすべて）')
+    parser.add_argument('--seed', type=int, default=0, help='合成カタログの乱数のシード')
+    parser.add_argument('--output', type=Path, default=benchmarks_dir / 'results.json', help='結果の出力先')
+    parser.add_argument('--baseline', type=Path, default=benchmarks_dir / 'baseline.json', help='比較する基準の結果')
+    parser.add_argument('--threshold', type=float, default=1.25, help='回帰とみなす中央値の比率')
+    parser.add_argument('--fail-on-regression', action='store_true', help='回帰があれば終了コード1で終了する')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    groups = set(args.only or ['selection', 'repository', 'serialization'])
+    results = []
+
+    def run_all(cases: Iterable[Case]):
+        for case in cases:
+            result = case.run()
+            results.append(result)
+            print(f"{result['name']:<42} {result['size']:>9,}  median {result['median_s'] * 1000:10.2f} ms"
+                  f"  min {result['min_s'] * 1000:10.2f} ms", flush=True)
+
+    if 'selection' in groups:
+        run_all(selection_cases(args.sizes, args.seed))
+    if 'repository' in groups:
+        with tempfile.TemporaryDirectory() as directory:
+            run_all(repository_cases(args.db_sizes, args.seed, Path(directory)))
+    if 'serialization' in groups:
+        run_all(serialization_cases(args.sizes, args.seed, Flask(__name__)))
+
+    baseline = load_results(args.baseline)
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+
+    args.output.write_text(json.dumps({
+        "format": RESULT_FORMAT,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": results,
+    }, indent=2) + "\n")
+    print(f"\n結果を {args.output} に書き出しました")
+
+    if baseline is None:
+        print(f"基準の結果 {args.baseline} がないため比較しません")
+        return 0
+    if not regressions:
+        print(f"基準 {args.baseline} に対する回帰はありません（しきい値 x{args.threshold}）")
+        return 0
+
+    print(f"基準 {args.baseline} に対して遅くなったケース（しきい値 x{args.threshold}）:")
+    for result, ratio in regressions:
+        print(f"  {result['name']:<42} {result['size']:>9,}  x{ratio:.2f}"
+              f"  ({result['baseline_median_s'] * 1000:.2f} ms -> {result['median_s'] * 1000:.2f} ms)")
+    return 1 if args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
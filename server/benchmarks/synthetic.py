@@ -0,0 +1,96 @@
+"""
+性能測定用の合成動画カタログ
+
+同じ seed からは常に同じカタログを生成する。動画時間はコント動画を想定し、
+大半を中央値3分前後の対数正規分布、一部を10〜60分の長尺動画とする。
+"""
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from src.jaljalgotcha.db.models_db import VideoModel
+from src.jaljalgotcha.models import WATCH_URL, Video, VideoTable
+
+# 短尺動画の動画時間の中央値（秒）と対数の標準偏差
+SHORT_MEDIAN_SECONDS = 180
+SHORT_SIGMA = 0.5
+# 短尺動画の動画時間の範囲（秒）
+SHORT_MIN_SECONDS = 15
+SHORT_MAX_SECONDS = 1200
+# 長尺動画（総集編・ライブなど）の割合と動画時間の範囲（秒）
+LONG_RATIO = 0.05
+LONG_MIN_SECONDS = 600
+LONG_MAX_SECONDS = 3600
+
+Row = Tuple[str, str, int, str]
+
+
+def synthetic_durations(count: int, seed: int = 0) -> List[int]:
+    """
+    動画時間（秒）のリストを生成する
+
+    Args:
+        count: 動画の件数
+        seed: 乱数のシード
+
+    Returns:
+        動画時間のリスト
+    """
+    rng = random.Random(seed)
+    mu = math.log(SHORT_MEDIAN_SECONDS)
+    durations = []
+    for _ in range(count):
+        if rng.random() < LONG_RATIO:
+            durations.append(rng.randint(LONG_MIN_SECONDS, LONG_MAX_SECONDS))
+        else:
+            duration = int(rng.lognormvariate(mu, SHORT_SIGMA))
+            durations.append(min(max(duration, SHORT_MIN_SECONDS), SHORT_MAX_SECONDS))
+    return durations
+
+
+def synthetic_rows(count: int, seed: int = 0) -> Iterator[Row]:
+    """
+    DB から読み込んだ行と同じ形式（動画ID, タイトル, 動画時間, サムネイル URL）の行を生成する
+
+    Args:
+        count: 動画の件数
+        seed: 乱数のシード
+
+    Yields:
+        行
+    """
+    for i, duration in enumerate(synthetic_durations(count, seed)):
+        video_id = f"s{seed:02d}{i:09d}"
+        yield video_id, f"コント「ネタ{i}」", duration, f"https://i.ytimg.com/vi/{video_id}/default.jpg"
+
+
+def synthetic_videos(count: int, seed: int = 0) -> List[Video]:
+    """Video のリストを生成する"""
+    return [
+        Video.from_trusted(video_id, title, duration, WATCH_URL + video_id, thumbnail_url)
+        for video_id, title, duration, thumbnail_url in synthetic_rows(count, seed)
+    ]
+
+
+def synthetic_table(count: int, seed: int = 0) -> VideoTable:
+    """VideoTable を生成する"""
+    return VideoTable.from_rows(synthetic_rows(count, seed))
+
+
+def synthetic_video_models(count: int, seed: int = 0) -> Iterator[VideoModel]:
+    """DB に保存する VideoModel を生成する"""
+    rng = random.Random(seed + 1)
+    for video_id, title, duration, thumbnail_url in synthetic_rows(count, seed):
+        yield VideoModel(
+            video_id=video_id,
+            channel_id="synthetic",
+            title=title,
+            duration_seconds=duration,
+            view_count=rng.randint(0, 10 ** 6),
+            like_count=rng.randint(0, 10 ** 4),
+            comment_count=rng.randint(0, 10 ** 3),
+            thumbnail_url=thumbnail_url,
+            published_at=datetime(2020, 1, 1) + timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60)),
+            updated_at=datetime(2024, 1, 1)
+        )
@@ -13,6 +13,48 @@ CREATE TABLE videos (
 );
 
 -- よく使うカラムにインデックスを追加 (検索の高速化)
+-- 時間での絞り込み・並び替えはインデックスだけで読めるように読み込む列を含める
+CREATE INDEX idx_duration_covering ON videos (duration_seconds) INCLUDE (video_id, title, thumbnail_url, like_count, view_count);
 CREATE INDEX idx_like_count ON videos (like_count);
+CREATE INDEX idx_view_count ON videos (view_count);
+CREATE INDEX idx_published_at ON videos (published_at);
 CREATE INDEX idx_comment_count ON videos (comment_count);
-CREATE INDEX idx_duration_seconds ON videos (duration_seconds);
+CREATE INDEX idx_channel_updated_at ON videos (channel_id, updated_at);
+
+-- combination_pools テーブル定義（分単位の目標時間ごとの事前計算済み組み合わせ）
+CREATE TABLE combination_pools (
+    minutes INTEGER PRIMARY KEY,
+    catalog_fingerprint TEXT NOT NULL,
+    video_ids JSON NOT NULL,
+    created_at TIMESTAMP DEFAULT now()
+);
+
+-- sync_states テーブル定義（チャンネルごとの差分同期のウォーターマーク）
+CREATE TABLE sync_states (
+    channel_id TEXT PRIMARY KEY,
+    last_video_id TEXT,
+    last_published_at TIMESTAMP,
+    synced_at TIMESTAMP DEFAULT now()
+);
+
+-- catalog_versions テーブル定義（動画を追加・更新するたびに増えるカタログのバージョン）
+CREATE TABLE catalog_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT now()
+);
+INSERT INTO catalog_versions (name, version) VALUES ('videos', 0);
+
+-- schema_migrations テーブル定義（適用済みのマイグレーション、src/jaljalgotcha/db/migrations.py を参照）
+CREATE TABLE schema_migrations (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT now()
+);
+
+-- このファイルの定義はマイグレーション 4 までを適用した状態に相当する
+INSERT INTO schema_migrations (version, description) VALUES
+    (1, '初期のテーブル'),
+    (2, 'videos の絞り込み・並び替え用のインデックス'),
+    (3, 'カタログのバージョン'),
+    (4, '時間のインデックスにいいね数・再生数を含める');
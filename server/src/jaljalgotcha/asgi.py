@@ -0,0 +1,233 @@
+"""
+ASGI アプリケーション（非同期の /api/combinations）
+
+main.py の Flask アプリと同じパラメータ・レスポンスの /api/combinations を提供する。
+DB の読み込みは非同期で待ち、組み合わせの選択と JSON への変換はスレッドプールで実行するため、
+接続ごとにスレッドを使わずに多数のリクエストを同時に処理できる。
+
+フレームワークには依存しない。uvicorn などの ASGI サーバーで起動する:
+    uvicorn src.jaljalgotcha.asgi:app --workers 4
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from . import metrics
+from .params import NDJSON_MIMETYPE, missing_youtube_key_error, parse_combination_request
+from .serialization import CombinationRenderer, dumps
+from .services.async_video_service import AsyncVideoService
+
+JSON_MIMETYPE = 'application/json'
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def default_service_factory() -> AsyncVideoService:
+    """DB を使用する非同期ビデオサービスを取得する"""
+    from .db_integration import get_async_video_service
+    return get_async_video_service()
+
+
+def query_args(scope: Scope) -> Dict[str, str]:
+    """クエリ文字列を辞書にする（同じ名前が複数ある場合は Flask と同じく最初の値を使う）"""
+    args: Dict[str, str] = {}
+    for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+        args.setdefault(name, value)
+    return args
+
+
+class CombinationsApp:
+    """/api/combinations を提供する ASGI アプリケーション"""
+
+    def __init__(self, service_factory: Callable[[], AsyncVideoService] = default_service_factory,
+                 stream_chunk_size: int = 64):
+        """
+        初期化
+
+        Args:
+            service_factory: 非同期ビデオサービスを返す関数（最初のリクエストでスレッドから1回だけ呼ぶ）
+            stream_chunk_size: 逐次出力で1回のスレッドプールでの実行で生成する組み合わせの数
+        """
+        self.service_factory = service_factory
+        self.stream_chunk_size = stream_chunk_size
+        self.renderer = CombinationRenderer()
+        self._service: Optional[AsyncVideoService] = None
+        self._service_lock: Optional[asyncio.Lock] = None
+        self.routes = {
+            '/api/combinations': self.combinations,
+            '/api/catalog': self.catalog_status,
+            '/metrics': self.metrics_text,
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"対応していない種類の接続です: {scope['type']}")
+
+        started = time.perf_counter()
+        handler = self.routes.get(scope['path'])
+        if handler is None:
+            status = await self.send_json(send, 404, {"error": "Not Found"})
+        elif scope['method'] not in ('GET', 'HEAD'):
+            status = await self.send_json(send, 405, {"error": "Method Not Allowed"})
+        else:
+            try:
+                status = await handler(scope, send)
+            except Exception as e:
+                status = await self.send_json(send, 500, {"error": f"エラーが発生しました：{str(e)}"})
+        endpoint = scope['path'] if handler else 'unmatched'
+        metrics.REQUESTS.inc(endpoint=endpoint, status=status)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+    async def lifespan(self, receive: Receive, send: Send) -> None:
+        """起動・終了の通知を処理する（サービスは最初のリクエストで初期化する）"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._service is not None:
+                    self._service.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_service(self) -> AsyncVideoService:
+        """非同期ビデオサービスを取得する（初回は DB への接続を伴うためスレッドで初期化する）"""
+        if self._service is None:
+            if self._service_lock is None:
+                self._service_lock = asyncio.Lock()
+            async with self._service_lock:
+                if self._service is None:
+                    self._service = await asyncio.get_running_loop().run_in_executor(None, self.service_factory)
+        return self._service
+
+    async def combinations(self, scope: Scope, send: Send) -> int:
+        """
+        指定された時間に合う動画の組み合わせを取得するAPI（main.get_combinations と同じ）
+
+        Returns:
+            レスポンスのステータスコード
+        """
+        parse_started = time.perf_counter()
+        try:
+            params = parse_combination_request(query_args(scope))
+        except ValueError as e:
+            return await self.send_json(send, 400, {"error": str(e)})
+        metrics.COMBINATION_STAGE_SECONDS.observe(time.perf_counter() - parse_started, stage='parse')
+
+        service = await self.get_service()
+        if params.stream:
+            return await self.stream_combinations(send, service, params)
+
+        try:
+            combinations = await service.get_video_combinations(
+                params.target_duration, params.attempts, filters=params.filters, candidates=params.candidates,
+                mode=params.mode, weighting=params.weighting
+            )
+            catalog_version = await service.run(self.catalog_version, service)
+        except Exception as e:
+            return await self.send_json(send, 500, {"error": f"エラーが発生しました：{str(e)}"})
+        if params.top is not None:
+            combinations = combinations[:params.top]
+        if not combinations and params.use_youtube:
+            error = missing_youtube_key_error()
+            if error:
+                return await self.send_json(send, 500, error)
+
+        body = await service.run(self.render, combinations, catalog_version)
+        return await self.send_body(send, 200, body, JSON_MIMETYPE)
+
+    @staticmethod
+    def catalog_version(service: AsyncVideoService) -> Optional[int]:
+        """
+        カタログのバージョン（断片のキャッシュに使用する）
+
+        カタログが未読み込みの場合は DB から読み込むため、イベントループではなくプールで呼ぶ
+        """
+        return service.catalog.snapshot.version if service.catalog else None
+
+    def render(self, combinations, catalog_version: Optional[int]) -> str:
+        """組み合わせを JSON にする（スレッドプールで実行する）"""
+        with metrics.COMBINATION_STAGE_SECONDS.time(stage='serialize'):
+            return self.renderer.render(combinations, catalog_version)
+
+    async def stream_combinations(self, send: Send, service: AsyncVideoService, params) -> int:
+        """
+        組み合わせを生成した順に NDJSON で逐次返す
+
+        動画一覧の取得と最初のまとまりの生成はレスポンスを始める前に行い、失敗した場合は 500 を返す
+
+        Returns:
+            レスポンスのステータスコード
+        """
+        chunks = service.iter_video_combination_chunks(
+            params.target_duration, params.attempts, filters=params.filters, candidates=params.candidates,
+            mode=params.mode, top=params.top, weighting=params.weighting, chunk_size=self.stream_chunk_size
+        )
+        try:
+            first = await anext(chunks, [])
+            catalog_version = await service.run(self.catalog_version, service)
+        except Exception as e:
+            return await self.send_json(send, 500, {"error": f"エラーが発生しました：{str(e)}"})
+
+        await send({
+            'type': 'http.response.start', 'status': 200,
+            'headers': [(b'content-type', NDJSON_MIMETYPE.encode()), *self.cors_headers()],
+        })
+        chunk = first
+        try:
+            while chunk:
+                lines = await service.run(self.render_lines, chunk, catalog_version)
+                await send({'type': 'http.response.body', 'body': lines.encode(), 'more_body': True})
+                chunk = await anext(chunks, [])
+        except Exception as e:
+            error = dumps({"error": f"エラーが発生しました：{str(e)}"}) + '\n'
+            await send({'type': 'http.response.body', 'body': error.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+        return 200
+
+    def render_lines(self, combinations, catalog_version: Optional[int]) -> str:
+        """組み合わせを NDJSON の行にする（スレッドプールで実行する）"""
+        with metrics.COMBINATION_STAGE_SECONDS.time(stage='serialize'):
+            return ''.join(line + '\n' for line in self.renderer.iter_render(combinations, catalog_version))
+
+    async def catalog_status(self, scope: Scope, send: Send) -> int:
+        """インメモリ動画カタログの状態を取得するAPI（main.get_catalog_status と同じ）"""
+        service = await self.get_service()
+        if not service.catalog:
+            return await self.send_json(send, 200, {"loaded": False})
+        return await self.send_json(send, 200, service.catalog.status())
+
+    async def metrics_text(self, scope: Scope, send: Send) -> int:
+        """計測値を Prometheus のテキスト形式で取得するAPI"""
+        return await self.send_body(send, 200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+
+    @staticmethod
+    def cors_headers() -> Iterable[Tuple[bytes, bytes]]:
+        """API のレスポンスに付ける CORS のヘッダー（main.py の CORS 設定と同じ）"""
+        return [(b'access-control-allow-origin', b'*')]
+
+    async def send_json(self, send: Send, status: int, data: Any) -> int:
+        """jsonify と同じ形式の JSON を返す"""
+        return await self.send_body(send, status, dumps(data) + '\n', JSON_MIMETYPE)
+
+    async def send_body(self, send: Send, status: int, body: str, content_type: str) -> int:
+        """レスポンスを返す"""
+        payload = body.encode()
+        headers: List[Tuple[bytes, bytes]] = [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(payload)).encode()),
+            *self.cors_headers(),
+        ]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+        return status
+
+
+# uvicorn src.jaljalgotcha.asgi:app で使用する
+app = CombinationsApp()
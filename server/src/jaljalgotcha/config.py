@@ -16,7 +16,45 @@ load_dotenv(ROOT_DIR / '.env')
 # YouTube API 設定
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 YOUTUBE_CHANNEL_ID = os.getenv('YOUTUBE_CHANNEL_ID')
+# 動画詳細取得の最大同時実行数
+YOUTUBE_FETCH_WORKERS = int(os.getenv('YOUTUBE_FETCH_WORKERS', '4'))
+# 取り込み時に1回の保存（コミット）でまとめる動画の件数
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '500'))
 # YOUTUBE_SEARCH_QUERY = os.getenv('YOUTUBE_SEARCH_QUERY', 'JalJal') # チャンネル検索に変更したため不要
 
 # アプリケーション設定
 DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
+
+# サービスの初期化時にテーブルを作成・確認するかどうか（既定では行わない）
+DB_INIT_SCHEMA = os.getenv('DB_INIT_SCHEMA', 'False').lower() in ('true', '1', 't')
+
+# 動画カタログのバックグラウンド再構築間隔（秒）、0以下で無効
+# （CATALOG_POLL_INTERVAL が有効な場合は使用しない）
+CATALOG_REFRESH_INTERVAL = float(os.getenv('CATALOG_REFRESH_INTERVAL', '300'))
+# DB のカタログのバージョン（catalog_versions）を確認する間隔（秒）、変わった場合のみ再構築する。
+# 0以下の場合はバージョンを使用せず CATALOG_REFRESH_INTERVAL ごとに再構築する
+CATALOG_POLL_INTERVAL = float(os.getenv('CATALOG_POLL_INTERVAL', '5'))
+
+# 最適化モード（best_fit）の制限時間（秒）、超えた場合はランダム選択にフォールバック
+BEST_FIT_TIME_BUDGET = float(os.getenv('BEST_FIT_TIME_BUDGET', '0.2'))
+
+# 事前計算した組み合わせプールを使用するかどうか
+USE_COMBINATION_POOLS = os.getenv('USE_COMBINATION_POOLS', 'True').lower() in ('true', '1', 't')
+# プロセス内にキャッシュする組み合わせプールの最大数
+COMBINATION_POOL_CACHE_SIZE = int(os.getenv('COMBINATION_POOL_CACHE_SIZE', '128'))
+
+# フィルター（max_duration など）で絞り込んだカタログをキャッシュする条件の最大数、0以下で無効
+# （無効の場合、フィルター付きのリクエストは DB から取得する）
+CATALOG_FILTER_CACHE_SIZE = int(os.getenv('CATALOG_FILTER_CACHE_SIZE', '64'))
+# 絞り込んだカタログのキャッシュが保持する動画の合計件数の上限（絞り込みごとに列をコピーするため、メモリの上限になる）
+CATALOG_FILTER_CACHE_ROWS = int(os.getenv('CATALOG_FILTER_CACHE_ROWS', '1000000'))
+
+# ASGI（asgi.py）で組み合わせの選択を実行するスレッド数
+ASYNC_SELECTION_WORKERS = int(os.getenv('ASYNC_SELECTION_WORKERS', '4'))
+# ASGI で使用する非同期ドライバのデータベース URL（未設定の場合は同期のリポジトリをスレッドプールで実行する）
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', '')
+
+# 組み合わせを並列に生成するワーカープロセスの数、0以下で無効
+PARALLEL_SELECTION_WORKERS = int(os.getenv('PARALLEL_SELECTION_WORKERS', '0'))
+# 並列に生成する組み合わせの数（attempts または candidates）の下限
+PARALLEL_SELECTION_MIN_ATTEMPTS = int(os.getenv('PARALLEL_SELECTION_MIN_ATTEMPTS', '2000'))
@@ -1,14 +1,27 @@
 """
 データベースパッケージ
 """
-from .database import init_db, get_db, db_session, Base, engine
-from .models_db import VideoModel
+from .database import init_db, get_db, get_engine, db_session, Base
+from .models_db import VideoModel, CombinationPoolModel, SyncStateModel, SchemaMigrationModel, CatalogVersionModel
+from .pool import pool_status
 
 __all__ = [
     'init_db',
     'get_db',
     'db_session',
     'Base',
-    'engine',
+    'get_engine',
     'VideoModel',
+    'CombinationPoolModel',
+    'SyncStateModel',
+    'SchemaMigrationModel',
+    'CatalogVersionModel',
+    'pool_status',
 ]
+
+
+def __getattr__(name: str):
+    # 従来の db.engine の参照も遅延して作成する
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,10 +2,16 @@
 データベース接続ユーティリティ (SQLite バージョン)
 """
 import os
-from sqlalchemy import create_engine
+import threading
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from sqlalchemy.ext.declarative import declarative_base
 
+from ..metrics import DB_QUERIES, statement_kind
+from .pool import engine_options
+
 # データベース接続情報
 DB_USER = os.getenv('POSTGRES_USER', 'testuser')
 DB_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'testpass')
@@ -14,20 +20,65 @@ DB_PORT = os.getenv('POSTGRES_PORT', '5432')
 DB_NAME = os.getenv('POSTGRES_DB', 'testdb')
 
 DATABASE_URL = os.getenv('DATABASE_URL', f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-engine = create_engine(DATABASE_URL)
 
-# セッションファクトリ作成
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# エンジンは最初に使用されたときに作成する（get_engine を参照）
+_engine = None
+_engine_lock = threading.Lock()
+
+# セッションファクトリ作成（エンジン作成時にバインドする）
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 db_session = scoped_session(SessionLocal)
 
 # 直接Session作成のためのエンジン（コンテキストマネージャで使用）
-session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+session_factory = sessionmaker(autocommit=False, autoflush=False)
 
 # モデルのベースクラス
 Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+def get_engine() -> Engine:
+    """
+    アプリケーション共通のエンジンを取得する
+    
+    初回の呼び出し時に作成し、セッションファクトリにバインドする。
+    エンジンの作成では接続しないため、DB に接続できない場合は最初のクエリで失敗する。
+    
+    Returns:
+        SQLAlchemy のエンジン
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # プールの大きさ・タイムアウトなどは環境変数から設定する（pool.py を参照）
+                engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+                event.listen(engine, 'before_cursor_execute', count_query)
+                SessionLocal.configure(bind=engine)
+                session_factory.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def current_engine() -> Optional[Engine]:
+    """
+    作成済みのエンジンを取得する（まだ作成されていない場合は None、作成はしない）
+    """
+    return _engine
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    """実行する SQL 文の数を種類ごとに数える（before_cursor_execute イベント）"""
+    DB_QUERIES.inc(statement=statement_kind(statement))
+
+
+def __getattr__(name: str):
+    # 従来の database.engine の参照も遅延して作成する
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_db():
     """
     データベースセッションを取得する
@@ -36,15 +87,15 @@ def get_db():
         SQLAlchemy セッション
     """
     # コンテキストマネージャを使用して自動ロールバック
-    with Session(engine) as db:
+    with Session(get_engine()) as db:
         yield db
 
 
 def init_db():
     """
     データベースの初期化
-    テーブルが存在しない場合は作成する
+    未適用のマイグレーションを適用する（テーブルが存在しない場合は作成する）
     """
-    # モデルをインポートしてテーブルを作成
-    from .models_db import VideoModel  # noqa
-    Base.metadata.create_all(bind=engine)
+    # テーブル定義は models_db 側の Base に登録されている（migrations.py を参照）
+    from .migrations import migrate
+    migrate(get_engine())
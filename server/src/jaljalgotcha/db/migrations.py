@@ -0,0 +1,204 @@
+"""
+データベースのスキーマのマイグレーション
+
+適用済みのバージョンを schema_migrations テーブルに記録し、未適用のマイグレーションを
+バージョン順に適用する。マイグレーションは1つずつ別のトランザクションで適用し、
+PostgreSQL では複数のプロセスから同時に実行しても1回だけ適用されるようにロックを取る。
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, insert, inspect, select, text
+)
+from sqlalchemy.engine import Connection, Engine
+
+from .models_db import CatalogVersionModel, SchemaMigrationModel
+
+logger = logging.getLogger(__name__)
+
+# マイグレーションの排他に使用する PostgreSQL のアドバイザリロックのキー
+MIGRATION_LOCK_KEY = 0x6A616C6A  # 'jalj'
+
+
+@dataclass(frozen=True)
+class Migration:
+    """スキーマのマイグレーション"""
+    version: int  # バージョン（適用順）
+    description: str  # 説明
+    upgrade: Callable[[Connection], None]  # 適用する処理（トランザクション内で呼ぶ）
+
+
+def _videos_table(metadata: MetaData) -> Table:
+    """バージョン1の videos テーブルの定義"""
+    return Table(
+        'videos', metadata,
+        Column('video_id', String, primary_key=True),
+        Column('channel_id', String, nullable=False),
+        Column('title', String, nullable=False),
+        Column('duration_seconds', Integer, nullable=False),
+        Column('view_count', BigInteger, default=0),
+        Column('like_count', BigInteger, default=0),
+        Column('comment_count', BigInteger, default=0),
+        Column('thumbnail_url', String),
+        Column('published_at', DateTime),
+        Column('updated_at', DateTime),
+    )
+
+
+def _duration_covering_indexes(videos: Table, covered: List[str]) -> List[Index]:
+    """
+    時間のインデックスの定義（PostgreSQL では INCLUDE、それ以外では複合インデックス）
+
+    同じ名前の2つのうち、データベースに応じてどちらか一方だけを作成する
+    """
+    return [
+        Index('idx_duration_covering', videos.c.duration_seconds,
+              postgresql_include=covered).ddl_if(dialect='postgresql'),
+        Index('idx_duration_covering', videos.c.duration_seconds, *(videos.c[name] for name in covered)).ddl_if(
+            callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != 'postgresql'
+        ),
+    ]
+
+
+# 各バージョンのテーブル・インデックスの定義（現在のモデルとは独立に固定し、後のバージョンの変更を含めない）
+# バージョン1: テーブルのみ
+_V1_METADATA = MetaData()
+_videos_table(_V1_METADATA)
+Table(
+    'combination_pools', _V1_METADATA,
+    Column('minutes', Integer, primary_key=True),
+    Column('catalog_fingerprint', String, nullable=False),
+    Column('video_ids', JSON, nullable=False),
+    Column('created_at', DateTime),
+)
+Table(
+    'sync_states', _V1_METADATA,
+    Column('channel_id', String, primary_key=True),
+    Column('last_video_id', String),
+    Column('last_published_at', DateTime),
+    Column('synced_at', DateTime),
+)
+
+
+# バージョン2: videos の絞り込み・並び替え用のインデックス
+_V2_VIDEOS = _videos_table(MetaData())
+_V2_VIDEO_INDEXES = (
+    *_duration_covering_indexes(_V2_VIDEOS, ['video_id', 'title', 'thumbnail_url']),
+    Index('idx_like_count', _V2_VIDEOS.c.like_count),
+    Index('idx_view_count', _V2_VIDEOS.c.view_count),
+    Index('idx_published_at', _V2_VIDEOS.c.published_at),
+    Index('idx_channel_updated_at', _V2_VIDEOS.c.channel_id, _V2_VIDEOS.c.updated_at),
+)
+# バージョン4: いいね数・再生数も含めた時間のインデックス
+_V4_DURATION_COVERING_INDEXES = tuple(_duration_covering_indexes(
+    _videos_table(MetaData()), ['video_id', 'title', 'thumbnail_url', 'like_count', 'view_count']
+))
+
+
+def _create_tables(connection: Connection) -> None:
+    """存在しないテーブルを作成する（init.sql で作成済みのデータベースでは何もしない）"""
+    _V1_METADATA.create_all(bind=connection)
+
+
+def _create_video_indexes(connection: Connection) -> None:
+    """videos の絞り込み・並び替えの列のインデックスを作成する"""
+    for index in _V2_VIDEO_INDEXES:
+        index.create(bind=connection, checkfirst=True)
+    # 時間のみのインデックスは idx_duration_covering で置き換える
+    connection.execute(text("DROP INDEX IF EXISTS idx_duration_seconds"))
+    # プランナーが新しいインデックスを使用するように統計情報を更新する
+    connection.execute(text("ANALYZE videos"))
+
+
+def _create_catalog_versions(connection: Connection) -> None:
+    """カタログのバージョンのテーブルを作成し、動画一覧の行を追加する"""
+    CatalogVersionModel.__table__.create(bind=connection, checkfirst=True)
+    exists = connection.execute(
+        select(CatalogVersionModel.name).where(CatalogVersionModel.name == 'videos')
+    ).first()
+    if exists is None:
+        connection.execute(insert(CatalogVersionModel).values(name='videos', version=0, updated_at=datetime.now()))
+
+
+def _recreate_duration_covering_index(connection: Connection) -> None:
+    """時間のインデックスを、重み付き選択で読み込むいいね数・再生数も含めて作り直す"""
+    connection.execute(text("DROP INDEX IF EXISTS idx_duration_covering"))
+    for index in _V4_DURATION_COVERING_INDEXES:
+        index.create(bind=connection, checkfirst=True)
+    connection.execute(text("ANALYZE videos"))
+
+
+# すべてのマイグレーション（バージョン順、適用済みのものは変更しない）
+MIGRATIONS = (
+    Migration(1, "初期のテーブル", _create_tables),
+    Migration(2, "videos の絞り込み・並び替え用のインデックス", _create_video_indexes),
+    Migration(3, "カタログのバージョン", _create_catalog_versions),
+    Migration(4, "時間のインデックスにいいね数・再生数を含める", _recreate_duration_covering_index),
+)
+
+
+def applied_versions(connection: Connection) -> Set[int]:
+    """
+    適用済みのバージョンを取得する
+
+    Args:
+        connection: データベースの接続
+
+    Returns:
+        適用済みのバージョンの集合（記録用のテーブルがなければ空）
+    """
+    if not inspect(connection).has_table(SchemaMigrationModel.__tablename__):
+        return set()
+    return set(connection.execute(select(SchemaMigrationModel.version)).scalars())
+
+
+def pending_migrations(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """
+    未適用のマイグレーションを取得する
+
+    Args:
+        engine: SQLAlchemy のエンジン
+        target: 指定時はこのバージョンまでを対象にする
+
+    Returns:
+        未適用のマイグレーションのリスト（バージョン順）
+    """
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [
+        migration for migration in MIGRATIONS
+        if migration.version not in applied and (target is None or migration.version <= target)
+    ]
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[Migration]:
+    """
+    未適用のマイグレーションを適用する
+
+    Args:
+        engine: SQLAlchemy のエンジン
+        target: 指定時はこのバージョンまでを適用する
+
+    Returns:
+        適用したマイグレーションのリスト（バージョン順）
+    """
+    applied = []
+    for migration in pending_migrations(engine, target):
+        with engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                # 同時に実行している他のプロセスの適用が終わるまで待つ
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            # 記録用のテーブルもロックを取ってから作成する（同時に作成して失敗しないように）
+            SchemaMigrationModel.__table__.create(bind=connection, checkfirst=True)
+            if migration.version in applied_versions(connection):
+                continue
+            logger.info(f"マイグレーション {migration.version}（{migration.description}）を適用します")
+            migration.upgrade(connection)
+            connection.execute(insert(SchemaMigrationModel).values(
+                version=migration.version, description=migration.description, applied_at=datetime.now()
+            ))
+        applied.append(migration)
+    return applied
@@ -2,11 +2,14 @@
 SQLAlchemy データベースモデル
 """
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, BigInteger, DateTime
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# idx_duration_covering に含める読み込み列（VIDEO_READ_COLUMNS の時間以外の列）
+COVERED_COLUMNS = ['video_id', 'title', 'thumbnail_url', 'like_count', 'view_count']
+
 
 class VideoModel(Base):
     """
@@ -25,8 +28,26 @@ class VideoModel(Base):
         published_at TIMESTAMP,
         updated_at TIMESTAMP DEFAULT now()
     );
+    
+    インデックスは get_videos の絞り込み・並び替えの列に作成する（VIDEO_INDEXES を参照）
     """
     __tablename__ = 'videos'
+    __table_args__ = (
+        # 時間での絞り込み・並び替え（既定の並び順）。読み込む列を含め、テーブルを読まずに
+        # インデックスだけで結果を返せるようにする（INCLUDE がない SQLite などでは複合インデックスにする）
+        Index('idx_duration_covering', 'duration_seconds',
+              postgresql_include=COVERED_COLUMNS).ddl_if(dialect='postgresql'),
+        Index('idx_duration_covering', 'duration_seconds', *COVERED_COLUMNS).ddl_if(
+            callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != 'postgresql'
+        ),
+        # いいね数・再生数での絞り込み・並び替え（降順はインデックスを逆に走査する）
+        Index('idx_like_count', 'like_count'),
+        Index('idx_view_count', 'view_count'),
+        # 公開日時での並び替え
+        Index('idx_published_at', 'published_at'),
+        # 古くなった動画の再取得（get_stale_video_ids）
+        Index('idx_channel_updated_at', 'channel_id', 'updated_at'),
+    )
     
     video_id = Column(String, primary_key=True)
     channel_id = Column(String, nullable=False)
@@ -41,3 +62,98 @@ class VideoModel(Base):
     
     def __repr__(self):
         return f"<Video(video_id='{self.video_id}', title='{self.title}', duration_seconds={self.duration_seconds})>"
+
+
+class CombinationPoolModel(Base):
+    """
+    分単位の目標時間ごとに事前計算した組み合わせのプールのSQLAlchemyモデル
+    
+    テーブル定義:
+    CREATE TABLE combination_pools (
+        minutes INTEGER PRIMARY KEY,
+        catalog_fingerprint TEXT NOT NULL,
+        video_ids JSON NOT NULL,
+        created_at TIMESTAMP DEFAULT now()
+    );
+    """
+    __tablename__ = 'combination_pools'
+    
+    minutes = Column(Integer, primary_key=True)
+    catalog_fingerprint = Column(String, nullable=False)  # 計算に使用したカタログの指紋
+    video_ids = Column(JSON, nullable=False)  # 組み合わせごとの動画IDの配列
+    created_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<CombinationPool(minutes={self.minutes}, combinations={len(self.video_ids or [])})>"
+
+
+class SyncStateModel(Base):
+    """
+    チャンネルごとの同期状態（ウォーターマーク）のSQLAlchemyモデル
+    
+    テーブル定義:
+    CREATE TABLE sync_states (
+        channel_id TEXT PRIMARY KEY,
+        last_video_id TEXT,
+        last_published_at TIMESTAMP,
+        synced_at TIMESTAMP DEFAULT now()
+    );
+    """
+    __tablename__ = 'sync_states'
+    
+    channel_id = Column(String, primary_key=True)
+    last_video_id = Column(String)  # 同期済みの最新の動画ID
+    last_published_at = Column(DateTime)  # 同期済みの最新の公開日時（UTC）
+    synced_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<SyncState(channel_id='{self.channel_id}', last_video_id='{self.last_video_id}')>"
+
+
+class SchemaMigrationModel(Base):
+    """
+    適用済みのスキーマのマイグレーションのSQLAlchemyモデル（db/migrations.py を参照）
+    
+    テーブル定義:
+    CREATE TABLE schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT now()
+    );
+    """
+    __tablename__ = 'schema_migrations'
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<SchemaMigration(version={self.version}, description='{self.description}')>"
+
+
+class CatalogVersionModel(Base):
+    """
+    カタログ（動画一覧）のバージョンのSQLAlchemyモデル
+    
+    動画を追加・更新したトランザクションで version を1つ増やす。各プロセスのインメモリカタログは
+    この行だけを確認し、変わった場合のみ動画一覧を読み込み直す。
+    
+    テーブル定義:
+    CREATE TABLE catalog_versions (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT now()
+    );
+    """
+    __tablename__ = 'catalog_versions'
+    
+    name = Column(String, primary_key=True)  # カタログの名前（動画一覧は 'videos'）
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<CatalogVersion(name='{self.name}', version={self.version})>"
+
+
+# videos テーブルのインデックス（同じ名前のものはデータベースに応じてどちらか一方を作成する）
+VIDEO_INDEXES = tuple(sorted(VideoModel.__table__.indexes, key=lambda index: index.name))
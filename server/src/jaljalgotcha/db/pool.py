@@ -0,0 +1,205 @@
+"""
+コネクションプールの設定と計測
+
+プールの大きさなどを環境変数から設定し、接続の取得回数・待ち時間・
+オーバーフローを記録する QueuePool を提供する
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from ..metrics import Counter, Gauge, Metric
+
+
+def _env_bool(name: str, default: str) -> bool:
+    """真偽値の環境変数を読み込む"""
+    return os.getenv(name, default).lower() in ('true', '1', 't')
+
+
+# プールに保持する接続数
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+# プールの大きさを超えて一時的に作成できる接続数
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+# 接続の空きを待つ最大時間（秒）
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# この秒数より古い接続は作り直す（-1 で無効）
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# 取得時に接続が生きているかを確認する
+DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', 'True')
+
+
+class PoolStats:
+    """コネクションプールの計測値（スレッドセーフ）"""
+
+    def __init__(self):
+        """初期化"""
+        self._lock = threading.Lock()
+        self.checkouts = 0  # 接続の取得回数
+        self.timeouts = 0  # 空きを待って時間切れになった回数
+        self.wait_seconds_total = 0.0  # 取得の待ち時間の合計（秒）
+        self.wait_seconds_max = 0.0  # 取得の待ち時間の最大値（秒）
+        self.overflow_max = 0  # オーバーフロー接続数の最大値
+
+    def record_checkout(self, wait_seconds: float, overflow: int) -> None:
+        """
+        接続の取得を記録する
+
+        Args:
+            wait_seconds: 取得までの待ち時間（秒）
+            overflow: 取得後のオーバーフロー接続数
+        """
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def record_timeout(self, wait_seconds: float) -> None:
+        """
+        取得の時間切れを記録する
+
+        Args:
+            wait_seconds: 時間切れまでの待ち時間（秒）
+        """
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """計測値を辞書で返す"""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "overflow_max": self.overflow_max,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """接続の取得回数と待ち時間を記録する QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        self.stats.record_checkout(time.perf_counter() - start, max(self.overflow(), 0))
+        return connection
+
+    def recreate(self):
+        # dispose などで作り直した後も計測値を引き継ぐ
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    """
+    create_engine に渡すプールの設定を作成する
+
+    SQLite は SQLAlchemy の既定のプールを使用する（プールの大きさなどは設定しない）
+
+    Args:
+        database_url: データベースの URL
+
+    Returns:
+        create_engine のキーワード引数
+    """
+    if make_url(database_url).get_backend_name() == 'sqlite':
+        return {}
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_status(engine: Engine) -> Dict[str, Any]:
+    """
+    コネクションプールの現在の状態と計測値を取得する
+
+    Args:
+        engine: 対象のエンジン
+
+    Returns:
+        プールの種類、大きさ、使用中の接続数、計測値などを含む辞書
+    """
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # 作成前の枠を含むため負の値になる場合は 0 とする
+            "overflow": max(pool.overflow(), 0),
+        })
+
+    stats = getattr(pool, 'stats', None)
+    if isinstance(stats, PoolStats):
+        status.update(stats.as_dict())
+
+    return status
+
+
+# /metrics に出力するプールの状態（pool_status のキー、種類、説明）
+POOL_METRICS = (
+    ("size", Gauge, "プールに保持する接続数"),
+    ("max_overflow", Gauge, "プールの大きさを超えて作成できる接続数"),
+    ("checked_in", Gauge, "プールで待機している接続数"),
+    ("checked_out", Gauge, "使用中の接続数"),
+    ("overflow", Gauge, "オーバーフロー接続数"),
+    ("checkouts", Counter, "接続の取得回数"),
+    ("timeouts", Counter, "空きを待って時間切れになった回数"),
+    ("wait_seconds_total", Counter, "取得の待ち時間の合計（秒）"),
+    ("wait_seconds_max", Gauge, "取得の待ち時間の最大値（秒）"),
+    ("overflow_max", Gauge, "オーバーフロー接続数の最大値"),
+)
+
+
+def pool_metrics(engine: Engine) -> List[Metric]:
+    """
+    コネクションプールの状態を /metrics に出力する計測値にする
+
+    Args:
+        engine: 対象のエンジン
+
+    Returns:
+        計測値のリスト（プールの種類が対応していない値は含まない）
+    """
+    status = pool_status(engine)
+    metrics: List[Metric] = []
+    for key, metric_class, documentation in POOL_METRICS:
+        if key not in status:
+            continue
+        name = f"jaljalgotcha_db_pool_{key}"
+        if metric_class is Counter and not name.endswith("_total"):
+            name += "_total"
+        metric = metric_class(name, documentation)
+        if isinstance(metric, Counter):
+            metric.inc(status[key])
+        else:
+            metric.set(status[key])
+        metrics.append(metric)
+    return metrics
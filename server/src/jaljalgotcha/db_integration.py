@@ -1,32 +1,153 @@
 """
 データベースリポジトリとAPIの統合
+
+SQLAlchemy の読み込み、エンジンの作成、DB への接続は
+サービスが最初に使用されたときまで行わない
 """
-from .repositories.video_repository import DbVideoRepository
-from .db.database import db_session, init_db
+import threading
+from typing import Optional
+
 from .di.container import container
 from .services.video_service import VideoService
+from .services.async_video_service import AsyncVideoService
+from .services.catalog import VideoCatalog
+from .services.catalog_filter import FilteredCatalogCache
+from .services.combination_pool import CombinationPoolCache
+from .config import (
+    DB_INIT_SCHEMA,
+    CATALOG_REFRESH_INTERVAL,
+    CATALOG_POLL_INTERVAL,
+    BEST_FIT_TIME_BUDGET,
+    USE_COMBINATION_POOLS,
+    COMBINATION_POOL_CACHE_SIZE,
+    CATALOG_FILTER_CACHE_SIZE,
+    CATALOG_FILTER_CACHE_ROWS,
+    ASYNC_SELECTION_WORKERS,
+    ASYNC_DATABASE_URL,
+    PARALLEL_SELECTION_WORKERS,
+    PARALLEL_SELECTION_MIN_ATTEMPTS,
+)
+
+# 初期化済みのビデオサービス（get_db_video_service を参照）
+_video_service: Optional[VideoService] = None
+_video_service_lock = threading.Lock()
+# 初期化済みの非同期ビデオサービス（get_async_video_service を参照）
+_async_video_service: Optional[AsyncVideoService] = None
 
 
 def setup_video_repository():
     """
     データベースリポジトリをDIコンテナに登録する
+    
+    DB_INIT_SCHEMA が有効な場合のみテーブルを作成・確認する
     """
-    # データベースの初期化
-    init_db()
+    from .repositories.video_repository import DbVideoRepository
+    from .repositories.pool_repository import DbCombinationPoolRepository
+    from .repositories.catalog_version_repository import DbCatalogVersionRepository
+    from .db.database import db_session, init_db
+    
+    # データベースの初期化（有効な場合のみ）
+    if DB_INIT_SCHEMA:
+        init_db()
     
     # データベースリポジトリを登録
     container.register('db_video_repository', lambda c: DbVideoRepository(db_session))
     
+    # 動画カタログを登録（DB のカタログのバージョンが変わった場合のみ再構築する）
+    container.register(
+        'video_catalog',
+        lambda c: VideoCatalog(
+            c.get('db_video_repository'),
+            refresh_interval=CATALOG_REFRESH_INTERVAL,
+            version_repository=DbCatalogVersionRepository(db_session) if CATALOG_POLL_INTERVAL > 0 else None,
+            poll_interval=CATALOG_POLL_INTERVAL
+        )
+    )
+    
+    # 組み合わせプールのキャッシュを登録
+    container.register(
+        'combination_pool_cache',
+        lambda c: CombinationPoolCache(
+            DbCombinationPoolRepository(db_session), maxsize=COMBINATION_POOL_CACHE_SIZE
+        )
+    )
+    
+    # 並列生成のセレクタを登録（有効な場合のみプロセスプールを読み込む）
+    def parallel_selector(c):
+        if PARALLEL_SELECTION_WORKERS <= 0:
+            return None
+        import atexit
+        from .selection.parallel import ParallelSelector
+        selector = ParallelSelector(PARALLEL_SELECTION_WORKERS)
+        # 終了時にワーカープロセスを止め、共有メモリを削除する
+        atexit.register(selector.close)
+        return selector
+    
+    container.register('parallel_selector', parallel_selector)
+    
     # ビデオサービスを登録
-    container.register('db_video_service', lambda c: VideoService(c.get('db_video_repository')))
+    container.register(
+        'db_video_service',
+        lambda c: VideoService(
+            c.get('db_video_repository'),
+            catalog=c.get('video_catalog'),
+            best_fit_time_budget=BEST_FIT_TIME_BUDGET,
+            pool_cache=c.get('combination_pool_cache') if USE_COMBINATION_POOLS else None,
+            parallel_selector=c.get('parallel_selector'),
+            parallel_min_attempts=PARALLEL_SELECTION_MIN_ATTEMPTS,
+            filter_cache=FilteredCatalogCache(
+                CATALOG_FILTER_CACHE_SIZE, max_rows=CATALOG_FILTER_CACHE_ROWS
+            ) if CATALOG_FILTER_CACHE_SIZE > 0 else None
+        )
+    )
 
 
 def get_db_video_service() -> VideoService:
     """
     データベースを使用するビデオサービスを取得する
     
+    初回の呼び出し時にリポジトリを登録し、カタログを読み込んでバックグラウンドでの
+    再構築を開始する。2回目以降は同じインスタンスを返す。
+    
     Returns:
         VideoService: データベースリポジトリを使用するビデオサービス
     """
-    setup_video_repository()
-    return container.get('db_video_service')
+    global _video_service
+    if _video_service is None:
+        with _video_service_lock:
+            if _video_service is None:
+                setup_video_repository()
+                container.get('video_catalog').start()
+                _video_service = container.get('db_video_service')
+    return _video_service
+
+
+def get_async_video_service() -> AsyncVideoService:
+    """
+    ASGI で使用する非同期ビデオサービスを取得する
+    
+    get_db_video_service のサービスを選択処理に使用する。ASYNC_DATABASE_URL が設定されている
+    場合は非同期ドライバのリポジトリで、設定されていない場合は同期のリポジトリをイベントループの
+    既定のスレッドプールで実行して DB を読み込む。初回の呼び出しは DB に接続するため、
+    イベントループではなくスレッドで呼び出す。
+    
+    Returns:
+        AsyncVideoService: 非同期ビデオサービス
+    """
+    global _async_video_service
+    if _async_video_service is None:
+        video_service = get_db_video_service()
+        with _video_service_lock:
+            if _async_video_service is None:
+                from .repositories.async_video_repository import (
+                    AsyncDbVideoRepository, ThreadedVideoRepository, create_async_video_engine
+                )
+                if ASYNC_DATABASE_URL:
+                    async_repository = AsyncDbVideoRepository(create_async_video_engine(ASYNC_DATABASE_URL))
+                else:
+                    # 非同期ドライバを使用しない場合も、DB の読み込みは選択処理とは別のスレッドで待つ
+                    async_repository = ThreadedVideoRepository(container.get('db_video_repository'))
+                _async_video_service = AsyncVideoService(
+                    video_service, async_repository=async_repository, max_workers=ASYNC_SELECTION_WORKERS
+                )
+    return _async_video_service
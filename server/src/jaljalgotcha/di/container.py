@@ -2,8 +2,6 @@
 依存性注入コンテナの実装
 """
 from typing import Dict, Any, Optional, Type, TypeVar
-from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
-from src.jaljalgotcha.db.database import db_session
 
 T = TypeVar('T')
 
@@ -72,5 +70,16 @@ class Container:
 # グローバルインスタンス
 container = Container()
 
+
+def _create_default_video_repository(c: Container):
+    """
+    既定の VideoRepository（DbVideoRepository）を作成する
+    SQLAlchemy の読み込みとエンジンの作成は最初に取得されたときまで遅らせる
+    """
+    from ..repositories.video_repository import DbVideoRepository
+    from ..db.database import db_session
+    return DbVideoRepository(db_session)
+
+
 # Register DbVideoRepository as the default VideoRepository
-container.register('video_repository', lambda c: DbVideoRepository(db_session))
+container.register('video_repository', _create_default_video_repository)
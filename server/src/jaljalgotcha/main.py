@@ -1,21 +1,92 @@
-from flask import Flask, request, jsonify
+import itertools
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import Blueprint, Flask, current_app, g, request, jsonify
 from flask_cors import CORS
-from requests import get
-from sqlalchemy.orm import Session
 
+from . import metrics
 from .utils import parse_duration, video_collection_to_dict
-from .services.video_service import VideoService
-from .di.container import container
-from .db_integration import get_db_video_service, setup_video_repository
-from .db.database import engine
+from .serialization import CombinationRenderer, dumps
+from .services.video_service import MODES, MODE_RANDOM, WEIGHTING_NONE
+from .params import (
+    MAX_BATCH_ATTEMPTS,
+    MAX_BATCH_TARGETS,
+    NDJSON_MIMETYPE,
+    missing_youtube_key_error,
+    parse_candidates,
+    parse_filters,
+    parse_combination_request,
+    parse_minutes,
+    parse_weighting,
+)
+from .db_integration import get_db_video_service
+
+# APIのルート（サービスは最初のリクエストで初期化する）
+api = Blueprint('api', __name__)
+# 組み合わせのレスポンスを動画ごとの JSON 断片から組み立てる
+combination_renderer = CombinationRenderer()
+
+
+def create_app() -> Flask:
+    """
+    Flaskアプリケーションを作成する
+    
+    サービスの初期化と DB への接続は行わないため、ワーカーはすぐに起動する。
+    DB に接続できない場合は、最初に DB を使用するリクエストでエラーになる。
+    
+    Returns:
+        Flaskアプリケーション
+    """
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    return app
+
+
+@api.before_request
+def start_request_timer():
+    """リクエストの処理時間の計測を開始する"""
+    g.request_started = time.perf_counter()
+
+
+@api.after_request
+def record_request(response):
+    """リクエスト数と処理時間を記録する"""
+    _record_request(response.status_code)
+    return response
 
-# サービスの初期化と設定
-video_service = get_db_video_service()
-# Flaskアプリケーションの初期化
-app = Flask(__name__)
 
+@api.teardown_request
+def record_failed_request(error=None):
+    """処理されなかった例外で終わったリクエストを 500 として記録する"""
+    if error is not None:
+        _record_request(500)
 
-@app.route('/api/combinations')
+
+def _record_request(status: int) -> None:
+    """リクエストを1回だけ記録する"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUESTS.inc(endpoint=endpoint, status=status)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+def uses_compact_json() -> bool:
+    """
+    jsonify が CombinationRenderer と同じ形式（キーのソート、空白なし、ASCII エスケープ）で
+    出力する設定かどうか（デバッグモードでは整形して出力されるため False）
+    """
+    provider = current_app.json
+    compact = getattr(provider, 'compact', None)
+    if compact is False or (compact is None and current_app.debug):
+        return False
+    return getattr(provider, 'sort_keys', False) and getattr(provider, 'ensure_ascii', False)
+
+
+@api.route('/api/combinations')
 def get_combinations():
     """
     指定された時間に合う動画の組み合わせを取得するAPI
@@ -23,82 +94,305 @@ def get_combinations():
     Query Parameters:
         duration (str): 希望する動画時間（分単位または HH:MM:SS形式）
         attempts (int, optional): 生成する組み合わせの数、デフォルトは3
+        candidates (int, optional): 一括生成する候補の数、指定時は上位 attempts 件を返す（最大10000）
+        mode (str, optional): 選択モード（random または best_fit）、デフォルトは random
+        weighting (str, optional): ランダム選択の重み付け（none、likes、views）、デフォルトは none
+            （likes・views はいいね数・再生数が多い動画ほど選ばれやすくする）
+        max_duration (int, optional): 選択対象にする動画の最大時間（秒）
+        min_likes (int, optional): 選択対象にする動画の最小いいね数
+        min_views (int, optional): 選択対象にする動画の最小再生数
+        order (str, optional): 動画の並び順（duration、likes、views、date）
         use_youtube (bool, optional): YouTubeのAPIを使用するかどうか、デフォルトはFalse
         use_database (bool, optional): データベースを使用するかどうか、デフォルトはFalse
+        stream (bool, optional): 組み合わせを生成した順に NDJSON として逐次返すかどうか、デフォルトはFalse
+        top (int, optional): 生成した組み合わせのうち残り時間が少ない上位 top 件だけを
+            残り時間が少ない順に返す（stream 指定時に未指定の場合は生成順ですべて返す）
     
     Returns:
-        JSON: 動画の組み合わせリスト
+        JSON: 動画の組み合わせリスト（stream 指定時は1行に1つの組み合わせの NDJSON）
     """
-    # コンテキストマネージャを使用して自動ロールバック
-    with Session(engine) as session:
-        # リクエストパラメータを取得
-        duration_str = request.args.get('duration', '')
-        
-        # attempsパラメータを安全に取得・変換
-        attempts_str = request.args.get('attempts', '3')
-        try:
-            # 数値部分のみを抽出して変換
-            attempts = int(attempts_str.split('&')[0])
-        except (ValueError, AttributeError):
-            attempts = 3
-            
-        use_youtube = request.args.get('use_youtube', 'false').lower() == 'true'
-        
-        # パラメータのバリデーション
-        if not duration_str:
-            return jsonify({"error": "時間を指定してください"}), 400
+    parse_started = time.perf_counter()
+    # リクエストパラメータを取得・検証
+    try:
+        params = parse_combination_request(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    metrics.COMBINATION_STAGE_SECONDS.observe(time.perf_counter() - parse_started, stage='parse')
+    
+    # ビデオサービスを取得（初回のみ初期化する）
+    video_service = get_db_video_service()
+    if not video_service:
+        raise ValueError("ビデオサービスが取得できませんでした。DIコンテナの設定を確認してください。")
+    
+    if params.stream:
+        return stream_combinations(
+            video_service, params.target_duration, params.attempts, params.candidates, params.mode, params.top,
+            params.weighting, params.filters
+        )
+    
+    # 動画の組み合わせを取得
+    try:
+        combinations = video_service.get_video_combinations(
+            params.target_duration, params.attempts, filters=params.filters, candidates=params.candidates,
+            mode=params.mode, weighting=params.weighting
+        )
+        # 組み合わせは残り時間が少ない順なので、上位 top 件は先頭から取る
+        if params.top is not None:
+            combinations = combinations[:params.top]
         
+        # 結果が空でYouTube APIを使用している場合は、API設定が正しくない可能性がある
+        if not combinations and params.use_youtube:
+            error = missing_youtube_key_error()
+            if error:
+                return jsonify(error), 500
+    except Exception as e:
+        return jsonify({"error": f"エラーが発生しました：{str(e)}"}), 500
+    
+    # 結果をJSONに変換（キャッシュした動画ごとの断片から組み立てる）
+    with metrics.COMBINATION_STAGE_SECONDS.time(stage='serialize'):
+        if uses_compact_json():
+            catalog_version = video_service.catalog.snapshot.version if video_service.catalog else None
+            return current_app.response_class(
+                combination_renderer.render(combinations, catalog_version), mimetype=current_app.json.mimetype
+            )
+        result = [video_collection_to_dict(combo) for combo in combinations]
+        return jsonify(result)
+
+
+def stream_combinations(video_service, target_duration: int, attempts: int, candidates: Optional[int],
+                        mode: str, top: Optional[int], weighting: str = WEIGHTING_NONE,
+                        filters: Optional[Dict[str, Any]] = None):
+    """
+    組み合わせを生成した順に NDJSON として逐次返すレスポンスを作成する
+    
+    動画一覧の取得と最初の組み合わせの生成はレスポンスを返す前に行い、失敗した場合は 500 を返す。
+    以降に失敗した場合はエラーの行で終える。
+    
+    Returns:
+        レスポンス
+    """
+    catalog_version = video_service.catalog.snapshot.version if video_service.catalog else None
+    results = video_service.iter_video_combinations(
+        target_duration, attempts, filters=filters, candidates=candidates, mode=mode, top=top,
+        weighting=weighting
+    )
+    try:
+        first = next(results, None)
+    except Exception as e:
+        return jsonify({"error": f"エラーが発生しました：{str(e)}"}), 500
+    
+    def generate() -> Iterator[str]:
+        if first is None:
+            return
+        lines = combination_renderer.iter_render(itertools.chain((first,), results), catalog_version)
         try:
-            # HH:MM:SS形式は許可しない
-            if ':' in duration_str:
-                return jsonify({"error": "HH:MM:SS形式は使用できません。分単位で入力してください"}), 400
-                
-            try:
-                # 分単位として扱う
-                minutes = int(duration_str)
-                
-                # 正の値であることを確認
-                if minutes <= 0:
-                    return jsonify({"error": "時間は正の値である必要があります"}), 400
-                    
-                # 最大1000分の制限を追加
-                if minutes > 1000:
-                    return jsonify({"error": "時間は最大1000分までです"}), 400
-                    
-                # 秒に変換
-                target_duration = minutes * 60
-                
-            except ValueError:
-                return jsonify({"error": "有効な数値を入力してください"}), 400
+            for line in lines:
+                yield line + '\n'
         except Exception as e:
-            return jsonify({"error": str(e)}), 400
+            yield dumps({"error": f"エラーが発生しました：{str(e)}"}) + '\n'
+    
+    return current_app.response_class(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+def parse_batch_targets() -> List[Tuple[int, int]]:
+    """
+    一括取得の目標時間と組み合わせの数をリクエストから取得する
+    
+    POST の場合は JSON の targets（[{"duration": 分, "attempts": 数}, ...]）、
+    GET の場合はカンマ区切りの durations と attempts（1つなら全体、複数なら目標時間ごと）を使用する
+    
+    Returns:
+        (目標時間（秒）, 組み合わせの数) のリスト
         
-        # ビデオサービスが返されなかった場合はコンテナから取得
-        if not video_service:
-            raise ValueError("ビデオサービスが取得できませんでした。DIコンテナの設定を確認してください。")
-        # 動画の組み合わせを取得
+    Raises:
+        ValueError: パラメータが不正な場合（メッセージはそのままレスポンスに使用する）
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        targets = body.get('targets') if isinstance(body, dict) else None
+        if not isinstance(targets, list) or not all(isinstance(target, dict) for target in targets):
+            raise ValueError('targets に [{"duration": 分, "attempts": 数}, ...] の形式で目標時間を指定してください')
+        pairs = [(str(target.get('duration', '')), str(target.get('attempts', 3))) for target in targets]
+    else:
+        durations = [value.strip() for value in request.args.get('durations', '').split(',') if value.strip()]
+        attempts = [value.strip() for value in request.args.get('attempts', '3').split(',')]
+        if len(attempts) == 1:
+            attempts = attempts * len(durations)
+        elif len(attempts) != len(durations):
+            raise ValueError("attempts は1つ、または durations と同じ数だけ指定してください")
+        pairs = list(zip(durations, attempts))
+    
+    if not pairs:
+        raise ValueError("時間を指定してください")
+    if len(pairs) > MAX_BATCH_TARGETS:
+        raise ValueError(f"一度に指定できる時間は最大{MAX_BATCH_TARGETS}件までです")
+    
+    targets = []
+    for duration_str, attempts_str in pairs:
+        minutes = parse_minutes(duration_str)
         try:
-            combinations = video_service.get_video_combinations(target_duration, attempts)
-            
-            # 結果が空でYouTube APIを使用している場合は、API設定が正しくない可能性がある
-            if not combinations and use_youtube:
-                from .config import YOUTUBE_API_KEY
-                if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "your_youtube_api_key_here":
-                    return jsonify({
-                        "error": "YouTube API キーが設定されていません。.envファイルで'YOUTUBE_API_KEY'を設定してください。",
-                        "hint": "YouTubeデータAPIキーを取得して.envファイルに設定する必要があります。"
-                    }), 500
-        except Exception as e:
-            # エラー発生時にセッションはロールバックされる（コンテキストマネージャのexit処理）
-            return jsonify({"error": f"エラーが発生しました：{str(e)}"}), 500
-        
-        # 結果をJSONに変換
-        result = [video_collection_to_dict(combo) for combo in combinations]
+            attempts = int(attempts_str)
+        except ValueError:
+            raise ValueError("組み合わせの数には有効な数値を入力してください") from None
+        if not 1 <= attempts <= MAX_BATCH_ATTEMPTS:
+            raise ValueError(f"組み合わせの数は1〜{MAX_BATCH_ATTEMPTS}の範囲で指定してください")
+        targets.append((minutes * 60, attempts))
+    return targets
+
+
+def render_batch_target(target_duration: int, attempts: int, combinations, catalog_version) -> str:
+    """
+    一括取得の1つの目標時間の結果を JSON にする（キーのソート、空白なし、ASCII エスケープ）
+    
+    Args:
+        target_duration: 目標時間（秒）
+        attempts: 組み合わせの数
+        combinations: 動画コレクションのリスト
+        catalog_version: カタログのバージョン（断片のキャッシュに使用する）
         
-        # コンテキストマネージャを抜ける際に自動的にロールバックされる（明示的なcommitがないため）
-        return jsonify(result)
+    Returns:
+        {"attempts": ..., "combinations": [...], "duration": 分} の JSON
+    """
+    with metrics.COMBINATION_STAGE_SECONDS.time(stage='serialize'):
+        body = combination_renderer.render(combinations, catalog_version).rstrip('\n')
+        return f'{{"attempts":{attempts},"combinations":{body},"duration":{target_duration // 60}}}'
+
+
+@api.route('/api/combinations/batch', methods=['GET', 'POST'])
+def get_combinations_batch():
+    """
+    複数の目標時間の動画の組み合わせを1回の動画一覧の取得でまとめて取得するAPI
+    
+    Query Parameters:
+        durations (str): カンマ区切りの動画時間（分単位）、GET の場合
+        attempts (str, optional): 生成する組み合わせの数、1つなら全体、カンマ区切りなら目標時間ごと、デフォルトは3
+        candidates (int, optional): 一括生成する候補の数（最大10000）
+        mode (str, optional): 選択モード（random または best_fit）、デフォルトは random
+        weighting (str, optional): ランダム選択の重み付け（none、likes、views）、デフォルトは none
+        max_duration, min_likes, min_views, order (optional): 動画のフィルタリング条件（/api/combinations と同じ）
+        stream (bool, optional): 目標時間ごとに完成した順で NDJSON として逐次返すかどうか、デフォルトはFalse
+    
+    JSON Body (POST):
+        targets (list): [{"duration": 分, "attempts": 数}, ...]
+    
+    Returns:
+        JSON: [{"duration": 分, "attempts": 数, "combinations": [...]}, ...]（指定した順）
+        stream=true の場合は1行に1つの目標時間の NDJSON
+    """
+    parse_started = time.perf_counter()
+    try:
+        targets = parse_batch_targets()
+        candidates = parse_candidates(request.args.get('candidates'))
+        weighting = parse_weighting(request.args.get('weighting'))
+        filters = parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    mode = request.args.get('mode', MODE_RANDOM)
+    if mode not in MODES:
+        return jsonify({"error": f"選択モードは {', '.join(MODES)} のいずれかを指定してください"}), 400
+    stream = request.args.get('stream', 'false').lower() == 'true'
+    metrics.COMBINATION_STAGE_SECONDS.observe(time.perf_counter() - parse_started, stage='parse')
+    
+    video_service = get_db_video_service()
+    catalog_version = video_service.catalog.snapshot.version if video_service.catalog else None
+    results = video_service.iter_video_combinations_batch(
+        targets, filters=filters, candidates=candidates, mode=mode, weighting=weighting
+    )
+    
+    try:
+        # 動画一覧の取得と最初の目標時間はレスポンスを返す前に行い、失敗した場合は 500 を返す
+        first = next(results)
+        if not stream:
+            completed = [first, *results]
+    except Exception as e:
+        return jsonify({"error": f"エラーが発生しました：{str(e)}"}), 500
+    
+    if stream:
+        return current_app.response_class(
+            _stream_batch(first, results, catalog_version), mimetype=NDJSON_MIMETYPE
+        )
+    
+    if uses_compact_json():
+        lines = [render_batch_target(*result, catalog_version) for result in completed]
+        return current_app.response_class('[' + ','.join(lines) + ']\n', mimetype=current_app.json.mimetype)
+    with metrics.COMBINATION_STAGE_SECONDS.time(stage='serialize'):
+        return jsonify([
+            {
+                "duration": target_duration // 60,
+                "attempts": attempts,
+                "combinations": [video_collection_to_dict(combo) for combo in combinations],
+            }
+            for target_duration, attempts, combinations in completed
+        ])
+
+
+def _stream_batch(first, results, catalog_version) -> Iterator[str]:
+    """一括取得の結果を目標時間ごとに NDJSON の行として返す（途中で失敗した場合はエラーの行で終える）"""
+    yield render_batch_target(*first, catalog_version) + '\n'
+    try:
+        for result in results:
+            yield render_batch_target(*result, catalog_version) + '\n'
+    except Exception as e:
+        yield dumps({"error": f"エラーが発生しました：{str(e)}"}) + '\n'
+
+
+@api.route('/api/catalog')
+def get_catalog_status():
+    """
+    インメモリ動画カタログの状態を取得するAPI
+    
+    Returns:
+        JSON: カタログのバージョン、読み込み時刻、件数
+    """
+    video_service = get_db_video_service()
+    if not video_service.catalog:
+        return jsonify({"loaded": False})
+    return jsonify(video_service.catalog.status())
+
+
+@api.route('/api/db/pool')
+def get_db_pool_status():
+    """
+    データベースのコネクションプールの状態を取得するAPI
+    
+    Returns:
+        JSON: プールの大きさ、使用中の接続数、取得回数・待ち時間・オーバーフローの計測値
+    """
+    from .db.database import get_engine
+    from .db.pool import pool_status
+    return jsonify(pool_status(get_engine()))
+
+
+@api.route('/metrics')
+def get_metrics():
+    """
+    計測値を Prometheus のテキスト形式で取得するAPI
+    
+    リクエスト数、/api/combinations の段階ごとの処理時間、カタログの件数、
+    実行した SQL 文の数、コネクションプールの状態（DB 使用後のみ）を含む
+    
+    Returns:
+        text/plain: Prometheus のテキスト形式の計測値
+    """
+    return current_app.response_class(metrics.REGISTRY.render(), mimetype=None,
+                                      content_type=metrics.CONTENT_TYPE)
+
+
+def db_pool_metrics():
+    """作成済みのエンジンがあればプールの状態を計測値として返す（エンジンは作成しない）"""
+    from .db.database import current_engine
+    from .db.pool import pool_metrics
+    engine = current_engine()
+    return pool_metrics(engine) if engine is not None else []
+
+
+metrics.REGISTRY.register_collector(db_pool_metrics)
+
 
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# flask --app src.jaljalgotcha.main や gunicorn src.jaljalgotcha.main:app で使用する
+app = create_app()
 
 if __name__ == '__main__':
     app.run()
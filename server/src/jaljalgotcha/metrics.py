@@ -0,0 +1,312 @@
+"""
+アプリケーションの計測値（カウンター・ゲージ・ヒストグラム）
+
+Prometheus のテキスト形式で出力する（/metrics を参照）。
+標準ライブラリのみを使用し、読み込みで重いモジュールを読み込まない。
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 構造化ログを出力するリクエストの割合（0〜1）
+METRICS_LOG_SAMPLE_RATE = float(os.getenv('METRICS_LOG_SAMPLE_RATE', '0.01'))
+
+# 処理時間のヒストグラムの既定の上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prometheus のテキスト形式の Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    """ラベルの値をエスケープする"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """サンプルの値を文字列にする"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """ラベルを {name="value",...} の形式にする（ラベルがなければ空文字列）"""
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric(ABC):
+    """計測値の基底クラス（ラベルの値ごとに値を保持する、スレッドセーフ）"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        初期化
+
+        Args:
+            name: 計測値の名前
+            documentation: 説明（HELP 行に出力する）
+            labelnames: ラベルの名前
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, object]) -> LabelValues:
+        """キーワード引数のラベルを値のタプルにする"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} のラベルは {', '.join(self.labelnames) or 'なし'} です: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(サンプル名, ラベル名, ラベル値, 値) を返す"""
+        pass
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力する"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append(f'{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class _ValueMetric(Metric):
+    """ラベルの値ごとに1つの数値を保持する計測値"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def get(self, **labels) -> float:
+        """現在の値を取得する（未記録の場合は 0）"""
+        key = self._label_values(labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, value
+
+
+class Counter(_ValueMetric):
+    """増加のみするカウンター"""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        値を増やす
+
+        Args:
+            amount: 増加量（0以上）
+            **labels: ラベルの値
+        """
+        if amount < 0:
+            raise ValueError("カウンターは減らせません")
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    """任意の値を設定できるゲージ"""
+
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        """値を設定する"""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(Metric):
+    """観測値の分布（上限ごとの累積件数・合計・件数）を記録するヒストグラム"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # ラベルの値ごとの [上限ごとの件数（累積ではない）, 合計]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        観測値を記録する
+
+        Args:
+            value: 観測値
+            **labels: ラベルの値
+        """
+        key = self._label_values(labels)
+        # 上限が value 以上の最初のバケットに入れる
+        position = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[position] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """ブロックの実行時間（秒）を記録するコンテキストマネージャ"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        """観測した件数を取得する"""
+        key = self._label_values(labels)
+        with self._lock:
+            counts, _ = self._series.get(key, ([0], [0.0]))
+            return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        bucket_labelnames = self.labelnames + ('le',)
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket', bucket_labelnames, key + (_format_value(bound),), cumulative
+            yield f'{self.name}_sum', self.labelnames, key, total
+            yield f'{self.name}_count', self.labelnames, key, cumulative
+
+
+class Registry:
+    """計測値の登録先"""
+
+    def __init__(self):
+        """初期化"""
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        計測値を登録する
+
+        Raises:
+            ValueError: 同じ名前の計測値が登録済みの場合
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"計測値 {metric.name} は登録済みです")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        """
+        出力時に計測値を作成する関数を登録する（プールの状態など、出力時に読み取る値に使用する）
+
+        Args:
+            collector: 出力する計測値を返す関数
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """カウンターを作成して登録する"""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """ゲージを作成して登録する"""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """ヒストグラムを作成して登録する"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """登録されたすべての計測値を Prometheus のテキスト形式で出力する"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        return ''.join(metric.render() for metric in metrics)
+
+
+# アプリケーション共通の登録先と計測値
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'jaljalgotcha_http_requests_total', 'API リクエスト数', ('endpoint', 'status')
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'jaljalgotcha_http_request_duration_seconds', 'API リクエストの処理時間（秒）', ('endpoint',)
+)
+COMBINATION_STAGE_SECONDS = REGISTRY.histogram(
+    'jaljalgotcha_combinations_stage_duration_seconds',
+    '/api/combinations の段階（parse, fetch, select, serialize）ごとの処理時間（秒）', ('stage',)
+)
+COMBINATION_VIDEOS = REGISTRY.histogram(
+    'jaljalgotcha_combinations_candidate_videos', '組み合わせの選択対象になった動画の件数', ('source',),
+    buckets=(100, 1000, 10000, 100000, 1000000)
+)
+CATALOG_VIDEOS = REGISTRY.gauge('jaljalgotcha_catalog_videos', 'インメモリ動画カタログの件数')
+CATALOG_VERSION = REGISTRY.gauge('jaljalgotcha_catalog_version', 'インメモリ動画カタログのバージョン')
+CATALOG_LOADED_TIMESTAMP = REGISTRY.gauge(
+    'jaljalgotcha_catalog_loaded_timestamp_seconds', 'インメモリ動画カタログを読み込んだ時刻（UNIX 時間）'
+)
+DB_QUERIES = REGISTRY.counter(
+    'jaljalgotcha_db_queries_total', '実行した SQL 文の数（先頭のキーワードごと）', ('statement',)
+)
+
+
+def statement_kind(statement: str) -> str:
+    """SQL 文の種類（SELECT・INSERT など先頭のキーワード）を取得する"""
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+def log_sampled(logger: logging.Logger, event: str, rate: Optional[float] = None,
+                rng: Optional[random.Random] = None, **fields) -> bool:
+    """
+    一定の割合で構造化ログ（JSON）を INFO で出力する
+
+    フィールドは LogRecord の fields 属性にも設定する
+
+    Args:
+        logger: 出力先のロガー
+        event: イベント名
+        rate: 出力する割合（省略時は METRICS_LOG_SAMPLE_RATE）
+        rng: 乱数生成器（テスト用）
+        **fields: 出力するフィールド
+
+    Returns:
+        出力した場合は True
+    """
+    rate = METRICS_LOG_SAMPLE_RATE if rate is None else rate
+    if rate <= 0 or not logger.isEnabledFor(logging.INFO):
+        return False
+    if rate < 1 and (rng or random).random() >= rate:
+        return False
+    record = {"event": event, **fields}
+    logger.info(json.dumps(record, ensure_ascii=False, sort_keys=True, default=str),
+                extra={"event": event, "fields": fields})
+    return True
@@ -1,11 +1,18 @@
 """
 データモデルの定義
 """
+import sys
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import List, Optional
+from itertools import accumulate
+from typing import Iterable, List, Optional, Tuple, Union
 
+# 動画の再生ページの URL
+WATCH_URL = "https://www.youtube.com/watch?v="
 
-@dataclass
+
+@dataclass(slots=True)
 class Video:
     """動画データのモデル"""
     id: str  # 動画ID
@@ -13,6 +20,8 @@ class Video:
     duration: int  # 動画時間（秒）
     url: Optional[str] = None  # 動画URL（オプション）
     thumbnail_url: Optional[str] = None  # サムネイル画像URL（オプション）
+    like_count: int = 0  # いいね数（重み付き選択に使用する）
+    view_count: int = 0  # 再生数（重み付き選択に使用する）
     
     def __post_init__(self):
         """初期化後の処理"""
@@ -24,6 +33,26 @@ class Video:
             self.url = str(self.url)
         if self.thumbnail_url is not None:
             self.thumbnail_url = str(self.thumbnail_url)
+        self.like_count = int(self.like_count) if self.like_count is not None else 0
+        self.view_count = int(self.view_count) if self.view_count is not None else 0
+    
+    @classmethod
+    def from_trusted(cls, id: str, title: str, duration: int, url: Optional[str] = None,
+                     thumbnail_url: Optional[str] = None, like_count: int = 0, view_count: int = 0) -> 'Video':
+        """
+        型変換を行わずに作成する
+        
+        DB から読み込んだ値など、型がすでに保証されている場合に使用する。
+        """
+        video = object.__new__(cls)
+        video.id = id
+        video.title = title
+        video.duration = duration
+        video.url = url
+        video.thumbnail_url = thumbnail_url
+        video.like_count = like_count
+        video.view_count = view_count
+        return video
     
     def duration_minutes(self) -> float:
         """動画時間を分単位で返す"""
@@ -44,3 +73,132 @@ class VideoCollection:
     def remaining_duration_minutes(self) -> float:
         """残り時間を分単位で返す"""
         return self.remaining_time / 60
+
+
+class StringColumn(Sequence):
+    """
+    文字列の列を1つの文字列と開始位置の配列で保持する
+    
+    文字列ごとのオブジェクトを持たないため、大量の短い文字列を省メモリで保持できる。
+    None も保持できる。
+    """
+    
+    __slots__ = ('_data', '_offsets', '_missing')
+    
+    def __init__(self, values: Iterable[Optional[str]]):
+        """
+        初期化
+        
+        Args:
+            values: 保持する文字列の列
+        """
+        values = values if isinstance(values, (list, tuple)) else list(values)
+        self._data = ''.join([value for value in values if value is not None])
+        self._offsets = array('q', accumulate((len(value) if value is not None else 0 for value in values), initial=0))
+        self._missing = frozenset(i for i, value in enumerate(values) if value is None)
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, i: int) -> Optional[str]:
+        if i < 0:
+            i += len(self)
+        if i in self._missing:
+            return None
+        return self._data[self._offsets[i]:self._offsets[i + 1]]
+
+
+class VideoTable(Sequence):
+    """
+    動画一覧の列指向の表現
+    
+    動画時間は int32 の配列、いいね数と再生数は int64 の配列、動画IDは intern した文字列のタプル、
+    タイトルとサムネイル URL は StringColumn で保持する。
+    Video は要素を参照したときにのみ作成するため、選択結果に含まれる動画の分しか作られない。
+    """
+    
+    __slots__ = ('ids', 'durations', 'titles', 'thumbnail_urls', 'like_counts', 'view_counts')
+    
+    def __init__(self, ids: Tuple[str, ...], durations: array, titles: StringColumn, thumbnail_urls: StringColumn,
+                 like_counts: Optional[array] = None, view_counts: Optional[array] = None):
+        """
+        初期化（通常は from_rows または from_videos を使用する）
+        
+        Args:
+            ids: 動画IDのタプル
+            durations: 動画時間（秒）の int32 配列
+            titles: タイトルの列
+            thumbnail_urls: サムネイル URL の列
+            like_counts: いいね数の int64 配列（省略時はすべて0）
+            view_counts: 再生数の int64 配列（省略時はすべて0）
+        """
+        self.ids = ids
+        self.durations = durations
+        self.titles = titles
+        self.thumbnail_urls = thumbnail_urls
+        self.like_counts = like_counts if like_counts is not None else array('q', bytes(8 * len(ids)))
+        self.view_counts = view_counts if view_counts is not None else array('q', bytes(8 * len(ids)))
+    
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> 'VideoTable':
+        """
+        (動画ID, タイトル, 動画時間, サムネイル URL[, いいね数, 再生数]) の行から作成する
+        
+        Args:
+            rows: 行の列（いいね数と再生数がない場合はすべて0とする）
+            
+        Returns:
+            動画一覧
+        """
+        columns = tuple(zip(*rows))
+        if not columns:
+            return cls((), array('i'), StringColumn(()), StringColumn(()))
+        ids, titles, durations, thumbnail_urls, *counts = columns
+        like_counts, view_counts = (array('q', column) for column in counts) if counts else (None, None)
+        return cls(tuple(map(sys.intern, ids)), array('i', durations), StringColumn(titles), StringColumn(thumbnail_urls),
+                   like_counts, view_counts)
+    
+    @classmethod
+    def from_videos(cls, videos: Iterable[Video]) -> 'VideoTable':
+        """
+        Video の列から作成する
+        
+        Args:
+            videos: 動画の列
+            
+        Returns:
+            動画一覧
+        """
+        return cls.from_rows(
+            (video.id, video.title, video.duration, video.thumbnail_url, video.like_count, video.view_count)
+            for video in videos
+        )
+
+    def take(self, positions: Sequence[int]) -> 'VideoTable':
+        """
+        指定した位置の動画だけの動画一覧を作成する
+
+        Args:
+            positions: 動画の位置（この順に並べる）
+
+        Returns:
+            動画一覧
+        """
+        return VideoTable(
+            tuple(self.ids[i] for i in positions),
+            array('i', (self.durations[i] for i in positions)),
+            StringColumn([self.titles[i] for i in positions]),
+            StringColumn([self.thumbnail_urls[i] for i in positions]),
+            array('q', (self.like_counts[i] for i in positions)),
+            array('q', (self.view_counts[i] for i in positions))
+        )
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __getitem__(self, i: Union[int, slice]) -> Union[Video, List[Video]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        video_id = self.ids[i]
+        return Video.from_trusted(video_id, self.titles[i], self.durations[i], WATCH_URL + video_id,
+                                  self.thumbnail_urls[i], self.like_counts[i], self.view_counts[i])
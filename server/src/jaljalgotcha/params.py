@@ -0,0 +1,229 @@
+"""
+/api/combinations のリクエストパラメータの検証
+
+Flask（main.py）と ASGI（asgi.py）の両方で同じ検証とエラーメッセージを使用する
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from .services.video_service import MODES, MODE_RANDOM, WEIGHTINGS, WEIGHTING_NONE
+
+# 一括生成する候補数の上限
+MAX_CANDIDATES = 10000
+# 目標時間（分）の上限
+MAX_MINUTES = 1000
+# 一括取得で指定できる目標時間の数と、目標時間ごとの組み合わせの数の上限
+MAX_BATCH_TARGETS = 20
+MAX_BATCH_ATTEMPTS = 100
+# 逐次返す場合の Content-Type（1行に1つの JSON）
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# 動画の並び順（order パラメータ、date は公開日時の新しい順）
+ORDERS = ('duration', 'likes', 'views', 'date')
+
+
+@dataclass
+class CombinationRequest:
+    """/api/combinations のパラメータ"""
+    target_duration: int  # 目標時間（秒）
+    attempts: int = 3  # 生成する組み合わせの数
+    candidates: Optional[int] = None  # 一括生成する候補の数
+    mode: str = MODE_RANDOM  # 選択モード
+    weighting: str = WEIGHTING_NONE  # ランダム選択の重み付け
+    filters: Optional[Dict[str, Any]] = None  # 動画のフィルタリング条件（VideoService に渡す形式）
+    use_youtube: bool = False  # YouTubeのAPIを使用するかどうか
+    stream: bool = False  # NDJSON で逐次返すかどうか
+    top: Optional[int] = None  # 残り時間が少ない上位だけを返す件数
+
+
+def parse_minutes(duration_str: str) -> int:
+    """
+    分単位の時間のパラメータを検証して変換する
+
+    Args:
+        duration_str: 時間の文字列（分単位）
+
+    Returns:
+        時間（分）
+
+    Raises:
+        ValueError: HH:MM:SS形式、数値でない、範囲外の場合（メッセージはそのままレスポンスに使用する）
+    """
+    # HH:MM:SS形式は許可しない
+    if ':' in duration_str:
+        raise ValueError("HH:MM:SS形式は使用できません。分単位で入力してください")
+    try:
+        # 分単位として扱う
+        minutes = int(duration_str)
+    except (TypeError, ValueError):
+        raise ValueError("有効な数値を入力してください") from None
+    # 正の値であることを確認
+    if minutes <= 0:
+        raise ValueError("時間は正の値である必要があります")
+    # 最大1000分の制限を追加
+    if minutes > MAX_MINUTES:
+        raise ValueError(f"時間は最大{MAX_MINUTES}分までです")
+    return minutes
+
+
+def parse_candidates(candidates_str: Optional[str]) -> Optional[int]:
+    """
+    候補数のパラメータを検証して変換する
+
+    Args:
+        candidates_str: 候補数の文字列（未指定の場合は None または空文字列）
+
+    Returns:
+        候補数（未指定の場合は None）
+
+    Raises:
+        ValueError: 数値でない、上限を超える場合
+    """
+    if not candidates_str:
+        return None
+    try:
+        candidates = int(candidates_str)
+    except ValueError:
+        raise ValueError("候補数には有効な数値を入力してください") from None
+    if candidates > MAX_CANDIDATES:
+        raise ValueError(f"候補数は最大{MAX_CANDIDATES}までです")
+    return candidates
+
+
+def parse_weighting(weighting: Optional[str]) -> str:
+    """
+    重み付けのパラメータを検証する
+
+    Args:
+        weighting: 重み付けの文字列（未指定の場合は None または空文字列）
+
+    Returns:
+        重み付け（未指定の場合は none）
+
+    Raises:
+        ValueError: 不明な重み付けの場合
+    """
+    if not weighting:
+        return WEIGHTING_NONE
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"重み付けは {', '.join(WEIGHTINGS)} のいずれかを指定してください")
+    return weighting
+
+
+def parse_filters(args: Mapping[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    動画のフィルタリング条件のパラメータを検証して変換する
+
+    Args:
+        args: クエリパラメータ（max_duration: 最大動画時間（秒）、min_likes: 最小いいね数、
+            min_views: 最小再生数、order: 並び順）
+
+    Returns:
+        フィルタリング条件（VideoService に渡す形式、未指定の場合は None）
+
+    Raises:
+        ValueError: 数値でない、範囲外、不明な並び順の場合
+    """
+    filters: Dict[str, Any] = {}
+    for name, minimum in (('max_duration', 1), ('min_likes', 0), ('min_views', 0)):
+        value_str = args.get(name)
+        if not value_str:
+            continue
+        try:
+            value = int(value_str)
+        except ValueError:
+            raise ValueError(f"{name} には有効な数値を入力してください") from None
+        if value < minimum:
+            raise ValueError(f"{name} は{minimum}以上である必要があります")
+        filters[name] = value
+
+    order = args.get('order')
+    if order:
+        if order not in ORDERS:
+            raise ValueError(f"並び順は {', '.join(ORDERS)} のいずれかを指定してください")
+        filters['order'] = order
+
+    return filters or None
+
+
+def parse_combination_request(args: Mapping[str, str]) -> CombinationRequest:
+    """
+    /api/combinations のクエリパラメータを検証して変換する
+
+    Args:
+        args: クエリパラメータ
+
+    Returns:
+        パラメータ
+
+    Raises:
+        ValueError: パラメータが不正な場合（メッセージはそのままレスポンスに使用する）
+    """
+    duration_str = args.get('duration', '')
+
+    # attempsパラメータを安全に取得・変換
+    attempts_str = args.get('attempts', '3')
+    try:
+        # 数値部分のみを抽出して変換
+        attempts = int(attempts_str.split('&')[0])
+    except (ValueError, AttributeError):
+        attempts = 3
+
+    # 候補数パラメータを取得・変換（未指定の場合は一括生成しない）
+    candidates = parse_candidates(args.get('candidates'))
+
+    # 選択モードを取得
+    mode = args.get('mode', MODE_RANDOM)
+    if mode not in MODES:
+        raise ValueError(f"選択モードは {', '.join(MODES)} のいずれかを指定してください")
+
+    # 重み付けを取得
+    weighting = parse_weighting(args.get('weighting'))
+
+    # 動画のフィルタリング条件を取得
+    filters = parse_filters(args)
+
+    use_youtube = args.get('use_youtube', 'false').lower() == 'true'
+
+    # 逐次出力のパラメータを取得
+    stream = args.get('stream', 'false').lower() == 'true'
+    top = None
+    top_str = args.get('top')
+    if top_str:
+        try:
+            top = int(top_str)
+        except ValueError:
+            raise ValueError("top には有効な数値を入力してください") from None
+        if top <= 0:
+            raise ValueError("top は正の値である必要があります")
+
+    # パラメータのバリデーション
+    if not duration_str:
+        raise ValueError("時間を指定してください")
+
+    return CombinationRequest(
+        target_duration=parse_minutes(duration_str) * 60,
+        attempts=attempts,
+        candidates=candidates,
+        mode=mode,
+        weighting=weighting,
+        filters=filters,
+        use_youtube=use_youtube,
+        stream=stream,
+        top=top,
+    )
+
+
+def missing_youtube_key_error() -> Optional[Dict[str, str]]:
+    """
+    YouTube API キーが設定されていない場合のエラー（組み合わせが空で use_youtube 指定時に返す）
+
+    Returns:
+        エラーの内容（キーが設定されている場合は None）
+    """
+    from .config import YOUTUBE_API_KEY
+    if YOUTUBE_API_KEY and YOUTUBE_API_KEY != "your_youtube_api_key_here":
+        return None
+    return {
+        "error": "YouTube API キーが設定されていません。.envファイルで'YOUTUBE_API_KEY'を設定してください。",
+        "hint": "YouTubeデータAPIキーを取得して.envファイルに設定する必要があります。"
+    }
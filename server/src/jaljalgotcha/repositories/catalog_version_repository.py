@@ -0,0 +1,164 @@
+"""
+SQLAlchemy を使用したカタログのバージョンのリポジトリ実装
+
+動画を書き込むトランザクションで catalog_versions の行のバージョンを増やす。
+PostgreSQL では同じトランザクションで NOTIFY を送るため、コミットと同時に
+LISTEN している各プロセスに変更が通知される。
+"""
+import logging
+import select as select_module
+import threading
+from datetime import datetime
+from typing import Callable, Optional, Union
+
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, scoped_session
+
+from ..db.database import get_engine
+from ..db.models_db import CatalogVersionModel
+from .interfaces import CatalogVersionRepository
+
+logger = logging.getLogger(__name__)
+
+# 動画一覧のカタログの名前
+VIDEO_CATALOG = 'videos'
+# バージョンの変更を通知する PostgreSQL のチャンネル
+CATALOG_CHANNEL = 'jaljalgotcha_catalog'
+
+
+def bump_catalog_version(connection: Union[Connection, Session], name: str = VIDEO_CATALOG) -> int:
+    """
+    呼び出し側のトランザクション内でカタログのバージョンを1つ増やす（コミットは呼び出し側で行う）
+
+    行をロックして更新するため、同時に書き込むトランザクション同士でもバージョンは重複しない。
+
+    Args:
+        connection: 書き込み中の接続またはセッション
+        name: カタログの名前
+
+    Returns:
+        新しいバージョン
+    """
+    now = datetime.now()
+    dialect = connection.get_bind().dialect if isinstance(connection, Session) else connection.dialect
+    stmt = (
+        update(CatalogVersionModel)
+        .where(CatalogVersionModel.name == name)
+        .values(version=CatalogVersionModel.version + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if dialect.update_returning:
+        # 更新後のバージョンを同じ文で取得する（PostgreSQL・SQLite 3.35 以降）
+        version = connection.execute(stmt.returning(CatalogVersionModel.version)).scalar()
+    else:
+        version = None
+        if connection.execute(stmt).rowcount:
+            version = connection.execute(
+                select(CatalogVersionModel.version).where(CatalogVersionModel.name == name)
+            ).scalar_one()
+    if version is None:
+        # マイグレーションで追加する行がない場合（create_all で作成したテーブルなど）
+        version = 1
+        connection.execute(insert(CatalogVersionModel).values(name=name, version=version, updated_at=now))
+
+    if dialect.name == 'postgresql':
+        # 通知はコミット時に送られる（ロールバックした場合は送られない）
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {'channel': CATALOG_CHANNEL, 'payload': f"{name}:{version}"})
+    return version
+
+
+class DbCatalogVersionRepository(CatalogVersionRepository):
+    """SQLAlchemy を使用したカタログのバージョンのリポジトリの実装"""
+
+    def __init__(self, db_session: scoped_session[Session], db_engine: Optional[Engine] = None,
+                 name: str = VIDEO_CATALOG, listen_timeout: float = 5.0):
+        """
+        初期化
+
+        Args:
+            db_session: SQLAlchemy セッション
+            db_engine: 使用するエンジン（省略時はアプリケーション共通のエンジン）
+            name: カタログの名前
+            listen_timeout: 通知を待つ1回の最大時間（秒）、停止の確認と再接続の間隔にも使用する
+        """
+        self.db_session = db_session
+        self.engine = db_engine or get_engine()
+        self.name = name
+        self.listen_timeout = listen_timeout
+
+    def get_version(self) -> int:
+        """
+        現在のカタログのバージョンを取得する（1行だけを読む）
+
+        Returns:
+            バージョン（行がない場合は 0）
+        """
+        with self.engine.connect() as connection:
+            version = connection.execute(
+                select(CatalogVersionModel.version).where(CatalogVersionModel.name == self.name)
+            ).scalar()
+        return version or 0
+
+    def bump_version(self) -> int:
+        """
+        カタログのバージョンを1つ増やしてコミットする（DB を直接変更した後などに使用する）
+
+        Returns:
+            新しいバージョン
+        """
+        with self.engine.begin() as connection:
+            return bump_catalog_version(connection, self.name)
+
+    def listen(self, on_change: Callable[[], None], stop_event: threading.Event) -> bool:
+        """
+        PostgreSQL の LISTEN でバージョンの変更の通知を待つ
+
+        psycopg2 以外のドライバ・データベースでは通知に対応せず、すぐに False を返す。
+        接続が切れた場合は listen_timeout 秒後に再接続し、再接続の直後にも on_change を呼ぶ
+        （切れている間の変更を取りこぼさないため）。
+
+        Args:
+            on_change: 変更の通知を受けたときに呼ぶ関数
+            stop_event: 待機を終了するイベント
+
+        Returns:
+            通知に対応している場合は True（stop_event が設定されるまで戻らない）
+        """
+        if self.engine.dialect.name != 'postgresql' or self.engine.dialect.driver != 'psycopg2':
+            return False
+
+        while not stop_event.is_set():
+            try:
+                self._listen_once(on_change, stop_event)
+            except Exception:
+                logger.exception("カタログの変更の通知の待機に失敗しました。再接続します")
+                stop_event.wait(self.listen_timeout)
+        return True
+
+    def _listen_once(self, on_change: Callable[[], None], stop_event: threading.Event) -> None:
+        """1つの接続で通知を待つ（接続が切れた場合は例外）"""
+        raw = self.engine.raw_connection()
+        # LISTEN した接続はプールに戻さない
+        raw.detach()
+        try:
+            dbapi_connection = raw.driver_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CATALOG_CHANNEL}")
+            on_change()
+
+            while not stop_event.is_set():
+                readable, _, _ = select_module.select([dbapi_connection], [], [], self.listen_timeout)
+                if not readable:
+                    continue
+                dbapi_connection.poll()
+                notified = any(
+                    notify.payload.split(':', 1)[0] == self.name for notify in dbapi_connection.notifies
+                )
+                dbapi_connection.notifies.clear()
+                if notified:
+                    on_change()
+        finally:
+            raw.close()
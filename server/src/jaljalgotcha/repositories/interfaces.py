@@ -1,10 +1,11 @@
 """
 リポジトリのインターフェース定義
 """
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import Callable, Iterator, List, Optional, Dict, Any
 
-from ..models import Video
+from ..models import Video, VideoTable
 
 
 class VideoRepository(ABC):
@@ -22,3 +23,129 @@ class VideoRepository(ABC):
             動画のリスト
         """
         pass
+    
+    def iter_videos(self, filters: Optional[Dict[str, Any]] = None, batch_size: int = 1000) -> Iterator[Video]:
+        """
+        動画を1件ずつ返す（一覧全体を保持せずに読み込む）
+        
+        既定では get_videos の結果を順に返す。少しずつ読み込める実装はオーバーライドする。
+        
+        Args:
+            filters: フィルタリング条件（オプション、get_videos と同じ）
+            batch_size: 1回に読み込む件数の目安
+            
+        Yields:
+            動画（get_videos と同じ順）
+        """
+        yield from self.get_videos(filters)
+    
+    def get_video_table(self, filters: Optional[Dict[str, Any]] = None) -> VideoTable:
+        """
+        動画一覧を列指向の形式で取得する
+        
+        既定では get_videos の結果を変換する。直接作成できる実装はオーバーライドする。
+        
+        Args:
+            filters: フィルタリング条件（オプション）
+            
+        Returns:
+            動画一覧
+        """
+        return VideoTable.from_videos(self.get_videos(filters))
+
+
+class AsyncVideoRepository(ABC):
+    """動画リポジトリの非同期インターフェース（ASGI で使用する）"""
+    
+    @abstractmethod
+    async def get_videos(self, filters: Optional[Dict[str, Any]] = None) -> List[Video]:
+        """
+        動画のリストを取得する
+        
+        Args:
+            filters: フィルタリング条件（VideoRepository.get_videos と同じ）
+            
+        Returns:
+            動画のリスト
+        """
+        pass
+    
+    async def get_video_table(self, filters: Optional[Dict[str, Any]] = None) -> VideoTable:
+        """
+        動画一覧を列指向の形式で取得する
+        
+        Args:
+            filters: フィルタリング条件（オプション）
+            
+        Returns:
+            動画一覧
+        """
+        return VideoTable.from_videos(await self.get_videos(filters))
+
+
+class CombinationPoolRepository(ABC):
+    """事前計算した組み合わせプールのリポジトリのインターフェース"""
+    
+    @abstractmethod
+    def get_pool(self, minutes: int, catalog_fingerprint: str) -> Optional[List[List[str]]]:
+        """
+        指定された目標時間の組み合わせプールを取得する
+        
+        Args:
+            minutes: 目標時間（分）
+            catalog_fingerprint: 現在のカタログの指紋
+            
+        Returns:
+            組み合わせごとの動画IDのリスト（存在しないか指紋が一致しない場合は None）
+        """
+        pass
+    
+    @abstractmethod
+    def replace_pools(self, pools: Dict[int, List[List[str]]], catalog_fingerprint: str) -> None:
+        """
+        組み合わせプールをすべて置き換える
+        
+        Args:
+            pools: 目標時間（分）ごとの組み合わせのリスト
+            catalog_fingerprint: 計算に使用したカタログの指紋
+        """
+        pass
+
+
+class CatalogVersionRepository(ABC):
+    """カタログ（動画一覧）のバージョンのリポジトリのインターフェース"""
+    
+    @abstractmethod
+    def get_version(self) -> int:
+        """
+        現在のカタログのバージョンを取得する
+        
+        Returns:
+            バージョン（動画が追加・更新されるたびに増加する）
+        """
+        pass
+    
+    @abstractmethod
+    def bump_version(self) -> int:
+        """
+        カタログのバージョンを1つ増やす
+        
+        Returns:
+            新しいバージョン
+        """
+        pass
+    
+    def listen(self, on_change: Callable[[], None], stop_event: threading.Event) -> bool:
+        """
+        バージョンの変更の通知を待ち、通知ごとに on_change を呼ぶ（stop_event が設定されるまで戻らない）
+        
+        既定では通知に対応せず、すぐに False を返す（呼び出し側は get_version を定期的に確認する）。
+        
+        Args:
+            on_change: 変更の通知を受けたときに呼ぶ関数
+            stop_event: 待機を終了するイベント
+            
+        Returns:
+            通知に対応している場合は True
+        """
+        return False
@@ -0,0 +1,77 @@
+"""
+SQLAlchemy を使用した組み合わせプールのリポジトリ実装
+"""
+from typing import List, Optional, Dict
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, scoped_session
+
+from ..db.models_db import CombinationPoolModel
+from .interfaces import CombinationPoolRepository
+from ..db.database import get_engine
+
+
+class DbCombinationPoolRepository(CombinationPoolRepository):
+    """SQLAlchemy を使用した組み合わせプールのリポジトリの実装"""
+    
+    def __init__(self, db_session: scoped_session[Session], db_engine: Optional[Engine] = None):
+        """
+        初期化
+        
+        Args:
+            db_session: SQLAlchemy セッション
+            db_engine: 使用するエンジン（省略時はアプリケーション共通のエンジン）
+        """
+        self.db_session = db_session
+        self.engine = db_engine or get_engine()
+    
+    def get_pool(self, minutes: int, catalog_fingerprint: str) -> Optional[List[List[str]]]:
+        """
+        指定された目標時間の組み合わせプールを取得する
+        
+        Args:
+            minutes: 目標時間（分）
+            catalog_fingerprint: 現在のカタログの指紋
+            
+        Returns:
+            組み合わせごとの動画IDのリスト（存在しないか指紋が一致しない場合は None）
+        """
+        with Session(self.engine) as session:
+            pool = session.get(CombinationPoolModel, minutes)
+            
+            # 古いカタログで計算されたプールは使用しない
+            if pool is None or pool.catalog_fingerprint != catalog_fingerprint:
+                return None
+            
+            return pool.video_ids
+    
+    def replace_pools(self, pools: Dict[int, List[List[str]]], catalog_fingerprint: str) -> None:
+        """
+        組み合わせプールをすべて置き換える（1トランザクションで実行）
+        
+        Args:
+            pools: 目標時間（分）ごとの組み合わせのリスト
+            catalog_fingerprint: 計算に使用したカタログの指紋
+        """
+        with Session(self.engine) as session:
+            session.execute(delete(CombinationPoolModel))
+            session.add_all([
+                CombinationPoolModel(
+                    minutes=minutes,
+                    catalog_fingerprint=catalog_fingerprint,
+                    video_ids=video_ids
+                )
+                for minutes, video_ids in pools.items()
+            ])
+            session.commit()
+    
+    def get_fingerprint(self) -> Optional[str]:
+        """
+        保存されているプールの計算に使用したカタログの指紋を取得する
+        
+        Returns:
+            カタログの指紋（プールが存在しない場合は None）
+        """
+        with Session(self.engine) as session:
+            pool = session.query(CombinationPoolModel).first()
+            return pool.catalog_fingerprint if pool else None
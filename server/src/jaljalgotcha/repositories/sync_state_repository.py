@@ -0,0 +1,72 @@
+"""
+SQLAlchemy を使用した同期状態のリポジトリ実装
+"""
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, scoped_session
+
+from ..db.models_db import SyncStateModel
+from ..db.database import get_engine
+
+
+class SyncWatermark(NamedTuple):
+    """同期済みの最新の動画"""
+    video_id: str  # 動画ID
+    published_at: datetime  # 公開日時（UTC）
+
+
+class DbSyncStateRepository:
+    """SQLAlchemy を使用した同期状態のリポジトリの実装"""
+    
+    def __init__(self, db_session: scoped_session[Session], db_engine: Optional[Engine] = None):
+        """
+        初期化
+        
+        Args:
+            db_session: SQLAlchemy セッション
+            db_engine: 使用するエンジン（省略時はアプリケーション共通のエンジン）
+        """
+        self.db_session = db_session
+        self.engine = db_engine or get_engine()
+    
+    def get_watermark(self, channel_id: str) -> Optional[SyncWatermark]:
+        """
+        チャンネルのウォーターマークを取得する
+        
+        Args:
+            channel_id: YouTube チャンネルID
+            
+        Returns:
+            ウォーターマーク（未同期の場合は None）
+        """
+        with Session(self.engine) as session:
+            state = session.get(SyncStateModel, channel_id)
+            if state is None or state.last_video_id is None or state.last_published_at is None:
+                return None
+            
+            published_at = state.last_published_at
+            # タイムゾーンなしで保存されている場合は UTC とみなす
+            if published_at.tzinfo is None:
+                published_at = published_at.replace(tzinfo=timezone.utc)
+            return SyncWatermark(video_id=state.last_video_id, published_at=published_at)
+    
+    def save_watermark(self, channel_id: str, watermark: SyncWatermark) -> None:
+        """
+        チャンネルのウォーターマークを保存する
+        
+        Args:
+            channel_id: YouTube チャンネルID
+            watermark: 保存するウォーターマーク
+        """
+        with Session(self.engine) as session:
+            state = session.get(SyncStateModel, channel_id)
+            if state is None:
+                state = SyncStateModel(channel_id=channel_id)
+                session.add(state)
+            
+            state.last_video_id = watermark.video_id
+            # DB には UTC のタイムゾーンなし日時として保存する
+            state.last_published_at = watermark.published_at.astimezone(timezone.utc).replace(tzinfo=None)
+            state.synced_at = datetime.now()
+            session.commit()
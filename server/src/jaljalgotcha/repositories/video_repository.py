@@ -1,106 +1,284 @@
 """
 SQLAlchemy を使用したデータベースリポジトリ実装
 """
-from typing import List, Optional, Dict, Any
+import importlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session, scoped_session
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.sql import ColumnElement, Select
 
-from ..models import Video
+from ..models import WATCH_URL, Video, VideoTable
 from ..db.models_db import VideoModel
+from .catalog_version_repository import bump_catalog_version
 from .interfaces import VideoRepository
-from ..db.database import engine
+from ..db.database import get_engine
+
+# 書き込む列
+VIDEO_COLUMNS = (
+    'video_id', 'channel_id', 'title', 'duration_seconds', 'view_count', 'like_count',
+    'comment_count', 'thumbnail_url', 'published_at', 'updated_at',
+)
+# 読み込む列（選択処理とレスポンスに必要なもののみ、いいね数・再生数は重み付き選択に使用する）
+VIDEO_READ_COLUMNS = (
+    VideoModel.video_id, VideoModel.title, VideoModel.duration_seconds, VideoModel.thumbnail_url,
+    func.coalesce(VideoModel.like_count, 0), func.coalesce(VideoModel.view_count, 0),
+)
+# 変更の有無の判定に使用する列（updated_at 以外）
+COMPARED_COLUMNS = tuple(column for column in VIDEO_COLUMNS if column not in ('video_id', 'updated_at'))
+# ON CONFLICT DO UPDATE に対応したデータベースと INSERT 文の生成関数を持つモジュール
+# （ダイアレクトは使用するときに読み込む）
+UPSERT_DIALECTS = {
+    'postgresql': 'sqlalchemy.dialects.postgresql',
+    'sqlite': 'sqlalchemy.dialects.sqlite',
+}
+# iter_videos で1回に読み込む件数の既定値
+ITER_BATCH_SIZE = 1000
+# 1つの文で使用するバインドパラメータの上限（SQLite の既定の上限 32766 より小さくする）
+MAX_BIND_PARAMS = 30000
+
+
+def _at_least(column: Any, minimum: int) -> ColumnElement:
+    """
+    NULL を0として扱った `column >= minimum` の条件（カタログの絞り込みと同じ結果にする）
+
+    minimum が正の場合は NULL の行は条件に合わないため、インデックスを使用できる比較のみにする
+    """
+    if minimum > 0:
+        return column >= minimum
+    return or_(column >= minimum, column.is_(None))
+
+
+@dataclass
+class UpsertResult:
+    """一括保存の結果"""
+    inserted: int = 0  # 追加された件数
+    updated: int = 0  # 内容が更新された件数
+    unchanged: int = 0  # 内容に変更がなかった件数
+    
+    def __add__(self, other: 'UpsertResult') -> 'UpsertResult':
+        return UpsertResult(
+            inserted=self.inserted + other.inserted,
+            updated=self.updated + other.updated,
+            unchanged=self.unchanged + other.unchanged
+        )
+    
+    @property
+    def changed(self) -> int:
+        """追加または更新された件数"""
+        return self.inserted + self.updated
 
 
 class DbVideoRepository(VideoRepository):
     """SQLAlchemy を使用したデータベースリポジトリの実装"""
     
-    def __init__(self, db_session: scoped_session[Session]):
+    def __init__(self, db_session: scoped_session[Session], db_engine: Optional[Engine] = None,
+                 trust_rows: bool = True):
         """
         初期化
         
         Args:
             db_session: SQLAlchemy セッション
+            db_engine: 使用するエンジン（省略時はアプリケーション共通のエンジン）
+            trust_rows: True の場合は読み込んだ行の値を型変換せずに Video を作成する
         """
         self.db_session = db_session
-        self.engine = engine
+        self.engine = db_engine or get_engine()
+        self.trust_rows = trust_rows
     
     def get_videos(self, filters: Optional[Dict[str, Any]] = None) -> List[Video]:
         """
         データベースから動画のリストを取得する
         
+        ORM のインスタンスは作らず、必要な列だけを選択した結果の行から直接 Video を作成する。
+        
         Args:
             filters: フィルタリング条件（オプション）
                 - max_duration: 最大動画時間（秒）
                 - min_likes: 最小いいね数
                 - min_views: 最小再生数
-                - order_by: 並び順 ('duration', 'likes', 'views', 'published_at')
+                - order_by: 並び順 ('duration', 'likes', 'views', 'published_at'、'date' は 'published_at' と同じ)
                 - order_dir: 並び順の方向 ('asc', 'desc')
+                  （時間順では同じ時間の動画を動画ID順にする）
+                - limit: 最大件数
+                - offset: 読み飛ばす件数
             
         Returns:
             動画のリスト
         """
-        # コンテキストマネージャを使用して自動ロールバック
-        with Session(self.engine) as session:
-            # クエリの作成
-            query = session.query(VideoModel)
+        stmt = self._filtered_select(VIDEO_READ_COLUMNS, filters)
+        # 型が保証された DB の値は Video での型変換を省略できる
+        make_video = Video.from_trusted if self.trust_rows else Video
+        
+        with self.engine.connect() as connection:
+            return [
+                make_video(video_id, title, duration, WATCH_URL + video_id, thumbnail_url, like_count, view_count)
+                for video_id, title, duration, thumbnail_url, like_count, view_count in connection.execute(stmt)
+            ]
+    
+    def get_video_table(self, filters: Optional[Dict[str, Any]] = None) -> VideoTable:
+        """
+        データベースから動画一覧を列指向の形式で取得する
+        
+        行ごとの Video を作らずに列の配列へ直接詰める。
+        
+        Args:
+            filters: フィルタリング条件（get_videos と同じ）
+            
+        Returns:
+            動画一覧
+        """
+        stmt = self._filtered_select(VIDEO_READ_COLUMNS, filters)
+        with self.engine.connect() as connection:
+            return VideoTable.from_rows(connection.execute(stmt))
+    
+    def iter_videos(self, filters: Optional[Dict[str, Any]] = None,
+                    batch_size: int = ITER_BATCH_SIZE) -> Iterator[Video]:
+        """
+        データベースから動画を batch_size 件ずつ読み込みながら1件ずつ返す
+        
+        件数によらず保持するのは batch_size 件までになる。時間順（既定）の場合は
+        (時間, 動画ID) のキーセットでページごとに別の短いクエリを実行し、長いトランザクションを保持しない。
+        NULL を含みうる列の順（いいね数・再生数・公開日時）の場合は1つのクエリを
+        サーバーサイドカーソルで batch_size 件ずつ読み込む。
+        
+        Args:
+            filters: フィルタリング条件（get_videos と同じ、limit・offset も使用できる）
+            batch_size: 1回に読み込む件数
             
-            # フィルタリング条件の適用
-            if filters:
-                if 'max_duration' in filters:
-                    query = query.filter(VideoModel.duration_seconds <= filters['max_duration'])
-                
-                if 'min_likes' in filters:
-                    query = query.filter(VideoModel.like_count >= filters['min_likes'])
-                
-                if 'min_views' in filters:
-                    query = query.filter(VideoModel.view_count >= filters['min_views'])
-                
-                # 並び順の適用
-                order_by = filters.get('order_by', 'duration_seconds')
-                order_dir = filters.get('order_dir', 'asc')
-                
-                # 並び順のカラムを取得
-                if order_by == 'duration':
-                    order_column = VideoModel.duration_seconds
-                elif order_by == 'likes':
-                    order_column = VideoModel.like_count
-                elif order_by == 'views':
-                    order_column = VideoModel.view_count
-                elif order_by == 'published_at':
-                    order_column = VideoModel.published_at
-                else:
-                    order_column = VideoModel.duration_seconds
-                
-                # 並び順の方向を適用
-                if order_dir == 'desc':
-                    query = query.order_by(order_column.desc())
-                else:
-                    query = query.order_by(order_column)
+        Yields:
+            動画（get_videos と同じ順）
+        """
+        filters = filters or {}
+        make_video = Video.from_trusted if self.trust_rows else Video
+        if self._order(filters)[0] is VideoModel.duration_seconds:
+            rows = self._iter_keyset_rows(filters, batch_size)
+        else:
+            rows = self._iter_cursor_rows(filters, batch_size)
+        
+        for video_id, title, duration, thumbnail_url, like_count, view_count in rows:
+            yield make_video(video_id, title, duration, WATCH_URL + video_id, thumbnail_url, like_count, view_count)
+    
+    def _iter_keyset_rows(self, filters: Dict[str, Any], batch_size: int) -> Iterator[Row]:
+        """
+        時間順の行を (時間, 動画ID) のキーセットでページごとに読み込む
+        
+        ページの間に追加・更新された行は、キーが読み込み済みの位置より後であれば含まれる。
+        """
+        descending = self._order(filters)[1]
+        key = tuple_(VideoModel.duration_seconds, VideoModel.video_id)
+        stmt = self._filtered_select(
+            VIDEO_READ_COLUMNS, {name: value for name, value in filters.items() if name not in ('limit', 'offset')}
+        )
+        
+        remaining = filters.get('limit')
+        last_key = None
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            if last_key is None:
+                page = stmt.offset(filters['offset']) if filters.get('offset') else stmt
             else:
-                # デフォルトは時間順
-                query = query.order_by(VideoModel.duration_seconds)
+                page = stmt.where(key < last_key if descending else key > last_key)
+            with self.engine.connect() as connection:
+                rows = connection.execute(page.limit(size)).all()
+            yield from rows
+            if len(rows) < size:
+                return
+            video_id, _, duration = rows[-1][:3]
+            last_key = tuple_(literal(duration), literal(video_id))
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def _iter_cursor_rows(self, filters: Dict[str, Any], batch_size: int) -> Iterator[Row]:
+        """1つのクエリの結果をサーバーサイドカーソル（SQLite では通常のカーソル）で batch_size 件ずつ読み込む"""
+        stmt = self._filtered_select(VIDEO_READ_COLUMNS, filters)
+        with self.engine.connect() as connection:
+            yield from connection.execution_options(yield_per=batch_size).execute(stmt)
+    
+    @staticmethod
+    def _filtered_select(columns, filters: Optional[Dict[str, Any]] = None) -> Select:
+        """
+        フィルタリング条件と並び順を適用した SELECT 文を作成する
+        
+        Args:
+            columns: 選択する列
+            filters: フィルタリング条件（get_videos と同じ）
             
-            # クエリの実行
-            db_videos = query.all()
+        Returns:
+            SELECT 文
+        """
+        stmt = select(*columns).where(*DbVideoRepository._conditions(filters))
+        
+        # 並び順の適用（デフォルトは時間順）
+        order_column, descending = DbVideoRepository._order(filters)
+        order_columns = [order_column]
+        if order_column is VideoModel.duration_seconds:
+            # 同じ時間の動画は動画ID順にする（iter_videos のキーセットと同じ順、idx_duration_covering の順）
+            order_columns.append(VideoModel.video_id)
+        stmt = stmt.order_by(*(column.desc() if descending else column for column in order_columns))
+        
+        # 件数の制限
+        if filters:
+            if filters.get('offset'):
+                stmt = stmt.offset(filters['offset'])
+            if filters.get('limit') is not None:
+                stmt = stmt.limit(filters['limit'])
+        return stmt
+    
+    @staticmethod
+    def _conditions(filters: Optional[Dict[str, Any]]) -> List[ColumnElement]:
+        """フィルタリング条件の WHERE 句の条件のリスト"""
+        conditions = []
+        if filters:
+            if 'max_duration' in filters:
+                conditions.append(VideoModel.duration_seconds <= filters['max_duration'])
             
-            # VideoModel から Video モデルへの変換
-            videos = []
-            for db_video in db_videos:
-                # VideoModel から Video モデルへの変換（型エラー回避のため getattr を使用）
-                video_id = getattr(db_video, 'video_id')
-                title = getattr(db_video, 'title')
-                duration_seconds = getattr(db_video, 'duration_seconds')
-                thumbnail_url = getattr(db_video, 'thumbnail_url', None)
-                
-                videos.append(Video(
-                    id=video_id,
-                    title=title,
-                    duration=duration_seconds,
-                    url=f"https://www.youtube.com/watch?v={video_id}",
-                    thumbnail_url=thumbnail_url
-                ))
+            if 'min_likes' in filters:
+                conditions.append(_at_least(VideoModel.like_count, filters['min_likes']))
             
-            return videos
+            if 'min_views' in filters:
+                conditions.append(_at_least(VideoModel.view_count, filters['min_views']))
+        return conditions
+    
+    @staticmethod
+    def _order(filters: Optional[Dict[str, Any]]) -> Tuple[Any, bool]:
+        """並び順の列と降順かどうか"""
+        if not filters:
+            return VideoModel.duration_seconds, False
+        
+        order_by = filters.get('order_by', 'duration_seconds')
+        
+        # 並び順のカラムを取得
+        if order_by == 'likes':
+            order_column = VideoModel.like_count
+        elif order_by == 'views':
+            order_column = VideoModel.view_count
+        elif order_by in ('published_at', 'date'):
+            order_column = VideoModel.published_at
+        else:
+            order_column = VideoModel.duration_seconds
+        
+        return order_column, filters.get('order_dir', 'asc') == 'desc'
+    
+    def get_stale_video_ids(self, channel_id: str, updated_before: datetime) -> List[str]:
+        """
+        指定日時より前に更新された動画のIDを取得する
+        
+        Args:
+            channel_id: YouTube チャンネルID
+            updated_before: この日時より前に更新された動画を対象とする
+            
+        Returns:
+            動画IDのリスト
+        """
+        with Session(self.engine) as session:
+            rows = session.query(VideoModel.video_id).filter(
+                VideoModel.channel_id == channel_id,
+                VideoModel.updated_at < updated_before
+            ).all()
+            return [row.video_id for row in rows]
     
     def save_video(self, video_model: VideoModel) -> VideoModel:
         """
@@ -112,35 +290,8 @@ class DbVideoRepository(VideoRepository):
         Returns:
             保存された VideoModel オブジェクト
         """
-        # コンテキストマネージャを使用して自動コミットまたはロールバック
-        with Session(self.engine) as session:
-            # 既存の動画を検索
-            existing_video = session.query(VideoModel).filter(
-                VideoModel.video_id == video_model.video_id
-            ).first()
-            
-            if existing_video:
-                # 既存の動画を更新
-                existing_video.channel_id = video_model.channel_id
-                existing_video.title = video_model.title
-                existing_video.duration_seconds = video_model.duration_seconds
-                existing_video.view_count = video_model.view_count
-                existing_video.like_count = video_model.like_count
-                existing_video.comment_count = video_model.comment_count
-                existing_video.thumbnail_url = video_model.thumbnail_url
-                existing_video.published_at = video_model.published_at
-                existing_video.updated_at = video_model.updated_at
-                result = existing_video
-            else:
-                # 新しい動画を追加
-                session.add(video_model)
-                result = video_model
-            
-            # 変更をコミット（コンテキストマネージャのexitでコミット）
-            session.commit()
-            
-            # 新しいインスタンスを返す（セッションはクローズされるため、detachedな状態で返す）
-            return result
+        self.upsert_videos([video_model])
+        return video_model
     
     def save_videos(self, video_models: List[VideoModel]) -> List[VideoModel]:
         """
@@ -152,34 +303,115 @@ class DbVideoRepository(VideoRepository):
         Returns:
             保存された VideoModel オブジェクトのリスト
         """
-        # コンテキストマネージャを使用してセッションを管理
-        with Session(self.engine) as session:
-            saved_videos = []
-            
-            for video_model in video_models:
-                # 既存の動画を検索
-                existing_video = session.query(VideoModel).filter(
-                    VideoModel.video_id == video_model.video_id
-                ).first()
-                
-                if existing_video:
-                    # 既存の動画を更新
-                    existing_video.channel_id = video_model.channel_id
-                    existing_video.title = video_model.title
-                    existing_video.duration_seconds = video_model.duration_seconds
-                    existing_video.view_count = video_model.view_count
-                    existing_video.like_count = video_model.like_count
-                    existing_video.comment_count = video_model.comment_count
-                    existing_video.thumbnail_url = video_model.thumbnail_url
-                    existing_video.published_at = video_model.published_at
-                    existing_video.updated_at = video_model.updated_at
-                    saved_videos.append(existing_video)
-                else:
-                    # 新しい動画を追加
-                    session.add(video_model)
-                    saved_videos.append(video_model)
+        self.upsert_videos(video_models)
+        return video_models
+    
+    def upsert_videos(self, video_models: List[VideoModel], chunk_size: int = 500) -> UpsertResult:
+        """
+        複数の動画をまとめて追加または更新する
+        
+        チャンクごとに既存の行を1回のクエリで取得して内容を比較し、
+        追加・変更がある行のみを1つの文で書き込む。
+        PostgreSQL と SQLite では INSERT ... ON CONFLICT DO UPDATE を使用し、
+        それ以外のデータベースでは一括 INSERT と主キーによる一括 UPDATE を使用する。
+        内容が変わらない行は updated_at のみ更新する（古い行の再取得の判定に使用するため）。
+        追加・変更があった場合はカタログのバージョンを増やす（catalog_version_repository を参照）。
+        
+        Args:
+            video_models: 保存する VideoModel オブジェクトのリスト
+            chunk_size: 1回の書き込みで扱う最大件数
             
-            # 一括でコミット
+        Returns:
+            追加・更新・変更なしの件数
+        """
+        # 同じ動画IDが複数ある場合は後のものを採用する
+        rows = list({row['video_id']: row for row in map(self._to_row, video_models)}.values())
+        chunk_size = max(1, min(chunk_size, MAX_BIND_PARAMS // len(VIDEO_COLUMNS)))
+        result = UpsertResult()
+        
+        with Session(self.engine) as session:
+            for i in range(0, len(rows), chunk_size):
+                result += self._upsert_chunk(session, rows[i:i + chunk_size])
+            if result.changed:
+                # 同じトランザクションでカタログのバージョンを増やし、各プロセスのカタログに変更を知らせる
+                bump_catalog_version(session)
             session.commit()
+        
+        return result
+    
+    def _upsert_chunk(self, session: Session, rows: List[Dict[str, Any]]) -> UpsertResult:
+        """
+        1チャンク分の動画を追加または更新する（コミットは呼び出し側で行う）
+        
+        Args:
+            session: SQLAlchemy セッション
+            rows: 書き込む行（列名から値への辞書）のリスト
+            
+        Returns:
+            追加・更新・変更なしの件数
+        """
+        existing = {
+            row.video_id: row
+            for row in session.execute(
+                select(*[getattr(VideoModel, column) for column in COMPARED_COLUMNS], VideoModel.video_id)
+                .where(VideoModel.video_id.in_([row['video_id'] for row in rows]))
+            )
+        }
+        
+        new_rows = []
+        changed_rows = []
+        unchanged_ids = []
+        for row in rows:
+            current = existing.get(row['video_id'])
+            if current is None:
+                new_rows.append(row)
+            elif any(getattr(current, column) != row[column] for column in COMPARED_COLUMNS):
+                changed_rows.append(row)
+            else:
+                unchanged_ids.append(row['video_id'])
+        
+        dialect = self.engine.dialect.name
+        if new_rows or changed_rows:
+            if dialect in UPSERT_DIALECTS:
+                # 追加と更新を1つの文で書き込む
+                dialect_insert = importlib.import_module(UPSERT_DIALECTS[dialect]).insert
+                stmt = dialect_insert(VideoModel).values(new_rows + changed_rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[VideoModel.video_id],
+                    set_={column: stmt.excluded[column] for column in VIDEO_COLUMNS if column != 'video_id'}
+                )
+                session.execute(stmt)
+            else:
+                if new_rows:
+                    session.execute(insert(VideoModel), new_rows)
+                if changed_rows:
+                    session.execute(update(VideoModel), changed_rows)
+        
+        if unchanged_ids:
+            session.execute(
+                update(VideoModel)
+                .where(VideoModel.video_id.in_(unchanged_ids))
+                .values(updated_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+        
+        return UpsertResult(inserted=len(new_rows), updated=len(changed_rows), unchanged=len(unchanged_ids))
+    
+    @staticmethod
+    def _to_row(video_model: VideoModel) -> Dict[str, Any]:
+        """
+        VideoModel を書き込み用の辞書に変換する
+        
+        Args:
+            video_model: 変換する VideoModel オブジェクト
             
-            return saved_videos
+        Returns:
+            列名から値への辞書
+        """
+        row = {column: getattr(video_model, column) for column in VIDEO_COLUMNS}
+        # DB には UTC のタイムゾーンなし日時として保存する
+        if row['published_at'] is not None and row['published_at'].tzinfo is not None:
+            row['published_at'] = row['published_at'].astimezone(timezone.utc).replace(tzinfo=None)
+        if row['updated_at'] is None:
+            row['updated_at'] = datetime.now()
+        return row
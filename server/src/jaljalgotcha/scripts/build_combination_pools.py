@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+目標時間（分）ごとの組み合わせプールを事前計算してデータベースに保存するスクリプト
+"""
+import sys
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+project_root = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.jaljalgotcha.db.database import init_db, db_session
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+from src.jaljalgotcha.repositories.pool_repository import DbCombinationPoolRepository
+from src.jaljalgotcha.services.catalog import catalog_fingerprint
+from src.jaljalgotcha.services.combination_pool import build_combination_pools
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# すべての目標時間の最適化の制限時間の合計の既定値（秒）
+DEFAULT_TOTAL_BUDGET = 120.0
+
+
+def rebuild_pools(pool_size: int = 50, time_budget: float = 1.0, force: bool = False,
+                  total_budget: Optional[float] = DEFAULT_TOTAL_BUDGET) -> bool:
+    """
+    カタログが変わっていれば組み合わせプールを再計算して保存する
+    
+    Args:
+        pool_size: 目標時間ごとの組み合わせの数
+        time_budget: 目標時間ごとの最適化の制限時間（秒）
+        force: カタログが変わっていなくても再計算するかどうか
+        total_budget: すべての目標時間の最適化の制限時間の合計（秒）、None の場合は制限しない
+        
+    Returns:
+        再計算した場合は True
+    """
+    videos = DbVideoRepository(db_session).get_videos()
+    fingerprint = catalog_fingerprint(videos)
+    pool_repository = DbCombinationPoolRepository(db_session)
+    
+    if not force and pool_repository.get_fingerprint() == fingerprint:
+        logger.info("カタログに変更がないため組み合わせプールの再計算を省略しました。")
+        return False
+    
+    logger.info(f"{len(videos)}件の動画から組み合わせプールを計算します...")
+    pools = build_combination_pools(videos, pool_size=pool_size, time_budget=time_budget, total_budget=total_budget)
+    pool_repository.replace_pools(pools, fingerprint)
+    
+    logger.info(f"{len(pools)}件の目標時間の組み合わせプールを保存しました（指紋: {fingerprint}）")
+    return True
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='組み合わせプールを事前計算する')
+    parser.add_argument('--pool-size', type=int, default=50, help='目標時間ごとの組み合わせの数')
+    parser.add_argument('--time-budget', type=float, default=1.0, help='目標時間ごとの最適化の制限時間（秒）')
+    parser.add_argument('--total-budget', type=float, default=DEFAULT_TOTAL_BUDGET,
+                        help='すべての目標時間の最適化の制限時間の合計（秒、0以下で制限しない）')
+    parser.add_argument('--force', action='store_true', help='カタログに変更がなくても再計算する')
+    args = parser.parse_args()
+    
+    try:
+        init_db()
+        rebuild_pools(pool_size=args.pool_size, time_budget=args.time_budget, force=args.force,
+                      total_budget=args.total_budget if args.total_budget > 0 else None)
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {e}")
+        sys.exit(1)
+    finally:
+        # セッションをクローズ
+        db_session.remove()
+
+
+if __name__ == "__main__":
+    main()
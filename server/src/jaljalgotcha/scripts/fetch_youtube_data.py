@@ -4,11 +4,20 @@ YouTube APIからデータを取得してデータベースに保存するスク
 """
 import os
 import sys
+import argparse
 import logging
+import random
 import re
+import threading
+import time
+import httplib2
 import isodate
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
@@ -18,8 +27,10 @@ sys.path.insert(0, str(project_root))
 
 from src.jaljalgotcha.db.database import init_db, db_session
 from src.jaljalgotcha.db.models_db import VideoModel
-from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
-from src.jaljalgotcha.config import YOUTUBE_API_KEY, YOUTUBE_CHANNEL_ID
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository, UpsertResult
+from src.jaljalgotcha.repositories.sync_state_repository import DbSyncStateRepository, SyncWatermark
+from src.jaljalgotcha.config import YOUTUBE_API_KEY, YOUTUBE_CHANNEL_ID, YOUTUBE_FETCH_WORKERS, INGEST_BATCH_SIZE
+from src.jaljalgotcha.scripts.build_combination_pools import rebuild_pools
 
 # ロガーの設定
 logging.basicConfig(
@@ -28,6 +39,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# videos().list で一度に取得できる動画IDの最大数
+DETAILS_CHUNK_SIZE = 50
+# HTTP リクエストのタイムアウト（秒）
+HTTP_TIMEOUT = 30
+# 再試行する HTTP ステータスコード
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 再試行する 403 エラーの理由（レート制限）
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+T = TypeVar('T')
+
 
 def parse_iso8601_duration(duration_str: str) -> int:
     """
@@ -42,16 +64,218 @@ def parse_iso8601_duration(duration_str: str) -> int:
     return int(isodate.parse_duration(duration_str).total_seconds())
 
 
-def fetch_videos_from_youtube(api_key: str, channel_id: str) -> list:
+class YouTubeClientPool:
+    """
+    スレッドごとの YouTube API クライアント
+    
+    discovery クライアント（とその中の httplib2.Http）はスレッドセーフではないため、
+    スレッドごとに1つ作成して使い回す。同じスレッドの要求は同じHTTP接続を再利用する。
+    """
+    
+    def __init__(self, client_factory: Callable[[], Any]):
+        """
+        初期化
+        
+        Args:
+            client_factory: YouTube API クライアントを生成する関数
+        """
+        self.client_factory = client_factory
+        self._local = threading.local()
+    
+    def get(self) -> Any:
+        """
+        現在のスレッドのクライアントを取得する
+        
+        Returns:
+            YouTube API クライアント
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self.client_factory()
+            self._local.client = client
+        return client
+
+
+def build_youtube_client(api_key: str) -> Any:
+    """
+    YouTube API クライアントを生成する
+    
+    Args:
+        api_key: YouTube API キー
+        
+    Returns:
+        YouTube API クライアント
+    """
+    return build('youtube', 'v3', developerKey=api_key, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+
+def is_transient_error(error: HttpError) -> bool:
+    """
+    再試行すれば成功する可能性のあるエラーかどうかを判定する
+    
+    Args:
+        error: YouTube API のエラー
+        
+    Returns:
+        一時的なエラーの場合は True
+    """
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_STATUS_CODES:
+        return True
+    if status == 403:
+        reasons = {detail.get('reason') for detail in (error.error_details or []) if isinstance(detail, dict)}
+        return bool(reasons & RETRYABLE_REASONS)
+    return False
+
+
+def execute_with_retry(request: Any, max_retries: int = 5, base_delay: float = 1.0,
+                       sleep: Callable[[float], None] = time.sleep) -> dict:
+    """
+    API リクエストを実行し、一時的なエラーの場合は指数バックオフで再試行する
+    
+    Args:
+        request: execute メソッドを持つ API リクエスト
+        max_retries: 最大再試行回数
+        base_delay: 初回の待機時間（秒）、再試行ごとに2倍になる
+        sleep: 待機に使用する関数
+        
+    Returns:
+        API のレスポンス
+        
+    Raises:
+        HttpError: 一時的でないエラー、または再試行回数を超えた場合
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return request.execute()
+        except HttpError as e:
+            if attempt >= max_retries or not is_transient_error(e):
+                raise
+            # 同時に再試行が集中しないようにゆらぎを加える
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            logger.warning(f"YouTube API の一時的なエラーのため {delay:.1f} 秒後に再試行します（{attempt + 1}/{max_retries}）: {e}")
+            sleep(delay)
+
+
+def fetch_video_details(clients: YouTubeClientPool, video_ids: List[str],
+                        sleep: Callable[[float], None] = time.sleep) -> List[dict]:
+    """
+    動画IDのチャンク（最大50件）の詳細情報を取得する
+    
+    Args:
+        clients: スレッドごとの YouTube API クライアント
+        video_ids: 動画IDのリスト
+        sleep: 再試行の待機に使用する関数
+        
+    Returns:
+        動画情報のリスト
+    """
+    request = clients.get().videos().list(
+        id=','.join(video_ids),
+        part='snippet,contentDetails,statistics'
+    )
+    return execute_with_retry(request, sleep=sleep).get('items', [])
+
+
+def parse_published_at(published_at_str: str) -> datetime:
+    """
+    YouTube API の日時文字列（2023-01-01T00:00:00Z）を datetime に変換する
+    
+    Args:
+        published_at_str: ISO 8601形式の日時文字列
+        
+    Returns:
+        タイムゾーン付きの datetime
+    """
+    return datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
+
+
+def reached_watermark(playlist_item: dict, watermark: Optional[SyncWatermark]) -> bool:
+    """
+    プレイリストアイテムが同期済みの範囲に達したかどうかを判定する
+    
+    アップロードプレイリストは新しい順に並ぶため、ウォーターマークの動画か
+    それより前に公開された動画に達したら、以降はすべて同期済みとみなす。
+    
+    Args:
+        playlist_item: プレイリストアイテム
+        watermark: 前回の同期のウォーターマーク
+        
+    Returns:
+        同期済みの範囲に達した場合は True
+    """
+    if watermark is None:
+        return False
+    
+    snippet = playlist_item['snippet']
+    if snippet['resourceId']['videoId'] == watermark.video_id:
+        return True
+    
+    # 動画の公開日時を優先し、なければプレイリストへの追加日時を使う
+    published_at_str = playlist_item.get('contentDetails', {}).get('videoPublishedAt') or snippet.get('publishedAt')
+    return bool(published_at_str) and parse_published_at(published_at_str) <= watermark.published_at
+
+
+def fetch_videos_from_youtube(api_key: str, channel_id: str, max_workers: int = 4,
+                              client_factory: Optional[Callable[[], Any]] = None,
+                              sleep: Callable[[float], None] = time.sleep,
+                              watermark: Optional[SyncWatermark] = None,
+                              refresh_video_ids: Sequence[str] = ()) -> list:
     """
     YouTube APIから動画情報を取得する
     
+    すべての結果をリストにまとめて返す。大きなチャンネルでは
+    iter_videos_from_youtube で逐次処理する方がメモリ使用量が少ない。
+    
     Args:
         api_key: YouTube API キー
         channel_id: YouTube チャンネルID
+        max_workers: 詳細取得の最大同時実行数
+        client_factory: YouTube API クライアントを生成する関数（省略時は build_youtube_client）
+        sleep: 再試行の待機に使用する関数
+        watermark: 前回の同期のウォーターマーク（省略時はすべての動画を取得）
+        refresh_video_ids: プレイリストに関係なく詳細を取得し直す動画ID（古くなった行など）
         
     Returns:
-        動画情報のリスト
+        動画情報のリスト（プレイリストの順、続いて refresh_video_ids の順）
+    """
+    return list(iter_videos_from_youtube(
+        api_key, channel_id,
+        max_workers=max_workers,
+        client_factory=client_factory,
+        sleep=sleep,
+        watermark=watermark,
+        refresh_video_ids=refresh_video_ids
+    ))
+
+
+def iter_videos_from_youtube(api_key: str, channel_id: str, max_workers: int = 4,
+                             client_factory: Optional[Callable[[], Any]] = None,
+                             sleep: Callable[[float], None] = time.sleep,
+                             watermark: Optional[SyncWatermark] = None,
+                             refresh_video_ids: Sequence[str] = (),
+                             max_pending: Optional[int] = None) -> Iterator[dict]:
+    """
+    YouTube APIから動画情報を逐次取得する
+    
+    プレイリストのページを取得するたびに、そのページの動画IDの詳細取得を
+    スレッドプールに投入し、ページングと詳細取得を並行して行う。
+    未処理の詳細取得が max_pending 件を超えると、古いものから結果を返すまで
+    次のページを取得しないため、メモリ使用量はチャンネルの大きさによらず一定になる。
+    ウォーターマークが指定された場合は、同期済みの範囲に達した時点でページングを止める。
+    
+    Args:
+        api_key: YouTube API キー
+        channel_id: YouTube チャンネルID
+        max_workers: 詳細取得の最大同時実行数
+        client_factory: YouTube API クライアントを生成する関数（省略時は build_youtube_client）
+        sleep: 再試行の待機に使用する関数
+        watermark: 前回の同期のウォーターマーク（省略時はすべての動画を取得）
+        refresh_video_ids: プレイリストに関係なく詳細を取得し直す動画ID（古くなった行など）
+        max_pending: 結果を返さずに保持する詳細取得の最大数（省略時は max_workers の2倍）
+        
+    Yields:
+        動画情報（プレイリストの順、続いて refresh_video_ids の順）
     """
     if not api_key:
         raise ValueError("YouTube API キーが設定されていません。")
@@ -59,72 +283,98 @@ def fetch_videos_from_youtube(api_key: str, channel_id: str) -> list:
     if not channel_id:
         raise ValueError("YouTube チャンネルIDが設定されていません。")
     
+    clients = YouTubeClientPool(client_factory or (lambda: build_youtube_client(api_key)))
+    max_pending = max_pending or max_workers * 2
+    
     try:
-        # YouTube APIクライアントの初期化
-        youtube = build('youtube', 'v3', developerKey=api_key)
+        youtube = clients.get()
         
         # まずチャンネル情報を取得して、アップロードプレイリストIDを取得
-        channel_response = youtube.channels().list(
+        channel_response = execute_with_retry(youtube.channels().list(
             id=channel_id,
             part='contentDetails'
-        ).execute()
+        ), sleep=sleep)
         
         if not channel_response.get('items'):
             logger.warning(f"チャンネルID '{channel_id}' が見つかりませんでした。")
-            return []
+            return
         
         # アップロードプレイリストIDを取得（すべての動画を含む特別なプレイリスト）
         uploads_playlist_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
         logger.info(f"チャンネルのアップロードプレイリストID: {uploads_playlist_id}")
         
-        # プレイリストから全ての動画を取得
-        all_video_ids = []
+        # プレイリストのページごとに詳細取得を投入（1ページ50件 = APIの1回の上限）
+        pending = deque()
+        total_ids = 0
         next_page_token = None
         page_count = 0
+        # 古くなった動画のうち、プレイリストでまだ見つかっていないもの
+        refresh_ids = dict.fromkeys(refresh_video_ids)
         
-        while True:
-            # プレイリストアイテムを取得（ページングあり）
-            playlist_response = youtube.playlistItems().list(
-                playlistId=uploads_playlist_id,
-                part='snippet',
-                maxResults=50,  # APIの最大値
-                pageToken=next_page_token
-            ).execute()
-            
-            # 動画IDをリストに追加
-            video_ids = [item['snippet']['resourceId']['videoId'] for item in playlist_response.get('items', [])]
-            all_video_ids.extend(video_ids)
-            
-            # ページ数をカウント
-            page_count += 1
-            logger.info(f"プレイリストページ {page_count}: {len(video_ids)}件の動画IDを取得しました（合計: {len(all_video_ids)}件）")
-            
-            # 次のページがあるか確認
-            next_page_token = playlist_response.get('nextPageToken')
-            if not next_page_token:
-                logger.info(f"全ての動画IDを取得しました（合計: {len(all_video_ids)}件）")
-                break
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='youtube-details') as executor:
+            try:
+                while True:
+                    # プレイリストアイテムを取得（ページングあり）
+                    playlist_response = execute_with_retry(youtube.playlistItems().list(
+                        playlistId=uploads_playlist_id,
+                        part='snippet,contentDetails',
+                        maxResults=50,  # APIの最大値
+                        pageToken=next_page_token
+                    ), sleep=sleep)
+                    
+                    video_ids = []
+                    reached = False
+                    for item in playlist_response.get('items', []):
+                        if reached_watermark(item, watermark):
+                            reached = True
+                            break
+                        video_ids.append(item['snippet']['resourceId']['videoId'])
+                    for video_id in video_ids:
+                        refresh_ids.pop(video_id, None)
+                    if video_ids:
+                        pending.append(executor.submit(fetch_video_details, clients, video_ids, sleep))
+                    total_ids += len(video_ids)
+                    
+                    # ページ数をカウント
+                    page_count += 1
+                    logger.info(f"プレイリストページ {page_count}: {len(video_ids)}件の動画IDを取得しました（合計: {total_ids}件）")
+                    
+                    # 未処理の詳細取得が上限を超えたら古いものから結果を返す
+                    while len(pending) > max_pending:
+                        yield from pending.popleft().result()
+                    
+                    # 同期済みの範囲に達した場合は以降のページを取得しない
+                    if reached:
+                        logger.info(f"同期済みの動画に達しました（新しい動画: {total_ids}件）")
+                        break
+                    
+                    # 次のページがあるか確認
+                    next_page_token = playlist_response.get('nextPageToken')
+                    if not next_page_token:
+                        logger.info(f"全ての動画IDを取得しました（合計: {total_ids}件）")
+                        break
+                
+                # 古くなった動画の詳細を取得し直す（新しい動画と重複するものは除く）
+                refresh_ids = list(refresh_ids)
+                if refresh_ids:
+                    logger.info(f"{len(refresh_ids)}件の古くなった動画の詳細を取得し直します")
+                for i in range(0, len(refresh_ids), DETAILS_CHUNK_SIZE):
+                    pending.append(executor.submit(
+                        fetch_video_details, clients, refresh_ids[i:i + DETAILS_CHUNK_SIZE], sleep
+                    ))
+                    while len(pending) > max_pending:
+                        yield from pending.popleft().result()
+                
+                # 投入順に残りの結果を返す（いずれかが失敗した場合は例外を送出）
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                # 途中で終了した場合は未実行の詳細取得を取り消す
+                for future in pending:
+                    future.cancel()
         
-        # 動画IDのリストを取得
-        video_ids = all_video_ids
-        
-        if not video_ids:
+        if not total_ids and watermark is None:
             logger.warning(f"チャンネルID '{channel_id}' に動画が見つかりませんでした。")
-            return []
-        
-        # 動画の詳細情報を取得（50件ずつに分割して取得）
-        all_videos = []
-        # YouTubeのAPIは一度に最大50件のIDしか処理できないため、50件ずつに分割
-        chunk_size = 50
-        for i in range(0, len(video_ids), chunk_size):
-            chunk = video_ids[i:i + chunk_size]
-            videos_response = youtube.videos().list(
-                id=','.join(chunk),
-                part='snippet,contentDetails,statistics'
-            ).execute()
-            all_videos.extend(videos_response.get('items', []))
-        
-        return all_videos
         
     except HttpError as e:
         logger.error(f"YouTube API エラー: {e}")
@@ -134,6 +384,25 @@ def fetch_videos_from_youtube(api_key: str, channel_id: str) -> list:
         raise
 
 
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    要素を batch_size 件ずつのリストにまとめる
+    
+    Args:
+        items: 要素の列
+        batch_size: 1バッチの件数
+        
+    Yields:
+        要素のリスト（最後のバッチは batch_size 件未満の場合がある）
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
 def convert_to_video_model(youtube_video: dict) -> VideoModel:
     """
     YouTube APIのレスポンスからVideoModelオブジェクトを作成する
@@ -162,8 +431,7 @@ def convert_to_video_model(youtube_video: dict) -> VideoModel:
     thumbnail_url = youtube_video['snippet']['thumbnails']['default']['url']
     
     # 公開日時
-    published_at_str = youtube_video['snippet']['publishedAt']
-    published_at = datetime.fromisoformat(published_at_str.replace('Z', '+00:00'))
+    published_at = parse_published_at(youtube_video['snippet']['publishedAt'])
     
     # VideoModelオブジェクトの作成
     return VideoModel(
@@ -180,8 +448,65 @@ def convert_to_video_model(youtube_video: dict) -> VideoModel:
     )
 
 
-def main():
+def newest_watermark(video_models: List[VideoModel],
+                     current: Optional[SyncWatermark]) -> Optional[SyncWatermark]:
+    """
+    取得した動画と現在のウォーターマークから新しいウォーターマークを求める
+    
+    Args:
+        video_models: 取得した動画
+        current: 現在のウォーターマーク
+        
+    Returns:
+        最も新しく公開された動画のウォーターマーク
+    """
+    watermark = current
+    for video in video_models:
+        if video.published_at is not None and (watermark is None or video.published_at > watermark.published_at):
+            watermark = SyncWatermark(video_id=video.video_id, published_at=video.published_at)
+    return watermark
+
+
+def positive_int(value: str) -> int:
+    """
+    正の整数のコマンドライン引数を解析する
+    
+    Args:
+        value: 引数の文字列
+        
+    Returns:
+        整数値
+    """
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"正の整数を指定してください: {value}")
+    return number
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析する
+    
+    Args:
+        argv: コマンドライン引数（省略時は sys.argv）
+        
+    Returns:
+        解析結果
+    """
+    parser = argparse.ArgumentParser(description='YouTube APIから動画データを取得してデータベースに保存する')
+    parser.add_argument('--full', action='store_true', help='ウォーターマークを無視してすべての動画を取得する')
+    parser.add_argument('--stale-days', type=float, default=7.0,
+                        help='この日数より前に更新された動画の詳細を取得し直す（0以下で無効）')
+    parser.add_argument('--batch-size', type=positive_int, default=INGEST_BATCH_SIZE,
+                        help='1回の保存（コミット）でまとめる動画の件数')
+    parser.add_argument('--skip-pools', action='store_true',
+                        help='組み合わせプールを再計算しない（build_combination_pools を別に実行する）')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """メイン処理"""
+    args = parse_args(argv)
     try:
         # データベースの初期化
         init_db()
@@ -193,25 +518,59 @@ def main():
         if api_key is None or channel_id is None:
             raise Exception("APIキーが空です。")
         
-        logger.info(f"YouTube APIからチャンネル '{channel_id}' の動画データを取得します...")
-        youtube_videos = fetch_videos_from_youtube(api_key, channel_id)
-        logger.info(f"{len(youtube_videos)}件の動画データを取得しました。")
+        repo = DbVideoRepository(db_session)
+        sync_state_repo = DbSyncStateRepository(db_session)
         
-        # VideoModelオブジェクトに変換
-        video_models = [convert_to_video_model(video) for video in youtube_videos]
+        # 差分同期: 前回の同期以降の動画と、古くなった動画のみを取得する
+        watermark = None if args.full else sync_state_repo.get_watermark(channel_id)
+        refresh_video_ids = []
+        if watermark is not None and args.stale_days > 0:
+            refresh_video_ids = repo.get_stale_video_ids(
+                channel_id, datetime.now() - timedelta(days=args.stale_days)
+            )
         
-        # データベースに保存
-        repo = DbVideoRepository(db_session)
-        saved_videos = repo.save_videos(video_models)
+        if watermark is None:
+            logger.info(f"YouTube APIからチャンネル '{channel_id}' の全ての動画データを取得します...")
+        else:
+            logger.info(f"YouTube APIからチャンネル '{channel_id}' の {watermark.published_at} 以降の動画データを取得します...")
+        youtube_videos = iter_videos_from_youtube(
+            api_key, channel_id,
+            max_workers=YOUTUBE_FETCH_WORKERS,
+            watermark=watermark,
+            refresh_video_ids=refresh_video_ids
+        )
+        
+        # VideoModelオブジェクトに変換し、バッチごとにデータベースに保存（バッチごとにコミット）
+        result = UpsertResult()
+        new_watermark = watermark
+        saved_count = 0
+        for batch in iter_batches(map(convert_to_video_model, youtube_videos), args.batch_size):
+            result += repo.upsert_videos(batch)
+            new_watermark = newest_watermark(batch, new_watermark)
+            
+            # 保存した動画の情報を表示
+            if saved_count == 0:
+                for i, video in enumerate(batch[:5], 1):  # 最初の5件のみ表示
+                    logger.info(f"{i}. {video.title} ({video.duration_seconds}秒)")
+            saved_count += len(batch)
+            logger.info(f"{saved_count}件の動画データを保存しました。")
         
-        logger.info(f"{len(saved_videos)}件の動画データをデータベースに保存しました。")
+        logger.info(
+            f"{saved_count}件の動画データをデータベースに保存しました"
+            f"（追加: {result.inserted}件、更新: {result.updated}件、変更なし: {result.unchanged}件）。"
+        )
         
-        # 保存した動画の情報を表示
-        for i, video in enumerate(saved_videos[:5], 1):  # 最初の5件のみ表示
-            logger.info(f"{i}. {video.title} ({video.duration_seconds}秒)")
+        # すべてのバッチの保存が完了してからウォーターマークを進める
+        # （途中で失敗した場合は次回同じ範囲を取得し直し、保存済みの行は変更なしになる）
+        if new_watermark is not None and new_watermark != watermark:
+            sync_state_repo.save_watermark(channel_id, new_watermark)
+            logger.info(f"ウォーターマークを更新しました: {new_watermark.video_id} ({new_watermark.published_at})")
         
-        if len(saved_videos) > 5:
-            logger.info(f"...他 {len(saved_videos) - 5} 件")
+        # カタログが変わった場合は組み合わせプールを再計算（最適化の時間は合計で制限する）
+        if args.skip_pools:
+            logger.info("組み合わせプールの再計算を省略しました（--skip-pools）")
+        else:
+            rebuild_pools()
         
     except Exception as e:
         logger.error(f"エラーが発生しました: {e}")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+データベースのスキーマのマイグレーションを適用するスクリプト
+"""
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# プロジェクトのルートディレクトリをPythonパスに追加
+project_root = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.jaljalgotcha.db.database import get_engine
+from src.jaljalgotcha.db.migrations import MIGRATIONS, migrate, pending_migrations
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='データベースのマイグレーションを適用する')
+    parser.add_argument('--status', action='store_true', help='適用せずに未適用のマイグレーションを表示する')
+    parser.add_argument('--target', type=int, default=None, help='このバージョンまでを適用する')
+    args = parser.parse_args()
+
+    try:
+        engine = get_engine()
+        if args.status:
+            pending = pending_migrations(engine, args.target)
+            for migration in MIGRATIONS:
+                state = '未適用' if migration in pending else '適用済み'
+                logger.info(f"{migration.version}: {migration.description}（{state}）")
+            return
+
+        applied = migrate(engine, args.target)
+        if applied:
+            logger.info(f"{len(applied)}件のマイグレーションを適用しました。")
+        else:
+            logger.info("適用するマイグレーションはありません。")
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+動画選択エンジンパッケージ
+"""
@@ -0,0 +1,140 @@
+"""
+NumPy を使用した組み合わせの一括生成
+
+多数の候補をまとめて生成し、残り時間が少ないものから上位を返す。
+
+各候補は「動画をランダムな順に並べ、残り時間に収まるものを先頭から取る」
+ことで作る。ランダム順で最初に収まる動画は収まる動画の中で一様に分布するため、
+1本ずつ random.choice で選ぶ貪欲法と同じ分布になる。
+収まらなくなるまでの先頭部分は累積和で一度に求め、
+その後の部分だけを列ごとに全候補まとめて走査する。
+
+候補ごとに全動画を並べ替えるため作業量は 候補数 × 動画数 になる。
+これが MAX_BATCH_ELEMENTS を超える場合は時間インデックスで1組ずつ生成する。
+"""
+import heapq
+import random
+from operator import attrgetter
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .index import DurationIndex, Selection
+
+# 1チャンクで扱う要素数（候補数 × 動画数）の上限
+CHUNK_ELEMENTS = 1 << 20
+# 一括生成する要素数（候補数 × 動画数）の上限、超える場合は時間インデックスで生成する
+MAX_BATCH_ELEMENTS = 1 << 24
+
+
+def generate_best_selections(durations: Sequence[int], target_duration: int, attempts: int,
+                             candidates: int, min_remaining: int = 60,
+                             rng: Optional[np.random.Generator] = None,
+                             index: Optional[DurationIndex] = None) -> List[Selection]:
+    """
+    候補を一括生成し、残り時間が少ない順に上位 attempts 件を返す
+
+    候補数 × 目標時間以下の動画の数が MAX_BATCH_ELEMENTS を超える場合は、
+    一括生成せずに時間インデックスで候補を1組ずつ生成する（選択の分布は同じ）。
+
+    Args:
+        durations: 動画時間（秒）の並び
+        target_duration: 目標時間（秒）
+        attempts: 返す組み合わせの数
+        candidates: 生成する候補の数（attempts 未満の場合は attempts 件生成する）
+        min_remaining: 許容される最小残り時間（秒）
+        rng: NumPy の乱数生成器（省略時は新規に生成）
+        index: durations の時間インデックス（一括生成しない場合に使用する、省略時は作成する）
+
+    Returns:
+        選択結果のリスト（残り時間が少ない順）
+    """
+    if attempts <= 0:
+        return []
+
+    rng = rng or np.random.default_rng()
+    durations = np.asarray(durations, dtype=np.int64)
+    candidates = max(candidates, attempts)
+
+    # 目標時間を超える動画は選ばれることがないので最初から除外する
+    eligible = np.flatnonzero(durations <= target_duration).astype(np.int32)
+    if len(eligible) == 0 or target_duration <= min_remaining:
+        return [Selection(indices=[], total_time=0, remaining_time=target_duration)] * attempts
+
+    if candidates * len(eligible) > MAX_BATCH_ELEMENTS:
+        index = index if index is not None else DurationIndex(durations.tolist())
+        selections = index.iter_select(
+            target_duration, candidates, min_remaining, random.Random(int(rng.integers(1 << 63)))
+        )
+        return heapq.nsmallest(attempts, selections, key=attrgetter('remaining_time'))
+
+    rows_per_chunk = max(1, CHUNK_ELEMENTS // len(eligible))
+    best: List[Selection] = []
+
+    for start in range(0, candidates, rows_per_chunk):
+        rows = min(rows_per_chunk, candidates - start)
+        chunk = _generate_chunk(durations, eligible, target_duration, rows, attempts, min_remaining, rng)
+        best = sorted(best + chunk, key=lambda selection: selection.remaining_time)[:attempts]
+
+    return best
+
+
+def _generate_chunk(durations: np.ndarray, eligible: np.ndarray, target_duration: int, rows: int,
+                    keep: int, min_remaining: int, rng: np.random.Generator) -> List[Selection]:
+    """
+    rows 件の候補を生成し、チャンク内の上位 keep 件を返す
+
+    Args:
+        durations: 動画時間（秒）の配列
+        eligible: 目標時間以下の動画のインデックス配列
+        target_duration: 目標時間（秒）
+        rows: 生成する候補の数
+        keep: 返す候補の数
+        min_remaining: 許容される最小残り時間（秒）
+        rng: NumPy の乱数生成器
+
+    Returns:
+        選択結果のリスト
+    """
+    # 候補ごとのランダムな並び順と、その順に並べた動画時間
+    order = rng.permuted(np.tile(eligible, (rows, 1)), axis=1)
+    ordered_durations = durations[order]
+    columns = order.shape[1]
+
+    # 先頭から連続して収まる部分を累積和で求める
+    cumulative = np.cumsum(ordered_durations, axis=1)
+    fits = cumulative <= target_duration
+    first_miss = np.where(fits.all(axis=1), columns, fits.argmin(axis=1))
+    # 残り時間が min_remaining 以下になった時点で選択は終了する
+    done = (target_duration - cumulative) <= min_remaining
+    first_done = np.where(done.any(axis=1), done.argmax(axis=1) + 1, columns)
+    prefix_length = np.minimum(first_miss, first_done)
+
+    taken = np.arange(columns) < prefix_length[:, None]
+    row_ids = np.arange(rows)
+    prefix_total = np.where(prefix_length > 0, cumulative[row_ids, np.maximum(prefix_length - 1, 0)], 0)
+    remaining = target_duration - prefix_total
+
+    # 収まらない動画に当たった候補は、その先を1列ずつ走査して収まる動画を取る
+    min_duration = int(durations[eligible].min())
+    active = (remaining > min_remaining) & (remaining >= min_duration) & (prefix_length < columns)
+    if active.any():
+        for column in range(int(prefix_length[active].min()), columns):
+            column_durations = ordered_durations[:, column]
+            take = active & (column >= prefix_length) & (column_durations <= remaining)
+            remaining = remaining - np.where(take, column_durations, 0)
+            taken[:, column] |= take
+            active &= (remaining > min_remaining) & (remaining >= min_duration)
+            if not active.any():
+                break
+
+    # チャンク内の上位のみ Selection に変換する
+    best_rows = np.argsort(remaining, kind='stable')[:keep]
+    return [
+        Selection(
+            indices=order[row][taken[row]].tolist(),
+            total_time=int(target_duration - remaining[row]),
+            remaining_time=int(remaining[row])
+        )
+        for row in best_rows
+    ]
@@ -0,0 +1,112 @@
+"""
+部分和の動的計画法による最適な組み合わせの探索
+
+到達可能な合計時間を Python の整数をビット集合として求め（i ビット目が立っていれば
+合計 i 秒を作れる）、目標時間以下で最大の合計を作る組み合わせをランダムに選ぶ
+"""
+import random
+import time
+from typing import List, Optional, Sequence
+
+from .index import Selection
+
+# 制限時間を確認する間隔（動画数）
+_DEADLINE_CHECK_INTERVAL = 32
+
+
+def find_best_fit_selections(durations: Sequence[int], target_duration: int, attempts: int,
+                             time_budget: float, rng: Optional[random.Random] = None) -> Optional[List[Selection]]:
+    """
+    残り時間が最小になる組み合わせを attempts 件探す
+
+    Args:
+        durations: 動画時間（秒）の並び
+        target_duration: 目標時間（秒）
+        attempts: 返す組み合わせの数
+        time_budget: 制限時間（秒）
+        rng: 乱数生成器（省略時は random モジュール）
+
+    Returns:
+        選択結果のリスト、制限時間内に終わらなかった場合は None
+    """
+    rng = rng or random
+    deadline = time.perf_counter() + time_budget
+
+    # 長さ0の動画は合計を変えないので除外する
+    eligible = [i for i, duration in enumerate(durations) if 0 < duration <= target_duration]
+    mask = (1 << (target_duration + 1)) - 1
+
+    # 到達可能な合計時間のビット集合
+    reachable = 1
+    for count, i in enumerate(eligible, 1):
+        reachable |= (reachable << durations[i]) & mask
+        # 目標時間ちょうどに到達したらそれ以上は改善しない
+        if reachable >> target_duration:
+            break
+        if count % _DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+            return None
+
+    best_total = reachable.bit_length() - 1
+
+    selections = []
+    for _ in range(attempts):
+        indices = _sample_subset(durations, eligible, best_total, mask, deadline, rng)
+        if indices is None:
+            return None
+        selections.append(Selection(
+            indices=indices,
+            total_time=best_total,
+            remaining_time=target_duration - best_total
+        ))
+
+    return selections
+
+
+def _sample_subset(durations: Sequence[int], eligible: List[int], total: int, mask: int,
+                   deadline: float, rng) -> Optional[List[int]]:
+    """
+    合計が total になる組み合わせをランダムに1つ選ぶ
+
+    候補をシャッフルした順に前から到達可能集合を作り、total に初めて到達した位置から
+    後ろ向きにたどる。各動画を使うか使わないかは、どちらでも total を作れる場合は
+    ランダムに決める。
+
+    Args:
+        durations: 動画時間（秒）の並び
+        eligible: 対象の動画のインデックス
+        total: 作る合計時間（秒）
+        mask: 目標時間までのビットマスク
+        deadline: 制限時刻（time.perf_counter の値）
+        rng: 乱数生成器
+
+    Returns:
+        選択された動画のインデックス（選択順）、制限時間を超えた場合は None
+    """
+    order = list(eligible)
+    rng.shuffle(order)
+
+    # prefixes[j] は order の先頭 j 件で到達可能な合計時間のビット集合
+    prefixes = [1]
+    target_bit = 1 << total
+    for count, i in enumerate(order, 1):
+        if prefixes[-1] & target_bit:
+            break
+        prefixes.append(prefixes[-1] | ((prefixes[-1] << durations[i]) & mask))
+        if count % _DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+            return None
+
+    selected = []
+    remaining = total
+    for j in range(len(prefixes) - 1, 0, -1):
+        if remaining == 0:
+            break
+        duration = durations[order[j - 1]]
+        can_skip = (prefixes[j - 1] >> remaining) & 1
+        can_take = duration <= remaining and (prefixes[j - 1] >> (remaining - duration)) & 1
+        if can_take and (not can_skip or rng.random() < 0.5):
+            selected.append(order[j - 1])
+            remaining -= duration
+
+    # 再生順がかたよらないように並びもシャッフルする
+    rng.shuffle(selected)
+    return selected
@@ -0,0 +1,179 @@
+"""
+時間順インデックスを使用した動画選択エンジン
+
+動画を時間順に並べた位置の上に Fenwick 木（Binary Indexed Tree）を構築し、
+「残り時間以下の未使用動画から一様に1つ選ぶ」操作を O(log n) で行う。
+各位置に正の整数の重みを持たせると、同じ操作で重みに比例した確率で選ぶ
+（選択済みの動画の除外と残り時間による絞り込みはそのまま使える）。
+"""
+import random
+from bisect import bisect_right
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+
+class Selection(NamedTuple):
+    """選択結果（元の並びでのインデックス）"""
+    indices: List[int]  # 選択された動画のインデックス（選択順）
+    total_time: int  # 合計時間（秒）
+    remaining_time: int  # 残り時間（秒）
+
+
+class DurationIndex:
+    """
+    動画時間の昇順インデックス
+
+    構築後は不変で、複数スレッドから同時に選択を行ってよい。
+    選択ごとの使用済み状態は select_many（iter_select）の呼び出し内でのみ保持する。
+    """
+
+    def __init__(self, durations: Sequence[int], weights: Optional[Sequence[int]] = None):
+        """
+        初期化
+
+        Args:
+            durations: 動画時間（秒）の並び
+            weights: 選択の重み（1以上の整数、durations と同じ並び）。省略時はすべて1（一様な選択）
+        """
+        # 安定ソートなので、同じ時間の動画は元の並び順を保つ
+        self.order = sorted(range(len(durations)), key=durations.__getitem__)
+        self.sorted_durations = [durations[i] for i in self.order]
+        self.size = len(self.order)
+
+        if weights is None:
+            # すべての位置が未使用（重み1）の状態の Fenwick 木
+            self.weights = None
+            self._initial_tree = [0] + [i & -i for i in range(1, self.size + 1)]
+        else:
+            if len(weights) != self.size:
+                raise ValueError("weights の長さが durations と一致しません")
+            self.weights = [int(weights[i]) for i in self.order]
+            if self.weights and min(self.weights) < 1:
+                raise ValueError("weights は1以上の整数で指定してください")
+            self._initial_tree = self._build_tree(self.weights)
+        self._top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def select(self, target_duration: int, min_remaining: int = 60,
+               rng: Optional[random.Random] = None) -> Selection:
+        """
+        指定された時間に合わせて動画を1組選択する
+
+        Args:
+            target_duration: 目標時間（秒）
+            min_remaining: 許容される最小残り時間（秒）
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Returns:
+            選択結果
+        """
+        return self.select_many(target_duration, 1, min_remaining, rng)[0]
+
+    def select_many(self, target_duration: int, attempts: int, min_remaining: int = 60,
+                    rng: Optional[random.Random] = None) -> List[Selection]:
+        """
+        指定された時間に合わせて動画の組み合わせを複数選択する
+
+        各選択は、残り時間以下の未使用動画から一様に（重みがある場合は重みに比例して）1つ選ぶことを
+        残り時間が min_remaining 以下になるか候補がなくなるまで繰り返す。
+        重みがない場合は、時間順に並べた候補リストから random.choice で選ぶ従来の実装と
+        同じ乱数の消費で同じ結果になる。
+
+        Args:
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            min_remaining: 許容される最小残り時間（秒）
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Returns:
+            選択結果のリスト（生成順）
+        """
+        return list(self.iter_select(target_duration, attempts, min_remaining, rng))
+
+    def iter_select(self, target_duration: int, attempts: int, min_remaining: int = 60,
+                    rng: Optional[random.Random] = None) -> Iterator[Selection]:
+        """
+        select_many と同じ選択を1組ずつ生成する（組み合わせの数によらず使用するメモリは一定）
+
+        Args:
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            min_remaining: 許容される最小残り時間（秒）
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Yields:
+            選択結果（生成順）
+        """
+        randbelow = (rng or random).randrange
+        tree = self._initial_tree.copy()
+        sorted_durations = self.sorted_durations
+        weights = self.weights
+
+        for _ in range(attempts):
+            picked_positions = []
+            total_duration = 0
+            remaining_duration = target_duration
+            available = self.size
+
+            while remaining_duration > min_remaining and available:
+                # 残り時間以下の未使用動画の数（重みがある場合は重みの合計）
+                count = self._prefix_count(tree, bisect_right(sorted_durations, remaining_duration))
+                if not count:
+                    break
+
+                position = self._find_kth(tree, randbelow(count))
+                self._update(tree, position, -weights[position] if weights else -1)
+                available -= 1
+
+                picked_positions.append(position)
+                total_duration += sorted_durations[position]
+                remaining_duration = target_duration - total_duration
+
+            # 次の試行のために使用済みの位置を戻す（木全体の再構築より安い）
+            for position in picked_positions:
+                self._update(tree, position, weights[position] if weights else 1)
+
+            yield Selection(
+                indices=[self.order[position] for position in picked_positions],
+                total_time=total_duration,
+                remaining_time=remaining_duration
+            )
+
+    @staticmethod
+    def _build_tree(values: List[int]) -> List[int]:
+        """各位置の値から Fenwick 木を O(n) で構築する"""
+        tree = [0] + values
+        size = len(values)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        return tree
+
+    def _prefix_count(self, tree: List[int], end: int) -> int:
+        """位置 [0, end) の未使用数（重みの合計）を返す"""
+        count = 0
+        while end > 0:
+            count += tree[end]
+            end &= end - 1
+        return count
+
+    def _find_kth(self, tree: List[int], k: int) -> int:
+        """累積の重みが k（0始まり）を超える最初の未使用位置を返す"""
+        position = 0
+        step = self._top_bit
+        while step:
+            next_position = position + step
+            if next_position <= self.size and tree[next_position] <= k:
+                position = next_position
+                k -= tree[next_position]
+            step >>= 1
+        return position
+
+    def _update(self, tree: List[int], position: int, delta: int) -> None:
+        """位置 position（0始まり）の値に delta を加算する"""
+        i = position + 1
+        while i <= self.size:
+            tree[i] += delta
+            i += i & -i
@@ -0,0 +1,226 @@
+"""
+プロセスプールを使用した組み合わせの並列生成
+
+カタログの動画時間の配列をカタログのバージョンごとに1回だけ共有メモリに置き、
+組み合わせの数をバッチに分けてプロセスプールで生成する。各バッチは親のシードから
+SeedSequence で派生させた独立した乱数列を使用するため、同じシードとバッチサイズからは
+ワーカー数によらず同じ結果になる。結果は残り時間が少ない順にマージする。
+"""
+import heapq
+import itertools
+import multiprocessing
+import random
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from operator import attrgetter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .index import DurationIndex, Selection
+
+# 1つのタスクで生成する組み合わせの数
+DEFAULT_BATCH_SIZE = 1000
+# 新しいバージョン用に保持する共有メモリの数（これより古いものは処理中のタスクがなくなったときに削除する）
+KEPT_SEGMENTS = 2
+
+_remaining_time = attrgetter('remaining_time')
+
+# ワーカープロセス内のキャッシュ（共有メモリの名前 -> インデックス）
+_worker_indexes: Dict[str, DurationIndex] = {}
+
+
+def _attach(name: str, size: int) -> DurationIndex:
+    """
+    共有メモリの動画時間からインデックスを作成する（ワーカープロセス内で名前ごとに1回だけ）
+
+    インデックスは動画時間を並べ替えて保持するため、作成後は共有メモリを閉じる
+    """
+    index = _worker_indexes.get(name)
+    if index is None:
+        try:
+            # 親プロセスが削除するため、ワーカーでは終了時の削除の対象にしない（Python 3.13 以降）
+            shm = SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = SharedMemory(name=name)
+        try:
+            durations = shm.buf[:size * 4].cast('i')
+            index = DurationIndex(durations)
+            durations.release()
+        finally:
+            shm.close()
+        # 新しいバージョンを受け取ったら古いインデックスは捨てる
+        _worker_indexes.clear()
+        _worker_indexes[name] = index
+    return index
+
+
+def _select_batch(name: str, size: int, target_duration: int, attempts: int, min_remaining: int,
+                  seed_state: Sequence[int], top: Optional[int]) -> List[Selection]:
+    """
+    1つのバッチの組み合わせを生成する（ワーカープロセスで実行する）
+
+    Returns:
+        残り時間が少ない順の選択結果（top 指定時は上位 top 件）
+    """
+    index = _attach(name, size)
+    rng = random.Random(int.from_bytes(array('I', seed_state).tobytes(), 'little'))
+    selections = index.iter_select(target_duration, attempts, min_remaining, rng)
+    if top is not None:
+        return heapq.nsmallest(top, selections, key=_remaining_time)
+    return sorted(selections, key=_remaining_time)
+
+
+def _unlink(shm: SharedMemory) -> None:
+    """共有メモリを閉じて削除する"""
+    shm.close()
+    shm.unlink()
+
+
+def batch_seeds(seed: Optional[int], batches: int) -> List[List[int]]:
+    """
+    バッチごとの独立した乱数のシードを派生させる
+
+    Args:
+        seed: 親のシード（None の場合は OS の乱数を使用する）
+        batches: バッチの数
+
+    Returns:
+        バッチごとのシード（4つの 32bit 整数）
+    """
+    # NumPy は必要なときだけ読み込む
+    from numpy.random import SeedSequence
+
+    return [child.generate_state(4).tolist() for child in SeedSequence(seed).spawn(batches)]
+
+
+class ParallelSelector:
+    """
+    組み合わせをプロセスプールで並列に生成する
+
+    複数スレッドから同時に使用してよい。プロセスプールは最初の使用時に作成する。
+    """
+
+    def __init__(self, max_workers: int, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        初期化
+
+        Args:
+            max_workers: ワーカープロセスの数
+            batch_size: 1つのタスクで生成する組み合わせの数
+        """
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 共有メモリ（古い順）: (カタログのバージョン, 共有メモリ, 件数)
+        self._segments: List[Tuple[object, SharedMemory, int]] = []
+        # 共有メモリの名前ごとの処理中の select_many の数
+        self._in_use: Dict[str, int] = {}
+        # 保持する数を超えたが処理中のタスクが参照している共有メモリ（名前 -> 共有メモリ）
+        self._retired: Dict[str, SharedMemory] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """プロセスプールを取得する（スレッドを使用する親からの fork を避けて spawn で起動する）"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _segment_for(self, version: object, durations: Sequence[int]) -> Tuple[str, int]:
+        """
+        カタログのバージョンの動画時間を置いた共有メモリを取得する（なければ作成する）
+
+        ロックを保持して呼び出す。保持する数を超えた古い共有メモリは、処理中のタスクが
+        参照していなければすぐに、参照していれば _release で参照がなくなったときに削除する。
+
+        Returns:
+            (共有メモリの名前, 件数)
+        """
+        for segment_version, shm, size in reversed(self._segments):
+            if segment_version == version:
+                return shm.name, size
+
+        values = durations if isinstance(durations, array) and durations.typecode == 'i' else array('i', durations)
+        data = memoryview(values).cast('B')
+        # 0バイトの共有メモリは作成できないため最低1バイトにする
+        shm = SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        self._segments.append((version, shm, len(values)))
+
+        while len(self._segments) > KEPT_SEGMENTS:
+            _, old, _ = self._segments.pop(0)
+            if self._in_use.get(old.name):
+                self._retired[old.name] = old
+            else:
+                _unlink(old)
+        return shm.name, len(values)
+
+    def _release(self, name: str) -> None:
+        """共有メモリの参照を1つ減らし、保持する数を超えたもので参照がなくなれば削除する（ロックを保持して呼び出す）"""
+        count = self._in_use.get(name, 0) - 1
+        if count > 0:
+            self._in_use[name] = count
+            return
+        self._in_use.pop(name, None)
+        retired = self._retired.pop(name, None)
+        if retired is not None:
+            _unlink(retired)
+
+    def select_many(self, version: object, durations: Sequence[int], target_duration: int, attempts: int,
+                    min_remaining: int = 60, seed: Optional[int] = None,
+                    top: Optional[int] = None) -> List[Selection]:
+        """
+        組み合わせを並列に生成し、残り時間が少ない順に返す
+
+        Args:
+            version: カタログのバージョン（同じバージョンでは共有メモリを再利用する）
+            durations: 動画時間（秒）の並び
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            min_remaining: 許容される最小残り時間（秒）
+            seed: 乱数のシード（同じシードとバッチサイズからは同じ結果になる）
+            top: 指定時は残り時間が少ない上位 top 件だけを返す
+
+        Returns:
+            選択結果のリスト（残り時間が少ない順、同じ残り時間はバッチ順・生成順）
+        """
+        if attempts <= 0:
+            return []
+
+        with self._lock:
+            name, size = self._segment_for(version, durations)
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+
+        futures = []
+        try:
+            with self._lock:
+                executor = self._get_executor()
+                sizes = [min(self.batch_size, attempts - start) for start in range(0, attempts, self.batch_size)]
+                for batch_attempts, seed_state in zip(sizes, batch_seeds(seed, len(sizes))):
+                    futures.append(executor.submit(
+                        _select_batch, name, size, target_duration, batch_attempts, min_remaining, seed_state, top
+                    ))
+
+            merged = heapq.merge(*(future.result() for future in futures), key=_remaining_time)
+            return list(itertools.islice(merged, top if top is not None else attempts))
+        finally:
+            # 失敗したバッチがあっても、残りのタスクが共有メモリを参照し終えるまで削除しない
+            wait(futures)
+            with self._lock:
+                self._release(name)
+
+    def close(self) -> None:
+        """プロセスプールを終了し、共有メモリを削除する"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            for _, shm, _ in self._segments:
+                _unlink(shm)
+            for shm in self._retired.values():
+                _unlink(shm)
+            self._segments = []
+            self._retired = {}
+            self._in_use = {}
@@ -0,0 +1,146 @@
+"""
+API レスポンスの JSON シリアライズ
+
+Flask の jsonify（compact 時）と同じ形式、つまりキーをソートし、区切りに空白を入れず、
+ASCII 以外の文字を \\uXXXX でエスケープした JSON を出力する。
+orjson がインストールされている場合はそちらを使用する。
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from .models import VideoCollection
+from .utils import format_duration, video_to_dict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson は任意の依存
+    orjson = None
+
+# 動画の JSON 断片を保持するカタログのバージョンの数（切り替え中は新旧のバージョンのリクエストが混在する）
+KEPT_FRAGMENT_VERSIONS = 2
+
+# json.dumps(ensure_ascii=True) がエスケープする文字のうち、orjson がそのまま出力するもの
+_UNESCAPED = re.compile('[\x7f-\U0010ffff]')
+
+
+def _escape_char(match: re.Match) -> str:
+    """1文字を json.dumps と同じ \\uXXXX 形式（BMP 外はサロゲートペア）にエスケープする"""
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return '\\u{0:04x}\\u{1:04x}'.format(0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return '\\u{0:04x}'.format(code)
+
+
+def escape_non_ascii(text: str) -> str:
+    """
+    ensure_ascii=False で出力した JSON を ensure_ascii=True の出力に変換する
+
+    Args:
+        text: JSON 文字列
+
+    Returns:
+        ASCII のみの JSON 文字列
+    """
+    return _UNESCAPED.sub(_escape_char, text)
+
+
+def dumps(obj: Any) -> str:
+    """
+    Flask の jsonify と同じ形式で JSON 文字列に変換する（末尾の改行は含まない）
+
+    Args:
+        obj: 変換するオブジェクト
+
+    Returns:
+        JSON 文字列
+    """
+    if orjson is not None:
+        try:
+            return escape_non_ascii(orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode())
+        except TypeError:
+            # サロゲートを含む文字列など orjson が扱えない値は標準の json で変換する
+            pass
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+
+
+class CombinationRenderer:
+    """
+    /api/combinations のレスポンスを動画ごとの JSON 断片から組み立てる
+
+    動画の JSON 断片はカタログのバージョンごとに1回だけ作成してキャッシュする。
+    断片は作成時の動画の内容と一緒に保持し、内容が異なる動画（フィルター指定時に
+    DB から読み込んだ新しい内容など）には使用しない。
+    複数のスレッドから同時に使用してよい。断片はバージョンごとに分けて直近の
+    KEPT_FRAGMENT_VERSIONS 個を保持するため、新旧のバージョンのリクエストが交互に来ても作り直さない。
+    """
+
+    def __init__(self):
+        """初期化"""
+        # カタログのバージョン -> 動画ID -> (タイトル, 時間, URL, サムネイル URL, JSON 断片)
+        self._fragments_by_version: "OrderedDict[Optional[int], Dict[str, Tuple[Any, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fragments_for(self, catalog_version: Optional[int]) -> Dict[str, Tuple[Any, ...]]:
+        """カタログのバージョンの断片のキャッシュを取得する（なければ作成し、古いバージョンのものを破棄する）"""
+        with self._lock:
+            fragments = self._fragments_by_version.get(catalog_version)
+            if fragments is None:
+                fragments = self._fragments_by_version[catalog_version] = {}
+                while len(self._fragments_by_version) > KEPT_FRAGMENT_VERSIONS:
+                    self._fragments_by_version.popitem(last=False)
+            else:
+                self._fragments_by_version.move_to_end(catalog_version)
+            return fragments
+
+    def render(self, combinations: Sequence[VideoCollection], catalog_version: Optional[int] = None) -> str:
+        """
+        組み合わせのリストをレスポンス本文に変換する
+
+        jsonify([video_collection_to_dict(combo) for combo in combinations]) と
+        同じ文字列（末尾の改行を含む）を返す。
+
+        Args:
+            combinations: 動画コレクションのリスト
+            catalog_version: 組み合わせを選んだカタログのバージョン（断片のキャッシュのキー）
+
+        Returns:
+            レスポンス本文
+        """
+        return f'[{",".join(self.iter_render(combinations, catalog_version))}]\n'
+
+    def iter_render(self, combinations: Iterable[VideoCollection],
+                    catalog_version: Optional[int] = None) -> Iterator[str]:
+        """
+        組み合わせを1つずつ JSON オブジェクトの文字列に変換する（NDJSON の逐次出力に使用する）
+
+        Args:
+            combinations: 動画コレクション（イテレータでもよい）
+            catalog_version: 組み合わせを選んだカタログのバージョン（断片のキャッシュのキー）
+
+        Yields:
+            video_collection_to_dict と同じ内容の JSON オブジェクト（改行を含まない）
+        """
+        fragments = self._fragments_for(catalog_version)
+
+        for collection in combinations:
+            videos = []
+            for video in collection.videos:
+                content = (video.title, video.duration, video.url, video.thumbnail_url)
+                entry = fragments.get(video.id)
+                if entry is None or entry[:4] != content:
+                    entry = content + (dumps(video_to_dict(video)),)
+                    fragments[video.id] = entry
+                videos.append(entry[4])
+
+            # キーはソート順に並べる
+            yield (
+                f'{{"remaining_time":{collection.remaining_time:d},'
+                f'"remaining_time_formatted":"{format_duration(collection.remaining_time)}",'
+                f'"total_time":{collection.total_time:d},'
+                f'"total_time_formatted":"{format_duration(collection.total_time)}",'
+                f'"videos":[{",".join(videos)}]}}'
+            )
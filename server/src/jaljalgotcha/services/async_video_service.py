@@ -0,0 +1,133 @@
+"""
+非同期のビデオサービス（ASGI で使用する）
+
+DB の読み込みは非同期リポジトリで待ち、CPU を使う組み合わせの選択は
+スレッドプールで実行して、イベントループを止めずに多数のリクエストを同時に処理する
+"""
+import asyncio
+import functools
+import itertools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+from ..models import VideoCollection
+from ..repositories.interfaces import AsyncVideoRepository
+from .video_service import MODE_RANDOM, WEIGHTING_NONE, VideoService
+
+T = TypeVar('T')
+
+
+class AsyncVideoService:
+    """VideoService の非同期版"""
+
+    def __init__(self, video_service: VideoService, async_repository: Optional[AsyncVideoRepository] = None,
+                 executor: Optional[Executor] = None, max_workers: int = 4):
+        """
+        初期化
+
+        Args:
+            video_service: 選択処理に使用する同期のビデオサービス
+            async_repository: 非同期リポジトリ（オプション）、指定時はカタログを使用しない取得
+                （カタログで評価できないフィルター指定時、カタログがない場合）に使用する。未指定の場合は
+                同期のリポジトリをスレッドプールで実行する
+            executor: 選択処理を実行するプール（省略時は max_workers のスレッドプールを作成する）
+            max_workers: 作成するスレッドプールのスレッド数
+        """
+        self.video_service = video_service
+        self.async_repository = async_repository
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='selection')
+
+    @property
+    def catalog(self):
+        """インメモリ動画カタログ（ない場合は None）"""
+        return self.video_service.catalog
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        関数をプールで実行して結果を待つ
+
+        Args:
+            func: 実行する関数
+            *args: 位置引数
+            **kwargs: キーワード引数
+
+        Returns:
+            関数の戻り値
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def _uses_async_repository(self, filters: Optional[Dict[str, Any]]) -> bool:
+        """非同期リポジトリで動画を取得するかどうか"""
+        return self.async_repository is not None and not self.video_service.uses_catalog(filters)
+
+    async def get_video_combinations(self, target_duration: int, attempts: int = 3,
+                                     filters: Optional[Dict[str, Any]] = None,
+                                     candidates: Optional[int] = None,
+                                     mode: str = MODE_RANDOM,
+                                     weighting: str = WEIGHTING_NONE) -> List[VideoCollection]:
+        """
+        指定された時間に合わせた動画の組み合わせを複数生成する
+
+        引数と戻り値は VideoService.get_video_combinations と同じ
+
+        Returns:
+            動画コレクションのリスト
+        """
+        if self._uses_async_repository(filters):
+            videos = await self.async_repository.get_videos(self.video_service.convert_filters(filters))
+            return await self.run(
+                self.video_service.select_combinations, videos, target_duration, attempts, candidates, mode,
+                weighting
+            )
+        return await self.run(
+            self.video_service.get_video_combinations, target_duration, attempts,
+            filters=filters, candidates=candidates, mode=mode, weighting=weighting
+        )
+
+    async def iter_video_combination_chunks(self, target_duration: int, attempts: int = 3,
+                                            filters: Optional[Dict[str, Any]] = None,
+                                            candidates: Optional[int] = None,
+                                            mode: str = MODE_RANDOM,
+                                            top: Optional[int] = None,
+                                            weighting: str = WEIGHTING_NONE,
+                                            chunk_size: int = 64) -> AsyncIterator[List[VideoCollection]]:
+        """
+        VideoService.iter_video_combinations の結果を chunk_size 件ずつプールで生成して返す
+
+        get_video_combinations と同じく、カタログを使用しない取得では非同期リポジトリで動画を読み込む
+
+        Args:
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            filters: 動画のフィルタリング条件（オプション）
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード
+            top: 残り時間が少ない上位だけを返す件数（オプション）
+            weighting: ランダム選択の重み付け
+            chunk_size: 1回のプールでの実行で生成する件数
+
+        Yields:
+            動画コレクションのリスト（最大 chunk_size 件）
+        """
+        if self._uses_async_repository(filters):
+            videos = await self.async_repository.get_videos(self.video_service.convert_filters(filters))
+            results = self.video_service.iter_select_combinations(
+                videos, target_duration, attempts, candidates, mode, top, weighting
+            )
+        else:
+            results = self.video_service.iter_video_combinations(
+                target_duration, attempts, filters=filters, candidates=candidates, mode=mode, top=top,
+                weighting=weighting
+            )
+        while True:
+            chunk = await self.run(lambda: list(itertools.islice(results, chunk_size)))
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        """作成したスレッドプールを終了する"""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
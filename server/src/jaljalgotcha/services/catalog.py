@@ -0,0 +1,301 @@
+"""
+インメモリ動画カタログ
+
+リポジトリから読み込んだ動画一覧をプロセス内に保持し、
+バックグラウンドで再構築して差し替える。カタログのバージョンのリポジトリを指定した場合は
+バージョンだけを定期的に（PostgreSQL では通知を受けてすぐに）確認し、変わった場合のみ再構築する
+"""
+import hashlib
+import logging
+import threading
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+from ..metrics import CATALOG_LOADED_TIMESTAMP, CATALOG_VERSION, CATALOG_VIDEOS
+from ..models import Video, VideoTable
+from ..repositories.interfaces import CatalogVersionRepository, VideoRepository
+from ..selection.index import DurationIndex
+from ..video import WEIGHTING_NONE, build_duration_index
+
+logger = logging.getLogger(__name__)
+
+
+def catalog_fingerprint(videos: Sequence[Video]) -> str:
+    """
+    動画IDと時間からカタログの内容の指紋を計算する
+    並び順には依存しない
+    
+    Args:
+        videos: 動画の一覧
+        
+    Returns:
+        指紋（16進文字列）
+    """
+    if isinstance(videos, VideoTable):
+        pairs = zip(videos.ids, videos.durations)
+    else:
+        pairs = ((video.id, video.duration) for video in videos)
+    digest = hashlib.sha1()
+    for video_id, duration in sorted(pairs):
+        digest.update(f"{video_id}:{duration}\n".encode())
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """ある時点の動画カタログ（読み取り専用）"""
+    videos: VideoTable  # 動画の一覧（列指向）
+    index: DurationIndex  # 動画時間の昇順インデックス
+    positions: Dict[str, int]  # 動画IDから videos 内の位置への対応
+    fingerprint: str  # 動画IDと時間から計算した内容の指紋
+    version: int  # カタログのバージョン（読み込みごとに増加）
+    loaded_at: datetime  # 読み込み完了時刻
+    source_version: Optional[int] = None  # 読み込み前に確認した DB のカタログのバージョン
+    # 重み付けごとのインデックス（最初に使用したときに作成する）
+    _weighted_indexes: Dict[str, DurationIndex] = field(default_factory=dict, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def index_for(self, weighting: str) -> DurationIndex:
+        """
+        重み付けに対応した時間インデックスを取得する
+
+        重み付きのインデックスはスナップショットごとに1回だけ作成する
+        （同時に作成した場合もどちらか一方が残るだけで結果は同じ）。
+
+        Args:
+            weighting: 選択の重み付け
+
+        Returns:
+            時間インデックス
+        """
+        if weighting == WEIGHTING_NONE:
+            return self.index
+        index = self._weighted_indexes.get(weighting)
+        if index is None:
+            index = self._weighted_indexes.setdefault(weighting, build_duration_index(self.videos, weighting))
+        return index
+
+    @property
+    def durations(self) -> array:
+        """動画時間（秒）の int32 配列"""
+        return self.videos.durations
+
+
+class VideoCatalog:
+    """
+    動画カタログのダブルバッファ実装
+
+    新しいスナップショットは既存のスナップショットとは別に構築し、
+    完成後に参照を差し替える。読み取り側はロックを取らず、
+    構築途中のカタログを見ることもない。
+    """
+
+    def __init__(self, video_repository: VideoRepository, refresh_interval: float = 300.0,
+                 version_repository: Optional[CatalogVersionRepository] = None,
+                 poll_interval: float = 5.0):
+        """
+        初期化
+
+        Args:
+            video_repository: 動画リポジトリのインスタンス
+            refresh_interval: バックグラウンド再構築の間隔（秒）、0以下の場合は再構築しない
+                （version_repository を指定した場合はバージョンを取得できないときのみ使用する）
+            version_repository: カタログのバージョンのリポジトリ（オプション）、指定時は
+                バージョンが変わった場合のみ再構築する
+            poll_interval: バージョンを確認する間隔（秒）、0以下の場合は確認しない
+        """
+        self.video_repository = video_repository
+        self.refresh_interval = refresh_interval
+        self.version_repository = version_repository
+        self.poll_interval = poll_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # 再構築処理同士の直列化のみに使用する（読み取り側は取得しない）
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        # 変更の通知を受けたときに待機中の確認を早める
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listener: Optional[threading.Thread] = None
+        # バージョンを取得できないことを警告済みかどうか（取得できたら戻す）
+        self._version_error_logged = False
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        現在のスナップショットを取得する
+        まだ読み込まれていない場合は同期的に読み込む
+
+        Returns:
+            現在のスナップショット
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh(force=False)
+        return snapshot
+
+    def refresh(self, force: bool = True) -> CatalogSnapshot:
+        """
+        リポジトリからカタログを再構築して差し替える
+
+        Args:
+            force: False の場合、ロックを待つ間に他のスレッドが読み込んだスナップショットがあれば
+                再構築せずにそれを返す（未読み込みのカタログを同時に参照したリクエストが1回だけ読み込む）
+
+        Returns:
+            新しいスナップショット
+        """
+        with self._refresh_lock:
+            if not force and self._snapshot is not None:
+                return self._snapshot
+            # 読み込み中に書き込まれた変更は次の確認で検出できるように、バージョンは先に読む
+            source_version = self._get_source_version() if self.version_repository else None
+            videos = self.video_repository.get_video_table()
+            previous = self._snapshot
+            snapshot = CatalogSnapshot(
+                videos=videos,
+                index=build_duration_index(videos),
+                positions={video_id: i for i, video_id in enumerate(videos.ids)},
+                fingerprint=catalog_fingerprint(videos),
+                version=previous.version + 1 if previous else 1,
+                loaded_at=datetime.now(),
+                source_version=source_version
+            )
+            # 参照の代入はアトミックなので、読み取り側は新旧どちらかを完全な形で見る
+            self._snapshot = snapshot
+
+        CATALOG_VIDEOS.set(len(snapshot))
+        CATALOG_VERSION.set(snapshot.version)
+        CATALOG_LOADED_TIMESTAMP.set(snapshot.loaded_at.timestamp())
+        logger.info(f"動画カタログを読み込みました（バージョン: {snapshot.version}, 件数: {len(snapshot)}）")
+        return snapshot
+
+    def refresh_if_changed(self) -> bool:
+        """
+        DB のカタログのバージョンが読み込み済みのものと異なる場合のみ再構築する
+
+        Returns:
+            再構築した場合は True
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self.version_repository is not None:
+            source_version = self._get_source_version()
+            if source_version is None:
+                # バージョンを取得できない場合は refresh_interval ごとに読み込み直す
+                age = (datetime.now() - snapshot.loaded_at).total_seconds()
+                if self.refresh_interval <= 0 or age < self.refresh_interval:
+                    return False
+            elif source_version == snapshot.source_version:
+                return False
+        self.refresh()
+        return True
+
+    def _get_source_version(self) -> Optional[int]:
+        """
+        DB のカタログのバージョンを取得する
+
+        catalog_versions テーブルがないデータベース（マイグレーション未適用）などで取得できない
+        場合は、最初の1回だけ警告を記録して None を返す。
+
+        Returns:
+            バージョン（取得できない場合は None）
+        """
+        try:
+            version = self.version_repository.get_version()
+        except Exception:
+            if not self._version_error_logged:
+                self._version_error_logged = True
+                logger.warning(
+                    "カタログのバージョンを取得できないため、再構築の間隔ごとに読み込み直します", exc_info=True
+                )
+            return None
+        self._version_error_logged = False
+        return version
+
+    def notify_changed(self) -> None:
+        """カタログの変更の通知を受けたときに呼ぶ（バックグラウンドでバージョンをすぐに確認する）"""
+        self._wake_event.set()
+
+    @property
+    def _interval(self) -> float:
+        """バックグラウンドで確認・再構築する間隔（秒）"""
+        return self.poll_interval if self.version_repository is not None else self.refresh_interval
+
+    def start(self) -> None:
+        """
+        初回読み込みを行い、バックグラウンドでの再構築を開始する
+        初回読み込みに失敗した場合は最初の参照時に再試行する
+        """
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("動画カタログの初回読み込みに失敗しました")
+
+        if self._interval <= 0 or self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='video-catalog-refresh', daemon=True)
+        self._thread.start()
+        if self.version_repository is not None:
+            self._listener = threading.Thread(target=self._listen, name='video-catalog-listen', daemon=True)
+            self._listener.start()
+
+    def stop(self) -> None:
+        """バックグラウンドでの再構築を停止する"""
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in (self._thread, self._listener):
+            if thread is not None:
+                thread.join()
+        self._thread = None
+        self._listener = None
+
+    def _run(self) -> None:
+        """確認・再構築のループ（間隔ごと、または変更の通知を受けたときに実行する）"""
+        while True:
+            self._wake_event.wait(self._interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                return
+            try:
+                if self.version_repository is not None:
+                    self.refresh_if_changed()
+                else:
+                    self.refresh()
+            except Exception:
+                # 失敗しても古いスナップショットを使い続ける
+                logger.exception("動画カタログの再構築に失敗しました")
+
+    def _listen(self) -> None:
+        """変更の通知を待つ（通知に対応していないリポジトリではすぐに終了し、定期的な確認のみになる）"""
+        try:
+            if not self.version_repository.listen(self.notify_changed, self._stop_event):
+                logger.info("カタログの変更の通知に対応していないため、バージョンを定期的に確認します")
+        except Exception:
+            logger.exception("カタログの変更の通知の待機に失敗しました")
+
+    def status(self) -> Dict[str, Any]:
+        """
+        カタログの状態を取得する
+
+        Returns:
+            バージョン、読み込み時刻、経過秒数、件数を含む辞書
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False}
+
+        return {
+            "loaded": True,
+            "version": snapshot.version,
+            "fingerprint": snapshot.fingerprint,
+            "loaded_at": snapshot.loaded_at.isoformat(),
+            "age_seconds": (datetime.now() - snapshot.loaded_at).total_seconds(),
+            "video_count": len(snapshot),
+            "refresh_interval": self.refresh_interval,
+            "source_version": snapshot.source_version
+        }
@@ -0,0 +1,166 @@
+"""
+インメモリカタログの絞り込み
+
+フィルター（最大時間・最小いいね数・最小再生数）をカタログの列の配列に対するマスクで評価し、
+絞り込んだ動画一覧と時間インデックスをフィルターごとに1回だけ作成して LRU でキャッシュする。
+フィルター付きのリクエストも DB を参照せず、フィルターなしと同じ手順で選択できる。
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..models import VideoTable
+from ..selection.index import DurationIndex
+from ..video import WEIGHTING_NONE, build_duration_index
+from .catalog import CatalogSnapshot
+
+# カタログで評価できるフィルター（DB形式）のキー。
+# 並び順は組み合わせの選択（時間順のインデックスを使用する）に影響しないため無視する
+CATALOG_FILTER_KEYS = frozenset(('max_duration', 'min_likes', 'min_views', 'order_by', 'order_dir'))
+
+
+@dataclass(frozen=True)
+class CatalogFilter:
+    """カタログの絞り込み条件（キャッシュのキーにも使用する）"""
+    max_duration: Optional[int] = None  # 最大動画時間（秒）
+    min_likes: Optional[int] = None  # 最小いいね数
+    min_views: Optional[int] = None  # 最小再生数
+
+    @classmethod
+    def from_filters(cls, filters: Dict[str, Any]) -> Optional['CatalogFilter']:
+        """
+        DB形式のフィルターから作成する
+
+        Args:
+            filters: DB形式のフィルター（VideoService.convert_filters の結果）
+
+        Returns:
+            絞り込み条件（カタログで評価できない条件を含む場合は None）
+        """
+        if not filters.keys() <= CATALOG_FILTER_KEYS:
+            return None
+        return cls(
+            max_duration=filters.get('max_duration'),
+            min_likes=filters.get('min_likes'),
+            min_views=filters.get('min_views')
+        )
+
+    def positions(self, videos: VideoTable) -> List[int]:
+        """
+        条件に合う動画の位置を列ごとのマスクで求める（NumPy は必要なときだけ読み込む）
+
+        Args:
+            videos: カタログの動画一覧
+
+        Returns:
+            条件に合う動画の videos 内の位置（昇順）
+        """
+        import numpy as np
+
+        mask = np.ones(len(videos), dtype=bool)
+        if self.max_duration is not None:
+            mask &= np.asarray(videos.durations, dtype=np.int64) <= self.max_duration
+        if self.min_likes is not None:
+            mask &= np.asarray(videos.like_counts, dtype=np.int64) >= self.min_likes
+        if self.min_views is not None:
+            mask &= np.asarray(videos.view_counts, dtype=np.int64) >= self.min_views
+        return np.flatnonzero(mask).tolist()
+
+
+@dataclass(frozen=True)
+class CatalogSubset:
+    """カタログのスナップショットを絞り込んだ動画一覧（読み取り専用）"""
+    videos: VideoTable  # 条件に合う動画の一覧（カタログでの並び順）
+    index: DurationIndex  # 動画時間の昇順インデックス
+    snapshot_version: int  # 絞り込んだスナップショットのバージョン
+    # 重み付けごとのインデックス（最初に使用したときに作成する）
+    _weighted_indexes: Dict[str, DurationIndex] = field(default_factory=dict, repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def index_for(self, weighting: str) -> DurationIndex:
+        """重み付けに対応した時間インデックスを取得する（CatalogSnapshot.index_for と同じ）"""
+        if weighting == WEIGHTING_NONE:
+            return self.index
+        index = self._weighted_indexes.get(weighting)
+        if index is None:
+            index = self._weighted_indexes.setdefault(weighting, build_duration_index(self.videos, weighting))
+        return index
+
+
+class FilteredCatalogCache:
+    """
+    絞り込んだカタログの LRU キャッシュ
+
+    キーはカタログのバージョンと絞り込み条件で、カタログが再読み込みされると
+    新しいキーで作り直す。絞り込んだ一覧は動画の列をコピーして保持するため、
+    条件の数（maxsize）に加えて保持する動画の合計件数（max_rows）でも追い出す。
+    max_rows を指定しない場合のメモリの上限は maxsize × カタログの件数になる。
+    """
+
+    def __init__(self, maxsize: int = 64, max_rows: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            maxsize: キャッシュする絞り込み条件の最大数
+            max_rows: キャッシュする動画の合計件数の上限（省略時は件数では追い出さない）、
+                1つで上限を超える絞り込みはキャッシュしない
+        """
+        self.maxsize = maxsize
+        self.max_rows = max_rows
+        self._subsets: "OrderedDict[Tuple[int, CatalogFilter], CatalogSubset]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: CatalogSnapshot, catalog_filter: CatalogFilter) -> CatalogSubset:
+        """
+        絞り込んだカタログを取得する
+
+        Args:
+            snapshot: 現在のカタログのスナップショット
+            catalog_filter: 絞り込み条件
+
+        Returns:
+            絞り込んだカタログ
+        """
+        key = (snapshot.version, catalog_filter)
+        with self._lock:
+            subset = self._subsets.get(key)
+            if subset is not None:
+                self._subsets.move_to_end(key)
+                return subset
+
+        # 作成中はロックを保持しない（同じキーを同時に作成する可能性はあるが結果は同じ）
+        videos = snapshot.videos.take(catalog_filter.positions(snapshot.videos))
+        subset = CatalogSubset(videos=videos, index=build_duration_index(videos), snapshot_version=snapshot.version)
+
+        if self.max_rows is not None and len(subset) > self.max_rows:
+            return subset
+
+        with self._lock:
+            existing = self._subsets.get(key)
+            if existing is not None:
+                # 他のスレッドが同時に作成したものを使用する
+                self._subsets.move_to_end(key)
+                return existing
+            self._subsets[key] = subset
+            self._rows += len(subset)
+            while len(self._subsets) > self.maxsize or (self.max_rows is not None and self._rows > self.max_rows):
+                _, evicted = self._subsets.popitem(last=False)
+                self._rows -= len(evicted)
+
+        return subset
+
+    @property
+    def rows(self) -> int:
+        """キャッシュしている動画の合計件数"""
+        return self._rows
+
+    def clear(self) -> None:
+        """キャッシュを空にする"""
+        with self._lock:
+            self._subsets.clear()
+            self._rows = 0
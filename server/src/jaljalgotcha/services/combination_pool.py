@@ -0,0 +1,183 @@
+"""
+事前計算した組み合わせプールのプロセス内キャッシュ
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..models import Video
+from ..repositories.interfaces import CombinationPoolRepository
+from ..selection.best_fit import find_best_fit_selections
+from ..selection.index import DurationIndex, Selection
+from .catalog import CatalogSnapshot
+
+logger = logging.getLogger(__name__)
+
+# カタログ内の位置で表した組み合わせのプール
+Pool = Tuple[Tuple[int, ...], ...]
+
+# 目標時間の上限（分）、main.get_combinations の検証と同じ
+MAX_POOL_MINUTES = 1000
+# 計算の進み具合を記録する間隔（分）
+POOL_PROGRESS_INTERVAL = 100
+
+
+def build_combination_pools(videos: Sequence[Video], pool_size: int = 50, time_budget: float = 1.0,
+                            max_minutes: int = MAX_POOL_MINUTES,
+                            rng: Optional[random.Random] = None,
+                            total_budget: Optional[float] = None) -> Dict[int, List[List[str]]]:
+    """
+    1分から max_minutes 分までの各目標時間について組み合わせのプールを計算する
+
+    まず残り時間が最小になる組み合わせを探し、制限時間内に終わらない場合は
+    多数の候補を一括生成して残り時間が少ないものを採用する。
+
+    Args:
+        videos: 動画の一覧
+        pool_size: 目標時間ごとの組み合わせの数（重複は除くため少なくなることがある）
+        time_budget: 目標時間ごとの最適化の制限時間（秒）
+        max_minutes: 計算する目標時間の上限（分）
+        rng: 乱数生成器（省略時は random モジュール）
+        total_budget: すべての目標時間の最適化の制限時間の合計（秒）、指定時は残りの時間を
+            残りの目標時間で分け合う（使い切った後は一括生成のみになる）
+
+    Returns:
+        目標時間（分）ごとの組み合わせ（動画IDのリスト）のリスト
+    """
+    durations = [video.duration for video in videos]
+    pools = {}
+    # 一括生成できない大きさのカタログで使用する時間インデックス（最初に必要になったときに作成する）
+    index = None
+    deadline = time.perf_counter() + total_budget if total_budget is not None else None
+
+    for minutes in range(1, max_minutes + 1):
+        target_duration = minutes * 60
+        budget = time_budget
+        if deadline is not None:
+            budget = min(time_budget, max(deadline - time.perf_counter(), 0.0) / (max_minutes - minutes + 1))
+        selections = find_best_fit_selections(durations, target_duration, pool_size, budget, rng)
+        if selections is None:
+            from ..selection.batch import generate_best_selections
+            if index is None:
+                index = DurationIndex(durations)
+            selections = generate_best_selections(durations, target_duration, pool_size, pool_size * 20, index=index)
+
+        # 同じ動画の組み合わせは1つにまとめる
+        seen = set()
+        combinations = []
+        for selection in selections:
+            key = frozenset(selection.indices)
+            if selection.indices and key not in seen:
+                seen.add(key)
+                combinations.append([videos[i].id for i in selection.indices])
+
+        if combinations:
+            pools[minutes] = combinations
+
+        if minutes % POOL_PROGRESS_INTERVAL == 0:
+            logger.info("組み合わせプールを計算しています（%d/%d 分）", minutes, max_minutes)
+
+    return pools
+
+
+class CombinationPoolCache:
+    """
+    組み合わせプールの LRU キャッシュ
+
+    キーはカタログのバージョンと目標時間（分）で、カタログが再読み込みされると
+    新しいキーで読み直す。プールが存在しないことも記録し、毎回DBを参照しないようにする。
+    """
+
+    def __init__(self, pool_repository: CombinationPoolRepository, maxsize: int = 128):
+        """
+        初期化
+
+        Args:
+            pool_repository: 組み合わせプールのリポジトリ
+            maxsize: キャッシュするプールの最大数
+        """
+        self.pool_repository = pool_repository
+        self.maxsize = maxsize
+        self._pools: "OrderedDict[Tuple[int, int], Optional[Pool]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, snapshot: CatalogSnapshot, minutes: int) -> Optional[Pool]:
+        """
+        指定された目標時間のプールを取得する
+
+        Args:
+            snapshot: 現在のカタログのスナップショット
+            minutes: 目標時間（分）
+
+        Returns:
+            カタログ内の位置で表した組み合わせのプール（存在しない場合は None）
+        """
+        key = (snapshot.version, minutes)
+        with self._lock:
+            if key in self._pools:
+                self._pools.move_to_end(key)
+                return self._pools[key]
+
+        # DBの参照中はロックを保持しない（同じキーを同時に読み込む可能性はあるが結果は同じ）
+        video_ids = self.pool_repository.get_pool(minutes, snapshot.fingerprint)
+        pool = None
+        if video_ids:
+            positions = snapshot.positions
+            pool = tuple(
+                tuple(positions[video_id] for video_id in combination)
+                for combination in video_ids
+                if all(video_id in positions for video_id in combination)
+            ) or None
+
+        with self._lock:
+            self._pools[key] = pool
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.maxsize:
+                self._pools.popitem(last=False)
+
+        return pool
+
+    def pick(self, snapshot: CatalogSnapshot, target_duration: int, attempts: int,
+             rng: Optional[random.Random] = None) -> Optional[List[Selection]]:
+        """
+        プールからランダムに組み合わせを選ぶ
+
+        Args:
+            snapshot: 現在のカタログのスナップショット
+            target_duration: 目標時間（秒）、分単位でない場合はプールを使用しない
+            attempts: 返す組み合わせの数
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Returns:
+            選択結果のリスト（プールがない場合は None）
+        """
+        if target_duration % 60 != 0:
+            return None
+
+        pool = self.get(snapshot, target_duration // 60)
+        if not pool:
+            return None
+
+        rng = rng or random
+        if attempts <= len(pool):
+            picked = rng.sample(pool, attempts)
+        else:
+            picked = rng.choices(pool, k=attempts)
+
+        selections = []
+        for combination in picked:
+            total_time = sum(snapshot.durations[i] for i in combination)
+            selections.append(Selection(
+                indices=list(combination),
+                total_time=total_time,
+                remaining_time=target_duration - total_time
+            ))
+        return selections
+
+    def clear(self) -> None:
+        """キャッシュを空にする"""
+        with self._lock:
+            self._pools.clear()
@@ -1,26 +1,69 @@
 """
 動画処理のサービス層実装
 """
-import random
-from typing import List, Dict, Any, Optional
+import heapq
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from ..metrics import COMBINATION_STAGE_SECONDS, COMBINATION_VIDEOS, log_sampled
 from ..models import Video, VideoCollection
 from ..repositories.interfaces import VideoRepository
+from ..selection.best_fit import find_best_fit_selections
+from ..selection.index import DurationIndex, Selection
+from ..video import WEIGHTING_NONE, WEIGHTINGS, build_duration_index, selection_to_collection, video_durations
+from .catalog import CatalogSnapshot, VideoCatalog
+from .catalog_filter import CatalogFilter, CatalogSubset, FilteredCatalogCache
+from .combination_pool import CombinationPoolCache
+
+if TYPE_CHECKING:
+    # プロセスプールと共有メモリは並列生成を使用する場合だけ読み込む
+    from ..selection.parallel import ParallelSelector
+
+logger = logging.getLogger(__name__)
+
+
+# 組み合わせの選択モード
+MODE_RANDOM = 'random'
+MODE_BEST_FIT = 'best_fit'
+MODES = (MODE_RANDOM, MODE_BEST_FIT)
 
 
 class VideoService:
     """動画処理のサービスクラス"""
     
-    def __init__(self, video_repository: VideoRepository):
+    def __init__(self, video_repository: VideoRepository, catalog: Optional[VideoCatalog] = None,
+                 best_fit_time_budget: float = 0.2,
+                 pool_cache: Optional[CombinationPoolCache] = None,
+                 parallel_selector: Optional["ParallelSelector"] = None,
+                 parallel_min_attempts: int = 2000,
+                 filter_cache: Optional[FilteredCatalogCache] = None):
         """
         初期化
         
         Args:
             video_repository: 動画リポジトリのインスタンス
+            catalog: インメモリ動画カタログ（オプション）、指定時はフィルターなしの取得に使用する
+            best_fit_time_budget: 最適化モードの制限時間（秒）
+            pool_cache: 事前計算した組み合わせプールのキャッシュ（オプション）、
+                カタログ使用時のランダム選択でプールがあればそこから選ぶ
+            parallel_selector: 組み合わせを並列に生成するセレクタ（オプション）、
+                カタログ使用時のランダム選択で生成する数が parallel_min_attempts 以上の場合に使用する
+            parallel_min_attempts: 並列に生成する組み合わせの数の下限
+            filter_cache: 絞り込んだカタログのキャッシュ（オプション）、指定時はカタログで評価できる
+                フィルター付きの取得もリポジトリではなくカタログから行う
         """
         self.video_repository = video_repository
+        self.catalog = catalog
+        self.best_fit_time_budget = best_fit_time_budget
+        self.pool_cache = pool_cache
+        # プールの取得の失敗を記録したかどうか（スタックトレースは最初の1回だけ出力する）
+        self._pool_error_logged = False
+        self.parallel_selector = parallel_selector
+        self.parallel_min_attempts = parallel_min_attempts
+        self.filter_cache = filter_cache
 
-    def _convert_filters(self, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    def convert_filters(self, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         """
         フィルターをYouTube API形式からDB形式に変換する
 
@@ -38,6 +81,8 @@ class VideoService:
         # YouTube APIのフィルターをDB用に変換
         if 'max_results' in filters:
             converted_filters['limit'] = filters['max_results']
+        if 'offset' in filters:
+            converted_filters['offset'] = filters['offset']
         if 'order' in filters:
             converted_filters['order_by'] = filters['order']
             converted_filters['order_dir'] = 'desc' if filters['order'] == 'date' else 'asc'
@@ -54,7 +99,10 @@ class VideoService:
     
     def get_video_combinations(self, target_duration: int, 
                               attempts: int = 3,
-                              filters: Optional[Dict[str, Any]] = None) -> List[VideoCollection]:
+                              filters: Optional[Dict[str, Any]] = None,
+                              candidates: Optional[int] = None,
+                              mode: str = MODE_RANDOM,
+                              weighting: str = WEIGHTING_NONE) -> List[VideoCollection]:
         """
         指定された時間に合わせた動画の組み合わせを複数生成する
         
@@ -62,52 +110,386 @@ class VideoService:
             target_duration: 目標時間（秒）
             attempts: 生成する組み合わせの数、デフォルトは3
             filters: 動画のフィルタリング条件（オプション）
+            candidates: 一括生成する候補の数（オプション）、attempts より大きい場合は
+                候補をまとめて生成し、残り時間が少ない上位 attempts 件を返す
+            mode: 選択モード
+                - random: 残り時間以下の動画からランダムに選ぶ（デフォルト）
+                - best_fit: 残り時間が最小になる組み合わせからランダムに選ぶ
+                  （制限時間を超えた場合は random にフォールバック）
+            weighting: ランダム選択の重み付け
+                - none: 一様に選ぶ（デフォルト）
+                - likes: いいね数が多い動画ほど選ばれやすくする
+                - views: 再生数が多い動画ほど選ばれやすくする
             
         Returns:
             動画コレクションのリスト
+            
+        Raises:
+            ValueError: 不明な選択モード・重み付けが指定された場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明な選択モードです: {mode}")
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"不明な重み付けです: {weighting}")
+        
+        started = time.perf_counter()
+        source = self._fetch_videos(filters)
+        fetched = time.perf_counter()
+        
+        combinations = self._combinations_for(source, target_duration, attempts, candidates, mode, weighting)
+        
+        selected = time.perf_counter()
+        log_sampled(
+            logger, 'combinations', source=source.name, videos=len(source.videos), target_duration=target_duration,
+            attempts=attempts, candidates=candidates, mode=mode, weighting=weighting, results=len(combinations),
+            fetch_ms=round((fetched - started) * 1000, 3), select_ms=round((selected - fetched) * 1000, 3)
+        )
+        
+        return combinations
+    
+    def select_combinations(self, videos: Sequence[Video], target_duration: int, attempts: int = 3,
+                            candidates: Optional[int] = None,
+                            mode: str = MODE_RANDOM,
+                            weighting: str = WEIGHTING_NONE) -> List[VideoCollection]:
+        """
+        取得済みの動画一覧から組み合わせを生成する（非同期リポジトリで取得した動画に使用する）
+        
+        Args:
+            videos: 選択対象の動画
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード（get_video_combinations を参照）
+            weighting: ランダム選択の重み付け（get_video_combinations を参照）
+            
+        Returns:
+            残り時間が少ない順の動画コレクションのリスト
+            
+        Raises:
+            ValueError: 不明な選択モード・重み付けが指定された場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明な選択モードです: {mode}")
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"不明な重み付けです: {weighting}")
+        return self._combinations_for(
+            _VideoSource('repository', videos), target_duration, attempts, candidates, mode, weighting
+        )
+    
+    def iter_video_combinations_batch(self, targets: Sequence[Tuple[int, int]],
+                                      filters: Optional[Dict[str, Any]] = None,
+                                      candidates: Optional[int] = None,
+                                      mode: str = MODE_RANDOM,
+                                      weighting: str = WEIGHTING_NONE
+                                      ) -> Iterator[Tuple[int, int, List[VideoCollection]]]:
+        """
+        複数の目標時間の組み合わせを、1回だけ取得した動画一覧から順に生成する
+        
+        カタログ使用時は最初に参照したスナップショットをすべての目標時間で使用するため、
+        途中でカタログが差し替えられても結果は同じバージョンの動画から選ばれる
+        
+        Args:
+            targets: (目標時間（秒）, 生成する組み合わせの数) のリスト
+            filters: 動画のフィルタリング条件（オプション）
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード（get_video_combinations を参照）
+            weighting: ランダム選択の重み付け（get_video_combinations を参照）
+            
+        Yields:
+            (目標時間（秒）, 組み合わせの数, 動画コレクションのリスト)、targets の順
+            
+        Raises:
+            ValueError: 不明な選択モード・重み付けが指定された場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明な選択モードです: {mode}")
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"不明な重み付けです: {weighting}")
+        
+        started = time.perf_counter()
+        source = self._fetch_videos(filters)
+        fetched = time.perf_counter()
+        
+        for target_duration, attempts in targets:
+            yield target_duration, attempts, self._combinations_for(
+                source, target_duration, attempts, candidates, mode, weighting
+            )
+        
+        log_sampled(
+            logger, 'combinations_batch', source=source.name, videos=len(source.videos), targets=len(targets),
+            candidates=candidates, mode=mode, weighting=weighting, fetch_ms=round((fetched - started) * 1000, 3),
+            select_ms=round((time.perf_counter() - fetched) * 1000, 3)
+        )
+    
+    def uses_catalog(self, filters: Optional[Dict[str, Any]]) -> bool:
+        """
+        フィルターに合う動画をカタログから取得するかどうか
+        
+        Args:
+            filters: 動画のフィルタリング条件（YouTube API形式またはDB形式）
+            
+        Returns:
+            カタログから取得する場合は True（リポジトリから取得する場合は False）
+        """
+        filters = self.convert_filters(filters)
+        return self.catalog is not None and (not filters or self._catalog_filter(filters) is not None)
+    
+    def _catalog_filter(self, filters: Dict[str, Any]) -> Optional[CatalogFilter]:
+        """DB形式のフィルターをカタログの絞り込み条件にする（カタログで評価しない場合は None）"""
+        if self.filter_cache is None:
+            return None
+        return CatalogFilter.from_filters(filters)
+    
+    def _fetch_videos(self, filters: Optional[Dict[str, Any]]) -> "_VideoSource":
+        """
+        選択対象の動画を取得する
+        
+        フィルターがなければカタログから、カタログで評価できるフィルターであれば絞り込んだカタログから、
+        それ以外はリポジトリから取得する。
+        
+        Args:
+            filters: 動画のフィルタリング条件（YouTube API形式またはDB形式）
+            
+        Returns:
+            選択対象の動画
         """
         # フィルターを変換
-        filters = self._convert_filters(filters)
-
-        # リポジトリから動画を取得
-        videos = self.video_repository.get_videos(filters)
-        print(f"取得した動画の数: {len(videos)}")
-        combinations = []
+        filters = self.convert_filters(filters)
+        catalog_filter = self._catalog_filter(filters) if filters and self.catalog is not None else None
         
-        for _ in range(attempts):
-            # 動画の組み合わせを選択
-            video_collection = self._select_videos(videos, target_duration)
-            combinations.append(video_collection)
+        with COMBINATION_STAGE_SECONDS.time(stage='fetch'):
+            # 並び順だけのフィルターは絞り込まないため、カタログ全体をそのまま使用する
+            if self.catalog is not None and (not filters or catalog_filter == CatalogFilter()):
+                snapshot = self.catalog.snapshot
+                source = _VideoSource('catalog', snapshot.videos, snapshot)
+            elif catalog_filter is not None:
+                subset = self.filter_cache.get(self.catalog.snapshot, catalog_filter)
+                source = _VideoSource('catalog_filtered', subset.videos, subset=subset)
+            else:
+                source = _VideoSource('repository', self.video_repository.get_videos(filters))
+        COMBINATION_VIDEOS.observe(len(source.videos), source=source.name)
+        return source
+    
+    def _combinations_for(self, source: "_VideoSource", target_duration: int, attempts: int,
+                          candidates: Optional[int], mode: str,
+                          weighting: str = WEIGHTING_NONE) -> List[VideoCollection]:
+        """
+        取得済みの動画から1つの目標時間の組み合わせを生成する
+        
+        Args:
+            source: 選択対象の動画
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード
+            weighting: ランダム選択の重み付け
+            
+        Returns:
+            残り時間が少ない順の動画コレクションのリスト
+        """
+        started = time.perf_counter()
+        videos = source.videos
+        combinations = [
+            selection_to_collection(videos, selection)
+            for selection in self._iter_selections(source, target_duration, attempts, candidates, mode, weighting)
+        ]
         
         # 残り時間が少ない順にソート
         combinations.sort(key=lambda collection: collection.remaining_time)
         
+        COMBINATION_STAGE_SECONDS.observe(time.perf_counter() - started, stage='select')
         return combinations
     
-    def _sort_videos_by_duration(self, videos: List[Video]) -> List[Video]:
+    def iter_video_combinations(self, target_duration: int, attempts: int = 3,
+                                filters: Optional[Dict[str, Any]] = None,
+                                candidates: Optional[int] = None,
+                                mode: str = MODE_RANDOM,
+                                top: Optional[int] = None,
+                                weighting: str = WEIGHTING_NONE) -> Iterator[VideoCollection]:
         """
-        動画を時間順にソートする
+        動画の組み合わせを生成した順に1つずつ返す
+        
+        ランダム選択は事前計算したプールを使用せず組み合わせを1つずつ生成するため、
+        attempts によらず保持するのは生成中の1組だけになる。
         
         Args:
-            videos: ソート対象の動画リスト
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            filters: 動画のフィルタリング条件（オプション）
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード（get_video_combinations を参照）
+            top: 指定時は生成した組み合わせのうち残り時間が少ない上位 top 件だけを
+                残り時間が少ない順に返す（保持するのは top 件まで）
+            weighting: ランダム選択の重み付け（get_video_combinations を参照）
+            
+        Yields:
+            動画コレクション（top 指定時は残り時間が少ない順、それ以外は生成順）
+            
+        Raises:
+            ValueError: 不明な選択モード・重み付けが指定された場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明な選択モードです: {mode}")
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"不明な重み付けです: {weighting}")
+        
+        yield from self._iter_combinations_for(
+            self._fetch_videos(filters), target_duration, attempts, candidates, mode, top, weighting
+        )
+    
+    def iter_select_combinations(self, videos: Sequence[Video], target_duration: int, attempts: int = 3,
+                                 candidates: Optional[int] = None,
+                                 mode: str = MODE_RANDOM,
+                                 top: Optional[int] = None,
+                                 weighting: str = WEIGHTING_NONE) -> Iterator[VideoCollection]:
+        """
+        取得済みの動画一覧から組み合わせを生成した順に1つずつ返す（非同期リポジトリで取得した動画に使用する）
+        
+        引数と戻り値は videos 以外 iter_video_combinations と同じ
+        
+        Args:
+            videos: 選択対象の動画
+            
+        Yields:
+            動画コレクション（top 指定時は残り時間が少ない順、それ以外は生成順）
+            
+        Raises:
+            ValueError: 不明な選択モード・重み付けが指定された場合
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明な選択モードです: {mode}")
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"不明な重み付けです: {weighting}")
+        
+        yield from self._iter_combinations_for(
+            _VideoSource('repository', videos), target_duration, attempts, candidates, mode, top, weighting
+        )
+    
+    def _iter_combinations_for(self, source: "_VideoSource", target_duration: int, attempts: int,
+                               candidates: Optional[int], mode: str, top: Optional[int],
+                               weighting: str) -> Iterator[VideoCollection]:
+        """取得済みの動画から組み合わせを1つずつ生成する（iter_video_combinations を参照）"""
+        videos = source.videos
+        combinations = (
+            selection_to_collection(videos, selection)
+            for selection in self._iter_selections(
+                source, target_duration, attempts, candidates, mode, weighting, eager=False
+            )
+        )
+        if top is not None:
+            # 大きさ top のヒープで上位だけを保持する（同じ残り時間は生成順）
+            combinations = heapq.nsmallest(top, combinations, key=lambda collection: collection.remaining_time)
+        yield from combinations
+    
+    def _iter_selections(self, source: "_VideoSource", target_duration: int, attempts: int,
+                         candidates: Optional[int], mode: str, weighting: str = WEIGHTING_NONE,
+                         eager: bool = True) -> Iterable[Selection]:
+        """
+        選択モードに応じて選択結果を生成する
+        
+        Args:
+            source: 選択対象の動画
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            candidates: 一括生成する候補の数（オプション）
+            mode: 選択モード
+            weighting: ランダム選択の重み付け（最適化モードでは使用しない）
+            eager: ランダム選択で事前計算した組み合わせプールと並列生成を使用するかどうか
+                （False の場合は1組ずつ生成し、保持する組み合わせを増やさない）
+            
+        Returns:
+            選択結果（ランダム選択は1組ずつ生成するイテレータ、それ以外はリスト）
+        """
+        videos, snapshot = source.videos, source.snapshot
+        
+        # 事前計算したプール・並列生成・一括生成は一様な選択のみに対応する
+        uniform = weighting == WEIGHTING_NONE
+        
+        selections = None
+        if (eager and uniform and self.pool_cache is not None and snapshot and mode == MODE_RANDOM
+                and candidates is None):
+            selections = self._pick_from_pool(snapshot, target_duration, attempts)
+        
+        if selections is None and eager and uniform and snapshot and mode == MODE_RANDOM:
+            selections = self._select_parallel(snapshot, target_duration, attempts, candidates)
+        
+        if mode == MODE_BEST_FIT:
+            durations = video_durations(videos)
+            selections = find_best_fit_selections(
+                durations, target_duration, attempts, self.best_fit_time_budget
+            )
+            if selections is None:
+                logger.warning(
+                    "最適化モードが制限時間内に終わらなかったためランダム選択に切り替えます（目標: %s秒）", target_duration
+                )
+        
+        if selections is None and candidates is not None and candidates > attempts:
+            if uniform:
+                # 候補をまとめて生成し、上位のみを返す（NumPy は必要なときだけ読み込む）
+                from ..selection.batch import generate_best_selections
+                durations = video_durations(videos)
+                selections = generate_best_selections(
+                    durations, target_duration, attempts, candidates, index=source.index
+                )
+            else:
+                # 重み付きのインデックスで候補を1組ずつ生成し、上位だけを保持する
+                selections = heapq.nsmallest(
+                    attempts, source.index_for(weighting).iter_select(target_duration, candidates),
+                    key=lambda selection: selection.remaining_time
+                )
+        
+        if selections is None:
+            # 動画の組み合わせを選択（インデックスはすべての試行・目標時間で共有）
+            selections = source.index_for(weighting).iter_select(target_duration, attempts)
+        
+        return selections
+    
+    def _pick_from_pool(self, snapshot: CatalogSnapshot, target_duration: int,
+                        attempts: int) -> Optional[List[Selection]]:
+        """
+        事前計算した組み合わせプールから選ぶ
+        
+        Args:
+            snapshot: 現在のカタログのスナップショット
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
             
         Returns:
-            時間順にソートされた動画リスト
+            選択結果のリスト（プールが使用できない場合は None）
         """
-        return sorted(videos, key=lambda video: video.duration)
+        try:
+            return self.pool_cache.pick(snapshot, target_duration, attempts)
+        except Exception as e:
+            # プールが読めなくても通常の選択で応答できるようにする（テーブルがない場合などは毎回失敗するため、
+            # 2回目以降はスタックトレースを出力しない）
+            if not self._pool_error_logged:
+                self._pool_error_logged = True
+                logger.warning("組み合わせプールの取得に失敗したため通常の選択を使用します", exc_info=True)
+            else:
+                logger.debug("組み合わせプールの取得に失敗しました: %s", e)
+            return None
     
-    def _filter_videos_by_max_duration(self, videos: List[Video], max_duration: int) -> List[Video]:
+    def _select_parallel(self, snapshot: CatalogSnapshot, target_duration: int, attempts: int,
+                         candidates: Optional[int]) -> Optional[List[Selection]]:
         """
-        指定された最大時間以下の動画をフィルタリングする
+        カタログの動画から組み合わせをプロセスプールで並列に生成する
         
         Args:
-            videos: フィルタリング対象の動画リスト
-            max_duration: 最大時間（秒）
+            snapshot: 現在のカタログのスナップショット
+            target_duration: 目標時間（秒）
+            attempts: 生成する組み合わせの数
+            candidates: 一括生成する候補の数（attempts より大きい場合は上位 attempts 件を返す）
             
         Returns:
-            最大時間以下の動画のリスト
+            選択結果のリスト（並列生成を使用しない場合は None）
         """
-        return [video for video in videos if video.duration <= max_duration]
+        generated = candidates if candidates is not None and candidates > attempts else attempts
+        if self.parallel_selector is None or generated < self.parallel_min_attempts:
+            return None
+        return self.parallel_selector.select_many(
+            snapshot.version, snapshot.durations, target_duration, generated,
+            top=attempts if generated > attempts else None
+        )
     
     def _select_videos(self, videos: List[Video], target_duration: int, min_remaining: int = 60) -> VideoCollection:
         """
@@ -121,39 +503,34 @@ class VideoService:
         Returns:
             選択された動画のコレクション
         """
-        # 動画を時間順にソート
-        sorted_videos = self._sort_videos_by_duration(videos)
-        
-        # 選択された動画を格納するリスト
-        selected_videos = []
-        total_duration = 0
-        remaining_duration = target_duration
-        
-        # 最初のビデオを候補から選ぶためのビデオコピー
-        available_videos = sorted_videos.copy()
-        
-        # 残り時間が最小残り時間より大きい間、ビデオを選び続ける
-        while remaining_duration > min_remaining and available_videos:
-            # 残り時間以下の動画をフィルタリング
-            filtered_videos = self._filter_videos_by_max_duration(available_videos, remaining_duration)
-            
-            # 条件を満たす動画がない場合は終了
-            if not filtered_videos:
-                break
-                
-            # ランダムに1つ選択
-            selected_video = random.choice(filtered_videos)
-            
-            # 選択されたビデオを追加
-            selected_videos.append(selected_video)
-            total_duration += selected_video.duration
-            remaining_duration = target_duration - total_duration
-            
-            # 選択されたビデオを利用可能なビデオから削除
-            available_videos.remove(selected_video)
-        
-        return VideoCollection(
-            videos=selected_videos,
-            total_time=total_duration,
-            remaining_time=remaining_duration
-        )
+        selection = build_duration_index(videos).select(target_duration, min_remaining)
+        return selection_to_collection(videos, selection)
+
+
+class _VideoSource:
+    """選択対象の動画（取得元、動画一覧、カタログのスナップショットまたは絞り込んだカタログ、時間インデックス）"""
+    
+    def __init__(self, name: str, videos: Sequence[Video], snapshot: Optional[CatalogSnapshot] = None,
+                 subset: Optional[CatalogSubset] = None):
+        self.name = name
+        self.videos = videos
+        # 組み合わせプールと並列生成はスナップショット全体の位置を使用するため、絞り込んだカタログでは使用しない
+        self.snapshot = snapshot
+        self.subset = subset
+        self._indexes: Dict[str, DurationIndex] = {}
+    
+    @property
+    def index(self) -> DurationIndex:
+        """時間インデックス（スナップショットのものを使用し、なければ最初の参照時に作成する）"""
+        return self.index_for(WEIGHTING_NONE)
+    
+    def index_for(self, weighting: str) -> DurationIndex:
+        """重み付けに対応した時間インデックス（スナップショットのものを使用し、なければ最初の参照時に作成する）"""
+        if self.snapshot is not None:
+            return self.snapshot.index_for(weighting)
+        if self.subset is not None:
+            return self.subset.index_for(weighting)
+        index = self._indexes.get(weighting)
+        if index is None:
+            index = self._indexes[weighting] = build_duration_index(self.videos, weighting)
+        return index
@@ -2,14 +2,17 @@
 ユーティリティ関数
 """
 from datetime import timedelta
+from functools import lru_cache
 from typing import Dict, Any
 
 from .models import Video, VideoCollection
 
 
+@lru_cache(maxsize=1 << 16)
 def format_duration(seconds: int) -> str:
     """
     秒数をHH:MM:SS形式にフォーマットする
+    （レスポンスごとに同じ値を何度も変換するため結果をキャッシュする）
     
     Args:
         seconds: フォーマットする秒数
@@ -1,10 +1,19 @@
 """
 動画処理のロジック
 """
-import random
-from typing import List, Tuple
+import math
+from typing import List, Optional, Sequence
 
-from .models import Video, VideoCollection
+from .models import Video, VideoCollection, VideoTable
+from .selection.index import DurationIndex, Selection
+
+# 選択の重み付け
+WEIGHTING_NONE = 'none'  # 一様に選ぶ
+WEIGHTING_LIKES = 'likes'  # いいね数が多い動画ほど選ばれやすくする
+WEIGHTING_VIEWS = 'views'  # 再生数が多い動画ほど選ばれやすくする
+WEIGHTINGS = (WEIGHTING_NONE, WEIGHTING_LIKES, WEIGHTING_VIEWS)
+# 重みの整数化に使用する倍率（重み付きインデックスは整数の重みを使用する）
+WEIGHT_SCALE = 1000
 
 
 def sort_videos_by_duration(videos: List[Video]) -> List[Video]:
@@ -34,56 +43,115 @@ def filter_videos_by_max_duration(videos: List[Video], max_duration: int) -> Lis
     return [video for video in videos if video.duration <= max_duration]
 
 
-def select_videos(videos: List[Video], target_duration: int, min_remaining: int = 60) -> VideoCollection:
+def video_durations(videos: Sequence[Video]) -> Sequence[int]:
     """
-    指定された時間に最適な動画の組み合わせを選択する
+    動画リストの動画時間の並びを取得する
+    
+    VideoTable の場合は Video を作らずに保持している配列をそのまま返す。
     
     Args:
-        videos: 選択対象となる動画のリスト
-        target_duration: 目標時間（秒）
-        min_remaining: 許容される最小残り時間（秒）、デフォルトは60秒（1分）
+        videos: 対象の動画リスト
         
     Returns:
-        選択された動画のコレクション
+        動画時間（秒）の並び
+    """
+    if isinstance(videos, VideoTable):
+        return videos.durations
+    return [video.duration for video in videos]
+
+
+def popularity_weights(counts: Sequence[int]) -> List[int]:
     """
-    # 動画を時間順にソート
-    sorted_videos = sort_videos_by_duration(videos)
+    いいね数・再生数から選択の重みを計算する
     
-    # 選択された動画を格納するリスト
-    selected_videos = []
-    total_duration = 0
-    remaining_duration = target_duration
+    件数の対数を使用し、一部の人気動画だけが選ばれ続けないようにする
+    （件数0の動画も重み WEIGHT_SCALE で選ばれる）。
     
-    # 最初のビデオを候補から選ぶためのビデオコピー
-    available_videos = sorted_videos.copy()
+    Args:
+        counts: いいね数または再生数の並び
+        
+    Returns:
+        1以上の整数の重みのリスト
+    """
+    return [int(WEIGHT_SCALE * (1 + math.log1p(max(count, 0)))) for count in counts]
+
+
+def video_weights(videos: Sequence[Video], weighting: str) -> Optional[List[int]]:
+    """
+    動画リストの選択の重みを取得する
     
-    # 残り時間が最小残り時間より大きい間、ビデオを選び続ける
-    while remaining_duration > min_remaining and available_videos:
-        # 残り時間以下の動画をフィルタリング
-        filtered_videos = filter_videos_by_max_duration(available_videos, remaining_duration)
+    Args:
+        videos: 対象の動画リスト（VideoTable の場合は保持している配列を使用する）
+        weighting: 重み付け（WEIGHTINGS のいずれか）
         
-        # 条件を満たす動画がない場合は終了
-        if not filtered_videos:
-            break
-            
-        # ランダムに1つ選択
-        selected_video = random.choice(filtered_videos)
+    Returns:
+        重みのリスト（重み付けなしの場合は None）
         
-        # 選択されたビデオを追加
-        selected_videos.append(selected_video)
-        total_duration += selected_video.duration
-        remaining_duration = target_duration - total_duration
+    Raises:
+        ValueError: 不明な重み付けが指定された場合
+    """
+    if weighting == WEIGHTING_NONE:
+        return None
+    if weighting == WEIGHTING_LIKES:
+        counts = videos.like_counts if isinstance(videos, VideoTable) else [video.like_count for video in videos]
+    elif weighting == WEIGHTING_VIEWS:
+        counts = videos.view_counts if isinstance(videos, VideoTable) else [video.view_count for video in videos]
+    else:
+        raise ValueError(f"不明な重み付けです: {weighting}")
+    return popularity_weights(counts)
+
+
+def build_duration_index(videos: Sequence[Video], weighting: str = WEIGHTING_NONE) -> DurationIndex:
+    """
+    動画リストから時間順インデックスを構築する
+    
+    Args:
+        videos: 対象の動画リスト（VideoTable も可）
+        weighting: 選択の重み付け（WEIGHTINGS のいずれか）
         
-        # 選択されたビデオを利用可能なビデオから削除
-        available_videos.remove(selected_video)
+    Returns:
+        時間順インデックス
+    """
+    return DurationIndex(video_durations(videos), video_weights(videos, weighting))
+
+
+def selection_to_collection(videos: Sequence[Video], selection: Selection) -> VideoCollection:
+    """
+    選択結果を動画コレクションに変換する
     
+    Args:
+        videos: インデックス構築に使用した動画リスト（VideoTable の場合は選択された動画の分だけ Video を作成する）
+        selection: 選択結果
+        
+    Returns:
+        動画コレクション
+    """
     return VideoCollection(
-        videos=selected_videos,
-        total_time=total_duration,
-        remaining_time=remaining_duration
+        videos=[videos[i] for i in selection.indices],
+        total_time=selection.total_time,
+        remaining_time=selection.remaining_time
     )
 
 
+def select_videos(videos: List[Video], target_duration: int, min_remaining: int = 60) -> VideoCollection:
+    """
+    指定された時間に最適な動画の組み合わせを選択する
+    
+    残り時間以下の未使用動画から一様にランダムに選ぶことを繰り返す。
+    候補の絞り込みは時間順インデックスで O(log n) で行う。
+    
+    Args:
+        videos: 選択対象となる動画のリスト
+        target_duration: 目標時間（秒）
+        min_remaining: 許容される最小残り時間（秒）、デフォルトは60秒（1分）
+        
+    Returns:
+        選択された動画のコレクション
+    """
+    selection = build_duration_index(videos).select(target_duration, min_remaining)
+    return selection_to_collection(videos, selection)
+
+
 def get_video_combinations(videos: List[Video], target_duration: int, 
                            attempts: int = 3) -> List[VideoCollection]:
     """
@@ -97,12 +165,12 @@ def get_video_combinations(videos: List[Video], target_duration: int,
     Returns:
         動画コレクションのリスト
     """
-    combinations = []
-    
-    for _ in range(attempts):
-        # 動画の組み合わせを選択
-        video_collection = select_videos(videos, target_duration)
-        combinations.append(video_collection)
+    # インデックスは1回だけ構築し、すべての試行で共有する
+    index = build_duration_index(videos)
+    combinations = [
+        selection_to_collection(videos, selection)
+        for selection in index.select_many(target_duration, attempts)
+    ]
     
     # 残り時間が少ない順にソート
     combinations.sort(key=lambda collection: collection.remaining_time)
@@ -0,0 +1,217 @@
+"""
+ASGI アプリケーションと非同期リポジトリのテスト
+"""
+import asyncio
+import json
+from unittest.mock import MagicMock
+from urllib.parse import urlsplit
+
+import pytest
+from sqlalchemy import create_engine
+from src.jaljalgotcha import db_integration, main
+from src.jaljalgotcha.asgi import CombinationsApp
+from src.jaljalgotcha.db.models_db import Base, VideoModel
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.async_video_repository import (
+    AsyncDbVideoRepository,
+    ThreadedVideoRepository,
+    async_database_url,
+    create_async_video_engine,
+)
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+from src.jaljalgotcha.services.async_video_service import AsyncVideoService
+from src.jaljalgotcha.services.catalog import VideoCatalog
+from src.jaljalgotcha.services.video_service import VideoService
+
+
+async def call(app, url):
+    """ASGI アプリケーションに GET リクエストを送り、(ステータス, ヘッダー, 本文) を返す"""
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': parts.path,
+        'query_string': parts.query.encode(), 'headers': [],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def get(app, url):
+    """イベントループを作成して call を実行する"""
+    return asyncio.run(call(app, url))
+
+
+@pytest.fixture
+def mock_repo():
+    """1本の動画だけを返すモックリポジトリ（組み合わせが決まる）を提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = [
+        Video(id="001", title="サンプル動画1 🎬", duration=120, thumbnail_url="https://example.com/001.jpg"),
+    ]
+    return mock_repo
+
+
+@pytest.fixture
+def app(mock_repo):
+    """モックリポジトリのサービスを使用する ASGI アプリケーションを提供するフィクスチャ"""
+    return CombinationsApp(lambda: AsyncVideoService(VideoService(mock_repo), max_workers=2))
+
+
+@pytest.mark.parametrize("query", [
+    "duration=5&attempts=2", "duration=abc", "duration=5&mode=unknown", "duration=5&weighting=unknown", "duration=5&attempts=4&top=2", ""
+])
+def test_same_response_as_flask(app, mock_repo, monkeypatch, query):
+    """Flask アプリと同じステータスと本文を返すことのテスト"""
+    monkeypatch.setattr(main, 'get_db_video_service', lambda: VideoService(mock_repo))
+    flask_response = main.create_app().test_client().get(f'/api/combinations?{query}')
+
+    status, headers, body = get(app, f'/api/combinations?{query}')
+
+    assert status == flask_response.status_code
+    assert body == flask_response.get_data()
+    assert headers[b'content-type'] == b'application/json'
+    assert headers[b'access-control-allow-origin'] == b'*'
+
+
+def test_stream(app):
+    """stream=true の場合は NDJSON を複数のまとまりで返すことのテスト"""
+    app.stream_chunk_size = 3
+    status, headers, body = get(app, '/api/combinations?duration=5&attempts=10&stream=true')
+
+    assert status == 200
+    assert headers[b'content-type'] == b'application/x-ndjson'
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert len(lines) == 10
+    assert all(line["total_time"] == 120 for line in lines)
+
+
+def test_errors(app, mock_repo):
+    """取得の失敗は 500、存在しないパスは 404 になることのテスト"""
+    mock_repo.get_videos.side_effect = RuntimeError("DB接続エラー")
+
+    status, _, body = get(app, '/api/combinations?duration=5')
+    assert status == 500
+    assert "DB接続エラー" in json.loads(body)["error"]
+
+    status, _, _ = get(app, '/unknown')
+    assert status == 404
+
+
+@pytest.mark.parametrize("query", ["duration=5", "duration=5&stream=true"])
+def test_catalog_load_error(query):
+    """カタログの読み込みに失敗した場合はイベントループ外で読み込み、JSON の 500 を返すことのテスト"""
+    repo = MagicMock(spec=VideoRepository)
+    repo.get_video_table.side_effect = RuntimeError("DB接続エラー")
+    catalog = VideoCatalog(repo, refresh_interval=0)
+    app = CombinationsApp(lambda: AsyncVideoService(VideoService(repo, catalog=catalog), max_workers=2))
+
+    status, headers, body = get(app, f'/api/combinations?{query}')
+
+    assert status == 500
+    assert headers[b'content-type'] == b'application/json'
+    assert "DB接続エラー" in json.loads(body)["error"]
+
+
+def test_concurrent_requests_share_one_service(mock_repo):
+    """同時のリクエストでもサービスは1回だけ作成されることのテスト"""
+    factory = MagicMock(side_effect=lambda: AsyncVideoService(VideoService(mock_repo), max_workers=2))
+    app = CombinationsApp(factory)
+
+    async def run():
+        return await asyncio.gather(*(call(app, '/api/combinations?duration=5') for _ in range(20)))
+
+    results = asyncio.run(run())
+
+    assert all(status == 200 for status, _, _ in results)
+    factory.assert_called_once()
+
+
+def test_async_service_uses_async_repository(mock_repo):
+    """カタログがない場合は非同期リポジトリで取得し、選択はプールで行うことのテスト"""
+    sync_repo = MagicMock(spec=VideoRepository)
+    service = AsyncVideoService(VideoService(sync_repo), async_repository=ThreadedVideoRepository(mock_repo))
+
+    combinations = asyncio.run(service.get_video_combinations(300, 2, filters={'max_duration': 600}))
+
+    assert [combo.total_time for combo in combinations] == [120, 120]
+    mock_repo.get_videos.assert_called_once_with({'max_duration': 600})
+    sync_repo.get_videos.assert_not_called()
+    service.close()
+
+
+def test_async_stream_uses_async_repository(mock_repo):
+    """逐次生成でもカタログを使用しない取得は非同期リポジトリで行うことのテスト"""
+    sync_repo = MagicMock(spec=VideoRepository)
+    service = AsyncVideoService(VideoService(sync_repo), async_repository=ThreadedVideoRepository(mock_repo))
+
+    async def collect():
+        chunks = service.iter_video_combination_chunks(300, 5, filters={'max_duration': 600}, chunk_size=2)
+        return [chunk async for chunk in chunks]
+
+    chunks = asyncio.run(collect())
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert all(combo.total_time == 120 for chunk in chunks for combo in chunk)
+    mock_repo.get_videos.assert_called_once_with({'max_duration': 600})
+    sync_repo.get_videos.assert_not_called()
+    service.close()
+
+
+def test_async_video_service_without_async_driver(monkeypatch, mock_repo):
+    """ASYNC_DATABASE_URL が未設定の場合は同期のリポジトリをスレッドで実行することのテスト"""
+    monkeypatch.setattr(db_integration, '_async_video_service', None)
+    monkeypatch.setattr(db_integration, 'ASYNC_DATABASE_URL', None)
+    monkeypatch.setattr(db_integration, 'get_db_video_service', lambda: VideoService(mock_repo))
+    monkeypatch.setattr(db_integration.container, 'get', lambda name: mock_repo)
+
+    service = db_integration.get_async_video_service()
+
+    assert isinstance(service.async_repository, ThreadedVideoRepository)
+    assert service.async_repository.repository is mock_repo
+    service.close()
+
+
+def test_async_database_url():
+    """同期ドライバの URL が非同期ドライバの URL に変換されることのテスト"""
+    assert async_database_url("postgresql://u:p@localhost:5432/db") == "postgresql+asyncpg://u:p@localhost:5432/db"
+    assert async_database_url("sqlite:///videos.db") == "sqlite+aiosqlite:///videos.db"
+    assert async_database_url("sqlite+aiosqlite:///videos.db") == "sqlite+aiosqlite:///videos.db"
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u:p@localhost/db")
+
+
+def test_async_db_repository_matches_sync(tmp_path):
+    """非同期リポジトリが同期のリポジトリと同じ動画を返すことのテスト"""
+    pytest.importorskip("aiosqlite")
+    path = tmp_path / "videos.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    sync_repo = DbVideoRepository(MagicMock(), db_engine=engine)
+    sync_repo.save_videos([
+        VideoModel(video_id=f"v{i}", channel_id="c", title=f"動画{i}", duration_seconds=60 * i,
+                   like_count=i, view_count=i)
+        for i in range(1, 6)
+    ])
+    async_repo = AsyncDbVideoRepository(create_async_video_engine(f"sqlite:///{path}"))
+    filters = {'max_duration': 240, 'order_by': 'likes', 'order_dir': 'desc'}
+
+    async def run():
+        try:
+            return await async_repo.get_videos(filters), await async_repo.get_video_table()
+        finally:
+            await async_repo.engine.dispose()
+
+    videos, table = asyncio.run(run())
+
+    assert videos == sync_repo.get_videos(filters)
+    assert list(table.ids) == list(sync_repo.get_video_table().ids)
@@ -0,0 +1,71 @@
+"""
+性能測定スイート（合成カタログと基準との比較）のテスト
+"""
+import json
+
+import pytest
+from benchmarks import suite
+from benchmarks.synthetic import (LONG_MAX_SECONDS, SHORT_MIN_SECONDS, synthetic_durations, synthetic_rows,
+                                  synthetic_table)
+
+
+def test_synthetic_catalog_is_deterministic():
+    """同じシードからは同じカタログが、異なるシードからは異なるカタログが生成されることのテスト"""
+    assert synthetic_durations(1000, seed=1) == synthetic_durations(1000, seed=1)
+    assert synthetic_durations(1000, seed=1) != synthetic_durations(1000, seed=2)
+    assert list(synthetic_rows(10)) == list(synthetic_rows(10))
+
+
+def test_synthetic_durations_distribution():
+    """動画時間が範囲内に収まり、大半が短尺であることのテスト"""
+    durations = synthetic_durations(10000)
+
+    assert min(durations) >= SHORT_MIN_SECONDS
+    assert max(durations) <= LONG_MAX_SECONDS
+    assert 120 <= sorted(durations)[len(durations) // 2] <= 240
+
+
+def test_synthetic_table():
+    """合成カタログの VideoTable が生成した行と一致することのテスト"""
+    table = synthetic_table(100, seed=3)
+
+    assert len(table) == 100
+    assert len(set(table.ids)) == 100
+    assert list(table.durations) == synthetic_durations(100, seed=3)
+
+
+def test_compare_reports_regressions():
+    """しきい値を超えて遅くなったケースだけが回帰として返されることのテスト"""
+    baseline = {"results": [
+        {"name": "a", "size": 10, "median_s": 1.0},
+        {"name": "b", "size": 10, "median_s": 1.0},
+    ]}
+    results = [
+        {"name": "a", "size": 10, "median_s": 1.1},
+        {"name": "b", "size": 10, "median_s": 2.0},
+        {"name": "b", "size": 100, "median_s": 5.0},  # 基準にないケース
+    ]
+
+    regressions = suite.compare(results, baseline, threshold=1.25)
+
+    assert [(result["name"], ratio) for result, ratio in regressions] == [("b", 2.0)]
+    assert results[0]["ratio"] == pytest.approx(1.1)
+    assert "ratio" not in results[2]
+
+
+def test_main_writes_results(tmp_path):
+    """小さなカタログで実行し、結果の JSON を書き出して基準と比較できることのテスト"""
+    output = tmp_path / "results.json"
+    argv = ["--sizes", "200", "--db-sizes", "200", "--output", str(output),
+            "--baseline", str(tmp_path / "missing.json")]
+
+    assert suite.main(argv) == 0
+    data = json.loads(output.read_text())
+    assert data["format"] == suite.RESULT_FORMAT
+    names = {result["name"] for result in data["results"]}
+    assert {"selection.service_select_videos", "repository.get_videos", "serialization.fragments"} <= names
+
+    # 自分自身を基準にすると極端に遅くならない限り回帰にならない
+    argv[-1] = str(output)
+    argv[-3] = str(tmp_path / "second.json")
+    assert suite.main(argv + ["--threshold", "1000", "--fail-on-regression"]) == 0
@@ -0,0 +1,125 @@
+"""
+フィルター付きの組み合わせをインメモリカタログから選択するテスト
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from src.jaljalgotcha import main
+from src.jaljalgotcha.models import Video, VideoTable
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.services.catalog import VideoCatalog
+from src.jaljalgotcha.services.catalog_filter import CatalogFilter, FilteredCatalogCache
+from src.jaljalgotcha.services.video_service import VideoService
+
+VIDEOS = [
+    Video(id=f"{i:03d}", title=f"サンプル動画{i}", duration=30 * i, like_count=10 * i, view_count=1000 * i)
+    for i in range(1, 21)
+]
+
+
+@pytest.fixture
+def mock_repo():
+    """30秒から10分の動画を返すモックリポジトリを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = VIDEOS
+    mock_repo.get_video_table.return_value = VideoTable.from_videos(VIDEOS)
+    return mock_repo
+
+
+@pytest.fixture
+def catalog(mock_repo):
+    """VideoCatalog のインスタンスを提供するフィクスチャ"""
+    return VideoCatalog(mock_repo, refresh_interval=0)
+
+
+@pytest.fixture
+def video_service(mock_repo, catalog):
+    """絞り込んだカタログのキャッシュを使用する VideoService を提供するフィクスチャ"""
+    return VideoService(mock_repo, catalog=catalog, filter_cache=FilteredCatalogCache(maxsize=2))
+
+
+def test_filter_positions():
+    """列ごとのマスクで条件に合う動画の位置が求められることのテスト"""
+    table = VideoTable.from_videos(VIDEOS)
+
+    assert CatalogFilter(max_duration=90).positions(table) == [0, 1, 2]
+    assert CatalogFilter(max_duration=300, min_likes=50, min_views=8000).positions(table) == [7, 8, 9]
+    assert CatalogFilter().positions(table) == list(range(20))
+    assert CatalogFilter(min_likes=10 ** 6).positions(VideoTable.from_videos([])) == []
+
+
+def test_filtered_request_uses_catalog(video_service, mock_repo):
+    """カタログで評価できるフィルターはリポジトリを参照せず、条件に合う動画だけから選ぶことのテスト"""
+    filters = {'max_duration': 150, 'min_likes': 20, 'order': 'likes'}
+
+    combinations = video_service.get_video_combinations(600, attempts=20, filters=filters)
+
+    mock_repo.get_videos.assert_not_called()
+    ids = {video.id for combo in combinations for video in combo.videos}
+    assert ids and ids <= {"002", "003", "004", "005"}
+    assert video_service.uses_catalog(filters)
+
+
+def test_filtered_catalog_is_cached(video_service, catalog):
+    """同じ条件の絞り込みは1回だけ行い、LRU で追い出され、カタログの再読み込みで作り直すことのテスト"""
+    cache = video_service.filter_cache
+    first = cache.get(catalog.snapshot, CatalogFilter(max_duration=300))
+
+    assert cache.get(catalog.snapshot, CatalogFilter(max_duration=300)) is first
+    assert [video.id for video in first.videos] == [f"{i:03d}" for i in range(1, 11)]
+
+    cache.get(catalog.snapshot, CatalogFilter(min_likes=100))
+    cache.get(catalog.snapshot, CatalogFilter(min_views=5000))
+    assert cache.get(catalog.snapshot, CatalogFilter(max_duration=300)) is not first
+
+    catalog.refresh()
+    refreshed = cache.get(catalog.snapshot, CatalogFilter(max_duration=300))
+    assert refreshed.snapshot_version == 2
+
+
+def test_filtered_catalog_cache_row_limit(catalog):
+    """保持する動画の合計件数の上限を超えると古い条件から追い出し、上限を超える絞り込みはキャッシュしないことのテスト"""
+    cache = FilteredCatalogCache(maxsize=64, max_rows=15)
+    first = cache.get(catalog.snapshot, CatalogFilter(max_duration=300))
+    second = cache.get(catalog.snapshot, CatalogFilter(max_duration=150))
+    assert cache.rows == 15
+
+    cache.get(catalog.snapshot, CatalogFilter(max_duration=60))
+    assert cache.rows == 7
+    assert cache.get(catalog.snapshot, CatalogFilter(max_duration=150)) is second
+    assert cache.get(catalog.snapshot, CatalogFilter(max_duration=300)) is not first
+
+    assert len(cache.get(catalog.snapshot, CatalogFilter())) == 20
+    assert cache.rows <= 15
+
+
+def test_unsupported_filters_use_repository(video_service, mock_repo):
+    """件数の上限などカタログで評価できないフィルターはリポジトリから取得することのテスト"""
+    filters = {'max_results': 5}
+
+    video_service.get_video_combinations(600, filters=filters)
+
+    mock_repo.get_videos.assert_called_once_with({'limit': 5})
+    assert not video_service.uses_catalog(filters)
+
+
+def test_api_filters(monkeypatch, video_service, mock_repo):
+    """クエリパラメータのフィルターが適用され、不正な値は 400 になることのテスト"""
+    monkeypatch.setattr(main, 'get_db_video_service', lambda: video_service)
+    client = main.create_app().test_client()
+
+    response = client.get('/api/combinations?duration=5&attempts=10&max_duration=60&min_views=2000')
+    assert response.status_code == 200
+    assert {video["id"] for combo in response.get_json() for video in combo["videos"]} == {"002"}
+    mock_repo.get_videos.assert_not_called()
+
+    response = client.get('/api/combinations/batch?durations=5,10&max_duration=60')
+    assert response.status_code == 200
+    assert all(
+        video["id"] in ("001", "002")
+        for target in response.get_json() for combo in target["combinations"] for video in combo["videos"]
+    )
+
+    for query in ("min_likes=abc", "max_duration=0", "order=unknown"):
+        response = client.get(f'/api/combinations?duration=5&{query}')
+        assert response.status_code == 400
@@ -0,0 +1,180 @@
+"""
+カタログのバージョンによるプロセス間のカタログの更新のテスト
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from src.jaljalgotcha.db.migrations import migrate
+from src.jaljalgotcha.db.models_db import VideoModel
+from src.jaljalgotcha.models import Video, VideoTable
+from src.jaljalgotcha.repositories.catalog_version_repository import DbCatalogVersionRepository
+from src.jaljalgotcha.repositories.interfaces import CatalogVersionRepository, VideoRepository
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+from src.jaljalgotcha.services.catalog import VideoCatalog
+
+
+def make_video(video_id, title=None):
+    """テスト用の VideoModel を生成する"""
+    return VideoModel(
+        video_id=video_id, channel_id="channel1", title=title or f"動画{video_id}", duration_seconds=120,
+        view_count=0, like_count=0, comment_count=0, published_at=datetime(2023, 1, 1),
+        updated_at=datetime(2023, 1, 2)
+    )
+
+
+class FakeVersionRepository(CatalogVersionRepository):
+    """メモリ上のバージョンを返すリポジトリ（通知には対応しない）"""
+
+    def __init__(self):
+        self.version = 0
+
+    def get_version(self) -> int:
+        return self.version
+
+    def bump_version(self) -> int:
+        self.version += 1
+        return self.version
+
+
+class NotifyingVersionRepository(FakeVersionRepository):
+    """バージョンを増やすたびに通知を送るリポジトリ（PostgreSQL の LISTEN/NOTIFY の代わり）"""
+
+    def __init__(self):
+        super().__init__()
+        self.changed = threading.Condition()
+        self.listening = threading.Event()
+
+    def bump_version(self) -> int:
+        with self.changed:
+            version = super().bump_version()
+            self.changed.notify_all()
+        return version
+
+    def listen(self, on_change, stop_event) -> bool:
+        seen = self.version
+        self.listening.set()
+        while not stop_event.is_set():
+            with self.changed:
+                self.changed.wait(0.05)
+                if self.version != seen:
+                    seen = self.version
+                    on_change()
+        return True
+
+
+def wait_for(condition, timeout=5):
+    """条件が成り立つまで待つ"""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """マイグレーションを適用した SQLite のエンジンを提供するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'videos.db'}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def mock_repo():
+    """1本の動画を返すモックリポジトリを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_video_table.return_value = VideoTable.from_videos([Video(id="001", title="動画1", duration=120)])
+    return mock_repo
+
+
+def test_upsert_bumps_version_only_when_changed(engine):
+    """動画の追加・更新があった保存でのみバージョンが増えることのテスト"""
+    repository = DbVideoRepository(MagicMock(), db_engine=engine)
+    versions = DbCatalogVersionRepository(MagicMock(), db_engine=engine)
+    assert versions.get_version() == 0
+
+    repository.upsert_videos([make_video("001"), make_video("002")])
+    assert versions.get_version() == 1
+
+    # 変更なし
+    repository.upsert_videos([make_video("001")])
+    assert versions.get_version() == 1
+
+    repository.upsert_videos([make_video("001", title="新しいタイトル")])
+    assert versions.get_version() == 2
+    assert versions.bump_version() == 3
+    # SQLite は通知に対応しない
+    assert versions.listen(lambda: None, threading.Event()) is False
+
+
+def test_refresh_if_changed(mock_repo):
+    """DB のバージョンが変わった場合のみ動画一覧を読み込み直すことのテスト"""
+    versions = FakeVersionRepository()
+    catalog = VideoCatalog(mock_repo, version_repository=versions, poll_interval=0)
+    assert catalog.snapshot.source_version == 0
+
+    assert catalog.refresh_if_changed() is False
+    mock_repo.get_video_table.assert_called_once()
+
+    versions.bump_version()
+    assert catalog.refresh_if_changed() is True
+    assert catalog.snapshot.version == 2
+    assert catalog.status()["source_version"] == 1
+    assert mock_repo.get_video_table.call_count == 2
+
+
+def test_notify_changed_wakes_background_check(mock_repo):
+    """変更の通知を受けると確認の間隔を待たずに読み込み直すことのテスト"""
+    versions = FakeVersionRepository()
+    catalog = VideoCatalog(mock_repo, version_repository=versions, poll_interval=60)
+    catalog.start()
+    try:
+        versions.bump_version()
+        catalog.notify_changed()
+
+        assert wait_for(lambda: catalog.snapshot.source_version == 1)
+    finally:
+        catalog.stop()
+    assert mock_repo.get_video_table.call_count == 2
+
+
+def test_listen_notification_triggers_reload(mock_repo):
+    """通知を送るリポジトリでは、確認の間隔を待たずに通知を受けて読み込み直すことのテスト"""
+    versions = NotifyingVersionRepository()
+    catalog = VideoCatalog(mock_repo, version_repository=versions, poll_interval=60)
+    catalog.start()
+    try:
+        assert versions.listening.wait(5)
+        versions.bump_version()
+        assert wait_for(lambda: catalog.snapshot.source_version == 1)
+        versions.bump_version()
+        assert wait_for(lambda: catalog.snapshot.source_version == 2)
+    finally:
+        catalog.stop()
+    assert mock_repo.get_video_table.call_count == 3
+
+
+def test_missing_version_table_falls_back_to_refresh_interval(tmp_path, mock_repo, caplog):
+    """catalog_versions テーブルがない場合も読み込め、警告は1回だけで refresh_interval ごとに読み込み直すことのテスト"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'videos.db'}")
+    migrate(engine, target=1)
+    versions = DbCatalogVersionRepository(MagicMock(), db_engine=engine)
+    catalog = VideoCatalog(mock_repo, refresh_interval=300, version_repository=versions, poll_interval=5)
+
+    with caplog.at_level(logging.WARNING):
+        assert catalog.snapshot.source_version is None
+        assert catalog.refresh_if_changed() is False
+
+    assert len([record for record in caplog.records if record.levelno == logging.WARNING]) == 1
+    mock_repo.get_video_table.assert_called_once()
+
+    catalog.refresh_interval = 0.01
+    time.sleep(0.02)
+    assert catalog.refresh_if_changed() is True
+    assert mock_repo.get_video_table.call_count == 2
+    engine.dispose()
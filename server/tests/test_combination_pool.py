@@ -0,0 +1,171 @@
+"""
+組み合わせプールの事前計算とキャッシュのテスト
+"""
+import logging
+import random
+
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine
+from src.jaljalgotcha.db.models_db import Base
+from src.jaljalgotcha.models import Video, VideoTable
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.repositories.pool_repository import DbCombinationPoolRepository
+from src.jaljalgotcha.services.catalog import VideoCatalog, catalog_fingerprint
+from src.jaljalgotcha.services import combination_pool as combination_pool_module
+from src.jaljalgotcha.services.combination_pool import CombinationPoolCache, build_combination_pools
+from src.jaljalgotcha.services.video_service import VideoService
+
+
+@pytest.fixture
+def sample_videos():
+    """サンプル動画データを提供するフィクスチャ"""
+    return [
+        Video(id="001", title="サンプル動画1", duration=120),  # 2分
+        Video(id="002", title="サンプル動画2", duration=180),  # 3分
+        Video(id="003", title="サンプル動画3", duration=300),  # 5分
+        Video(id="004", title="サンプル動画4", duration=240),  # 4分
+        Video(id="005", title="サンプル動画5", duration=150),  # 2分30秒
+    ]
+
+
+@pytest.fixture
+def pool_repository(tmp_path):
+    """SQLiteを使用した組み合わせプールのリポジトリを提供するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'pools.db'}")
+    Base.metadata.create_all(bind=engine)
+    return DbCombinationPoolRepository(MagicMock(), db_engine=engine)
+
+
+@pytest.fixture
+def catalog(sample_videos):
+    """サンプル動画のカタログを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = sample_videos
+    # カタログは列指向の一覧を読み込む（既定の実装と同じく get_videos の結果を変換する）
+    mock_repo.get_video_table.side_effect = lambda filters=None: VideoTable.from_videos(mock_repo.get_videos(filters))
+    return VideoCatalog(mock_repo, refresh_interval=0)
+
+
+def test_build_combination_pools(sample_videos):
+    """目標時間ごとに残り時間が最小の組み合わせが計算されることのテスト"""
+    pools = build_combination_pools(sample_videos, pool_size=5, max_minutes=20, rng=random.Random(0))
+
+    durations = {video.id: video.duration for video in sample_videos}
+    # 合計は990秒なので16分以降も全動画の組み合わせになる
+    assert sorted(pools) == list(range(2, 21))
+    for minutes, combinations in pools.items():
+        totals = {sum(durations[video_id] for video_id in combination) for combination in combinations}
+        # すべての組み合わせが同じ最大の合計になり、重複はない
+        assert len(totals) == 1
+        assert totals.pop() <= minutes * 60
+        assert len({frozenset(combination) for combination in combinations}) == len(combinations)
+
+    # 10分ちょうど（120 + 180 + 300 など）の組み合わせが見つかる
+    assert all(
+        sum(durations[video_id] for video_id in combination) == 600
+        for combination in pools[10]
+    )
+
+
+def test_build_combination_pools_total_budget(sample_videos, monkeypatch, caplog):
+    """制限時間の合計を使い切った後は一括生成で計算し、進み具合を記録することのテスト"""
+    budgets = []
+
+    def no_best_fit(durations, target_duration, attempts, time_budget, rng=None):
+        budgets.append(time_budget)
+        return None
+
+    monkeypatch.setattr(combination_pool_module, 'find_best_fit_selections', no_best_fit)
+    monkeypatch.setattr(combination_pool_module, 'POOL_PROGRESS_INTERVAL', 10)
+
+    with caplog.at_level(logging.INFO):
+        pools = build_combination_pools(sample_videos, pool_size=5, max_minutes=20, total_budget=0)
+
+    assert budgets == [0.0] * 20
+    assert sorted(pools) == list(range(2, 21))
+    assert sum("組み合わせプールを計算しています" in record.getMessage() for record in caplog.records) == 2
+
+
+def test_pool_repository_checks_fingerprint(pool_repository):
+    """指紋が一致しないプールは返されないことのテスト"""
+    pool_repository.replace_pools({10: [["001", "002", "003"]]}, "fingerprint-a")
+
+    assert pool_repository.get_pool(10, "fingerprint-a") == [["001", "002", "003"]]
+    assert pool_repository.get_pool(10, "fingerprint-b") is None
+    assert pool_repository.get_pool(11, "fingerprint-a") is None
+    assert pool_repository.get_fingerprint() == "fingerprint-a"
+
+    # 置き換えると古いプールは残らない
+    pool_repository.replace_pools({5: [["004"]]}, "fingerprint-b")
+    assert pool_repository.get_pool(10, "fingerprint-b") is None
+    assert pool_repository.get_pool(5, "fingerprint-b") == [["004"]]
+
+
+def test_service_serves_from_pool(sample_videos, pool_repository, catalog):
+    """プールがある場合はプールから組み合わせが返されることのテスト"""
+    pool_repository.replace_pools(
+        {10: [["001", "002", "003"], ["005", "004"]]}, catalog_fingerprint(sample_videos)
+    )
+    pool_cache = CombinationPoolCache(pool_repository)
+    video_service = VideoService(catalog.video_repository, catalog=catalog, pool_cache=pool_cache)
+
+    combinations = video_service.get_video_combinations(target_duration=600, attempts=2)
+
+    assert len(combinations) == 2
+    assert {tuple(video.id for video in combo.videos) for combo in combinations} == {
+        ("001", "002", "003"), ("005", "004")
+    }
+    assert [combo.remaining_time for combo in combinations] == [0, 210]
+    assert [combo.total_time for combo in combinations] == [600, 390]
+
+
+def test_service_falls_back_without_pool(sample_videos, pool_repository, catalog):
+    """プールがない場合や指紋が古い場合は通常の選択を行うことのテスト"""
+    pool_repository.replace_pools({10: [["001", "002", "003"]]}, "stale-fingerprint")
+    pool_repository.get_pool = MagicMock(wraps=pool_repository.get_pool)
+    pool_cache = CombinationPoolCache(pool_repository)
+    video_service = VideoService(catalog.video_repository, catalog=catalog, pool_cache=pool_cache)
+
+    for _ in range(3):
+        combinations = video_service.get_video_combinations(target_duration=600)
+        assert len(combinations) == 3
+        for combo in combinations:
+            assert combo.total_time <= 600
+
+    # プールがないことはキャッシュされ、DBは1回しか参照されない
+    pool_repository.get_pool.assert_called_once()
+
+
+def test_pool_error_logs_traceback_once(catalog, caplog):
+    """プールの取得が毎回失敗しても通常の選択を行い、スタックトレースは1回だけ出力することのテスト"""
+    pool_repository = MagicMock()
+    pool_repository.get_pool.side_effect = RuntimeError("no such table: combination_pools")
+    video_service = VideoService(
+        catalog.video_repository, catalog=catalog, pool_cache=CombinationPoolCache(pool_repository)
+    )
+
+    with caplog.at_level(logging.DEBUG):
+        for _ in range(3):
+            assert len(video_service.get_video_combinations(target_duration=600)) == 3
+
+    pool_records = [record for record in caplog.records if "組み合わせプール" in record.getMessage()]
+    assert len(pool_records) == 3
+    assert [record.exc_info is not None for record in pool_records] == [True, False, False]
+    assert pool_records[0].levelno == logging.WARNING
+
+
+def test_pool_cache_evicts_least_recently_used(pool_repository, catalog, sample_videos):
+    """キャッシュが上限を超えると最も古いプールが削除されることのテスト"""
+    pool_repository.replace_pools(
+        {minutes: [["001"]] for minutes in range(1, 5)}, catalog_fingerprint(sample_videos)
+    )
+    pool_cache = CombinationPoolCache(pool_repository, maxsize=2)
+    snapshot = catalog.snapshot
+
+    pool_cache.get(snapshot, 1)
+    pool_cache.get(snapshot, 2)
+    pool_cache.get(snapshot, 1)
+    pool_cache.get(snapshot, 3)
+
+    assert list(pool_cache._pools) == [(snapshot.version, 1), (snapshot.version, 3)]
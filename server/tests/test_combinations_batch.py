@@ -0,0 +1,109 @@
+"""
+複数の目標時間の組み合わせを一括取得する API のテスト
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from src.jaljalgotcha import main
+from src.jaljalgotcha.models import Video, VideoTable
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.services.catalog import VideoCatalog
+from src.jaljalgotcha.services.video_service import VideoService
+
+
+@pytest.fixture
+def mock_repo():
+    """1分から5分の動画を返すモックリポジトリを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = [
+        Video(id=f"{i:03d}", title=f"サンプル動画{i}", duration=60 * i) for i in range(1, 6)
+    ]
+    mock_repo.get_video_table.side_effect = lambda filters=None: VideoTable.from_videos(mock_repo.get_videos(filters))
+    return mock_repo
+
+
+@pytest.fixture
+def client(monkeypatch, mock_repo):
+    """モックリポジトリのサービスを使用するテストクライアントを提供するフィクスチャ"""
+    service = VideoService(mock_repo)
+    monkeypatch.setattr(main, 'get_db_video_service', lambda: service)
+    return main.create_app().test_client()
+
+
+def test_batch_reads_videos_once(client, mock_repo):
+    """複数の目標時間を指定した順に返し、動画一覧は1回だけ取得することのテスト"""
+    response = client.get('/api/combinations/batch?durations=5,3,10&attempts=2')
+
+    assert response.status_code == 200
+    results = response.get_json()
+    assert [result["duration"] for result in results] == [5, 3, 10]
+    assert all(result["attempts"] == 2 and len(result["combinations"]) == 2 for result in results)
+    assert all(combo["total_time"] <= result["duration"] * 60
+               for result in results for combo in result["combinations"])
+    mock_repo.get_videos.assert_called_once()
+
+
+def test_batch_post_targets(client):
+    """POST の JSON で目標時間ごとに組み合わせの数を指定できることのテスト"""
+    response = client.post('/api/combinations/batch', json={"targets": [
+        {"duration": 15, "attempts": 1}, {"duration": 5, "attempts": 4},
+    ]})
+
+    assert response.status_code == 200
+    results = response.get_json()
+    assert [(result["duration"], len(result["combinations"])) for result in results] == [(15, 1), (5, 4)]
+
+
+def test_batch_stream(client):
+    """stream=true の場合は目標時間ごとに NDJSON の行で返すことのテスト"""
+    response = client.get('/api/combinations/batch?durations=5,10&attempts=1,3&stream=true')
+
+    assert response.status_code == 200
+    assert response.mimetype == main.NDJSON_MIMETYPE
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line["duration"], line["attempts"]) for line in lines] == [(5, 1), (10, 3)]
+    assert len(lines[1]["combinations"]) == 3
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "durations=5,abc",
+    "durations=5,2000",
+    "durations=5,10&attempts=1,2,3",
+    "durations=5&attempts=0",
+    "durations=" + ",".join(["5"] * (main.MAX_BATCH_TARGETS + 1)),
+    "durations=5&mode=unknown",
+])
+def test_batch_validation(client, query):
+    """不正なパラメータは 400 になることのテスト"""
+    response = client.get(f'/api/combinations/batch?{query}')
+
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_batch_surfaces_fetch_errors(client, mock_repo):
+    """動画一覧の取得に失敗した場合は 500 になることのテスト"""
+    mock_repo.get_videos.side_effect = RuntimeError("DB接続エラー")
+
+    response = client.get('/api/combinations/batch?durations=5,10')
+
+    assert response.status_code == 500
+    assert "DB接続エラー" in response.get_json()["error"]
+
+
+def test_service_batch_uses_one_snapshot(mock_repo):
+    """途中でカタログが差し替えられても最初のスナップショットから選ぶことのテスト"""
+    catalog = VideoCatalog(mock_repo)
+    catalog.refresh()
+    service = VideoService(mock_repo, catalog=catalog)
+
+    results = service.iter_video_combinations_batch([(300, 1), (600, 1)])
+    first = next(results)
+    mock_repo.get_videos.return_value = [Video(id="999", title="新しい動画", duration=60)]
+    catalog.refresh()
+    second = next(results)
+
+    assert first[0] == 300 and second[0] == 600
+    assert all(video.id != "999" for combo in second[2] for video in combo.videos)
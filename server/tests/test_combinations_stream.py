@@ -0,0 +1,87 @@
+"""
+組み合わせを NDJSON で逐次返す API のテスト
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from src.jaljalgotcha import main
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.services.video_service import VideoService
+
+
+@pytest.fixture
+def mock_repo():
+    """30秒から10分の動画を返すモックリポジトリを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = [
+        Video(id=f"{i:03d}", title=f"サンプル動画{i}", duration=30 * i) for i in range(1, 21)
+    ]
+    return mock_repo
+
+
+@pytest.fixture
+def client(monkeypatch, mock_repo):
+    """モックリポジトリのサービスを使用するテストクライアントを提供するフィクスチャ"""
+    service = VideoService(mock_repo)
+    monkeypatch.setattr(main, 'get_db_video_service', lambda: service)
+    return main.create_app().test_client()
+
+
+def read_lines(response):
+    """NDJSON のレスポンスを行ごとに読み込む"""
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_returns_each_combination(client):
+    """stream=true の場合は組み合わせを1行ずつ返すことのテスト"""
+    response = client.get('/api/combinations?duration=10&attempts=50&stream=true')
+
+    assert response.status_code == 200
+    assert response.mimetype == main.NDJSON_MIMETYPE
+    lines = read_lines(response)
+    assert len(lines) == 50
+    assert all(line["total_time"] <= 600 and line["videos"] for line in lines)
+
+
+def test_stream_top_is_sorted(client):
+    """top を指定すると残り時間が少ない上位だけを昇順で返すことのテスト"""
+    response = client.get('/api/combinations?duration=10&attempts=200&stream=true&top=5')
+
+    remaining = [line["remaining_time"] for line in read_lines(response)]
+    assert len(remaining) == 5
+    assert remaining == sorted(remaining)
+
+
+def test_top_without_stream(client):
+    """stream を指定しない場合も top 件だけを残り時間が少ない順に返すことのテスト"""
+    response = client.get('/api/combinations?duration=10&attempts=20&top=1')
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
+
+
+def test_stream_is_lazy(mock_repo):
+    """組み合わせの数が非常に多くても最初の組み合わせがすぐに得られることのテスト"""
+    results = VideoService(mock_repo).iter_video_combinations(600, 10 ** 12)
+
+    assert next(results).total_time <= 600
+
+
+@pytest.mark.parametrize("top", ["abc", "0"])
+def test_stream_top_validation(client, top):
+    """不正な top は 400 になることのテスト"""
+    response = client.get(f'/api/combinations?duration=10&stream=true&top={top}')
+
+    assert response.status_code == 400
+
+
+def test_stream_surfaces_fetch_errors(client, mock_repo):
+    """動画一覧の取得に失敗した場合は逐次出力を始める前に 500 になることのテスト"""
+    mock_repo.get_videos.side_effect = RuntimeError("DB接続エラー")
+
+    response = client.get('/api/combinations?duration=10&stream=true')
+
+    assert response.status_code == 500
+    assert "DB接続エラー" in response.get_json()["error"]
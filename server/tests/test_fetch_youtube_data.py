@@ -0,0 +1,365 @@
+"""
+YouTube データ取得スクリプトのテスト（discovery クライアントの偽物を使用）
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine, func, select
+from src.jaljalgotcha.db.models_db import Base, VideoModel
+from src.jaljalgotcha.repositories.sync_state_repository import DbSyncStateRepository, SyncWatermark
+from src.jaljalgotcha.repositories.video_repository import DbVideoRepository
+from src.jaljalgotcha.scripts import fetch_youtube_data
+from src.jaljalgotcha.scripts.fetch_youtube_data import (
+    execute_with_retry,
+    fetch_videos_from_youtube,
+    is_transient_error,
+    iter_batches,
+    iter_videos_from_youtube,
+    newest_watermark,
+)
+
+# 偽のプレイリストの最新の動画の公開日時（以降1時間ずつ古くなる）
+NEWEST_PUBLISHED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def published_at(index):
+    """偽のプレイリストの index 番目の動画の公開日時"""
+    return NEWEST_PUBLISHED_AT - timedelta(hours=index)
+
+
+def make_http_error(status, reason=None):
+    """HttpError を生成する"""
+    content = b'{"error": {"errors": [{"reason": "%s"}], "message": "error"}}' % (reason or 'error').encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FakeRequest:
+    """execute で結果を返すか例外を送出する API リクエストの偽物"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def execute(self):
+        return self.handler()
+
+
+class FakeResource:
+    """list メソッドを持つリソースの偽物"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def list(self, **kwargs):
+        return FakeRequest(lambda: self.handler(**kwargs))
+
+
+class FakeYouTube:
+    """YouTube Data API の discovery クライアントの偽物"""
+
+    def __init__(self, video_count, detail_delay=0.0, transient_failures=0, fail_after=None):
+        self.video_ids = [f"video{i:04d}" for i in range(video_count)]
+        self.detail_delay = detail_delay
+        self.transient_failures = transient_failures
+        # この回数の詳細取得の後は一時的でないエラーを返す
+        self.fail_after = fail_after
+        self.lock = threading.Lock()
+        self.active_details = 0
+        self.max_active_details = 0
+        self.detail_calls = 0
+        self.playlist_calls = 0
+        self.detail_ids = []
+
+    def channels(self):
+        return FakeResource(lambda **kwargs: {
+            'items': [{'contentDetails': {'relatedPlaylists': {'uploads': 'UU' + kwargs['id']}}}]
+        })
+
+    def playlistItems(self):
+        def handler(playlistId, part, maxResults, pageToken=None):
+            self.playlist_calls += 1
+            start = int(pageToken or 0)
+            page = self.video_ids[start:start + maxResults]
+            response = {'items': [
+                {
+                    'snippet': {'resourceId': {'videoId': video_id}},
+                    'contentDetails': {'videoPublishedAt': published_at(start + i).isoformat().replace('+00:00', 'Z')},
+                }
+                for i, video_id in enumerate(page)
+            ]}
+            if start + maxResults < len(self.video_ids):
+                response['nextPageToken'] = str(start + maxResults)
+            return response
+        return FakeResource(handler)
+
+    def videos(self):
+        def handler(id, part):
+            with self.lock:
+                self.detail_calls += 1
+                self.detail_ids.extend(id.split(','))
+                if self.transient_failures > 0:
+                    self.transient_failures -= 1
+                    raise make_http_error(503)
+                if self.fail_after is not None and self.detail_calls > self.fail_after:
+                    raise make_http_error(400)
+                self.active_details += 1
+                self.max_active_details = max(self.max_active_details, self.active_details)
+            try:
+                time.sleep(self.detail_delay)
+                return {'items': [self.video_detail(video_id) for video_id in id.split(',')]}
+            finally:
+                with self.lock:
+                    self.active_details -= 1
+        return FakeResource(handler)
+
+    def video_detail(self, video_id):
+        """videos().list が返す動画の詳細"""
+        index = self.video_ids.index(video_id)
+        return {
+            'id': video_id,
+            'snippet': {
+                'channelId': 'channel',
+                'title': f"動画{index}",
+                'publishedAt': published_at(index).isoformat().replace('+00:00', 'Z'),
+                'thumbnails': {'default': {'url': f"https://example.com/{video_id}.jpg"}},
+            },
+            'contentDetails': {'duration': 'PT2M'},
+            'statistics': {'viewCount': '100'},
+        }
+
+
+def test_fetch_videos_in_playlist_order():
+    """並行取得しても結果がプレイリストの順に並ぶことのテスト"""
+    fake = FakeYouTube(video_count=230, detail_delay=0.01)
+
+    videos = fetch_videos_from_youtube('key', 'channel', max_workers=4, client_factory=lambda: fake)
+
+    assert [video['id'] for video in videos] == fake.video_ids
+    # 50件ずつ5回に分けて取得される
+    assert fake.detail_calls == 5
+
+
+def test_fetch_videos_concurrently_with_bounded_workers():
+    """詳細取得が上限の範囲で並行に実行されることのテスト"""
+    fake = FakeYouTube(video_count=500, detail_delay=0.05)
+
+    fetch_videos_from_youtube('key', 'channel', max_workers=3, client_factory=lambda: fake)
+
+    assert 1 < fake.max_active_details <= 3
+
+
+def test_clients_are_created_per_thread():
+    """クライアントがスレッドごとに1つだけ作成されることのテスト"""
+    fake = FakeYouTube(video_count=500, detail_delay=0.01)
+    created = []
+
+    def client_factory():
+        created.append(threading.get_ident())
+        return fake
+
+    fetch_videos_from_youtube('key', 'channel', max_workers=2, client_factory=client_factory)
+
+    # メインスレッドと2つのワーカースレッド
+    assert len(created) == len(set(created)) <= 3
+
+
+def test_fetch_retries_transient_errors():
+    """一時的なエラーは再試行されることのテスト"""
+    fake = FakeYouTube(video_count=120, transient_failures=2)
+    delays = []
+
+    videos = fetch_videos_from_youtube(
+        'key', 'channel', max_workers=2, client_factory=lambda: fake, sleep=delays.append
+    )
+
+    assert len(videos) == 120
+    assert len(delays) == 2
+
+
+def test_execute_with_retry_gives_up():
+    """再試行回数を超えた場合や一時的でないエラーの場合は例外が送出されることのテスト"""
+    calls = []
+
+    def always_unavailable():
+        calls.append(1)
+        raise make_http_error(503)
+
+    with pytest.raises(HttpError):
+        execute_with_retry(FakeRequest(always_unavailable), max_retries=3, sleep=lambda delay: None)
+    assert len(calls) == 4
+
+    calls.clear()
+
+    def not_found():
+        calls.append(1)
+        raise make_http_error(404)
+
+    with pytest.raises(HttpError):
+        execute_with_retry(FakeRequest(not_found), sleep=lambda delay: None)
+    assert len(calls) == 1
+
+
+def test_is_transient_error():
+    """一時的なエラーの判定のテスト"""
+    assert is_transient_error(make_http_error(500))
+    assert is_transient_error(make_http_error(429))
+    assert is_transient_error(make_http_error(403, 'rateLimitExceeded'))
+    assert not is_transient_error(make_http_error(403, 'quotaExceeded'))
+    assert not is_transient_error(make_http_error(400))
+
+
+def test_incremental_fetch_stops_at_watermark():
+    """ウォーターマークに達したらページングを止め、新しい動画のみ取得することのテスト"""
+    fake = FakeYouTube(video_count=500)
+    watermark = SyncWatermark(video_id=fake.video_ids[70], published_at=published_at(70))
+
+    videos = fetch_videos_from_youtube('key', 'channel', client_factory=lambda: fake, watermark=watermark)
+
+    assert [video['id'] for video in videos] == fake.video_ids[:70]
+    # 2ページ目でウォーターマークに達するので3ページ目以降は取得しない
+    assert fake.playlist_calls == 2
+
+
+def test_incremental_fetch_stops_at_older_video():
+    """ウォーターマークの動画が削除されていても公開日時で止まることのテスト"""
+    fake = FakeYouTube(video_count=500)
+    watermark = SyncWatermark(video_id='deleted', published_at=published_at(30) - timedelta(minutes=30))
+
+    videos = fetch_videos_from_youtube('key', 'channel', client_factory=lambda: fake, watermark=watermark)
+
+    assert [video['id'] for video in videos] == fake.video_ids[:31]
+    assert fake.playlist_calls == 1
+
+
+def test_incremental_fetch_refreshes_stale_videos():
+    """古くなった動画の詳細が新しい動画と重複せずに取得されることのテスト"""
+    fake = FakeYouTube(video_count=500)
+    watermark = SyncWatermark(video_id=fake.video_ids[3], published_at=published_at(3))
+    stale_ids = [fake.video_ids[1]] + fake.video_ids[100:160]
+
+    videos = fetch_videos_from_youtube(
+        'key', 'channel', client_factory=lambda: fake, watermark=watermark, refresh_video_ids=stale_ids
+    )
+
+    assert [video['id'] for video in videos] == fake.video_ids[:3] + fake.video_ids[100:160]
+    assert sorted(fake.detail_ids) == sorted(fake.video_ids[:3] + fake.video_ids[100:160])
+
+
+def test_newest_watermark():
+    """取得した動画のうち最も新しいものがウォーターマークになることのテスト"""
+    current = SyncWatermark(video_id='old', published_at=published_at(10))
+    video_models = [
+        VideoModel(video_id='a', published_at=published_at(20)),
+        VideoModel(video_id='b', published_at=published_at(2)),
+        VideoModel(video_id='c', published_at=published_at(5)),
+    ]
+
+    assert newest_watermark(video_models, current) == SyncWatermark(video_id='b', published_at=published_at(2))
+    assert newest_watermark(video_models[:1], current) == current
+    assert newest_watermark([], None) is None
+
+
+def test_sync_state_repository(tmp_path):
+    """ウォーターマークの保存と取得のテスト"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    Base.metadata.create_all(bind=engine)
+    repository = DbSyncStateRepository(MagicMock(), db_engine=engine)
+
+    assert repository.get_watermark('channel') is None
+
+    watermark = SyncWatermark(video_id='video0001', published_at=published_at(1))
+    repository.save_watermark('channel', watermark)
+    assert repository.get_watermark('channel') == watermark
+
+    newer = SyncWatermark(video_id='video0000', published_at=published_at(0))
+    repository.save_watermark('channel', newer)
+    assert repository.get_watermark('channel') == newer
+
+
+def test_iter_videos_bounds_pending_details():
+    """結果を消費しない間は先のページを取得しすぎないことのテスト"""
+    fake = FakeYouTube(video_count=2000)
+
+    videos = iter_videos_from_youtube('key', 'channel', max_workers=2, client_factory=lambda: fake)
+    first = next(videos)
+
+    assert first['id'] == fake.video_ids[0]
+    # 40ページのうち、未処理の上限（4件）を1件超えるまでしか取得しない
+    assert fake.playlist_calls == 5
+    videos.close()
+
+
+def test_iter_batches():
+    """要素が指定した件数ずつにまとめられることのテスト"""
+    assert list(iter_batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """SQLite と偽の YouTube クライアントで main を実行する関数を提供するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'ingest.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(fetch_youtube_data, 'init_db', lambda: None)
+    monkeypatch.setattr(fetch_youtube_data, 'rebuild_pools', lambda: None)
+    monkeypatch.setattr(fetch_youtube_data, 'YOUTUBE_API_KEY', 'key')
+    monkeypatch.setattr(fetch_youtube_data, 'YOUTUBE_CHANNEL_ID', 'channel')
+    monkeypatch.setattr(fetch_youtube_data, 'DbVideoRepository',
+                        lambda session: DbVideoRepository(session, db_engine=engine))
+    monkeypatch.setattr(fetch_youtube_data, 'DbSyncStateRepository',
+                        lambda session: DbSyncStateRepository(session, db_engine=engine))
+
+    def run(fake, argv):
+        monkeypatch.setattr(fetch_youtube_data, 'iter_videos_from_youtube', lambda *args, **kwargs:
+                            iter_videos_from_youtube(*args, client_factory=lambda: fake,
+                                                     sleep=lambda delay: None, **kwargs))
+        fetch_youtube_data.main(argv)
+
+    run.engine = engine
+    return run
+
+
+def count_videos(engine):
+    """保存されている動画の件数"""
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(VideoModel)).scalar()
+
+
+def test_main_saves_in_batches(ingest):
+    """取り込んだ動画がバッチごとに保存され、最後にウォーターマークが進むことのテスト"""
+    fake = FakeYouTube(video_count=230)
+
+    ingest(fake, ['--batch-size', '100'])
+
+    assert count_videos(ingest.engine) == 230
+    watermark = DbSyncStateRepository(MagicMock(), db_engine=ingest.engine).get_watermark('channel')
+    assert watermark == SyncWatermark(video_id=fake.video_ids[0], published_at=published_at(0))
+
+
+@pytest.mark.parametrize("argv, rebuilt", [([], 1), (['--skip-pools'], 0)])
+def test_main_rebuilds_pools_unless_skipped(ingest, monkeypatch, argv, rebuilt):
+    """取り込みの最後に組み合わせプールを再計算し、--skip-pools の場合は省略することのテスト"""
+    rebuild = MagicMock()
+    monkeypatch.setattr(fetch_youtube_data, 'rebuild_pools', rebuild)
+
+    ingest(FakeYouTube(video_count=10), argv)
+
+    assert rebuild.call_count == rebuilt
+
+
+def test_main_keeps_committed_batches_on_failure(ingest, monkeypatch):
+    """途中で失敗しても保存済みのバッチは残り、ウォーターマークは進まないことのテスト"""
+    # 詳細取得の順序を固定するため1スレッドで実行する
+    monkeypatch.setattr(fetch_youtube_data, 'YOUTUBE_FETCH_WORKERS', 1)
+    fake = FakeYouTube(video_count=500, fail_after=4)
+
+    with pytest.raises(SystemExit):
+        ingest(fake, ['--batch-size', '100'])
+
+    # 4回分（200件）の詳細のうち、100件ずつのバッチ2つが保存済み
+    assert count_videos(ingest.engine) == 200
+    assert DbSyncStateRepository(MagicMock(), db_engine=ingest.engine).get_watermark('channel') is None
@@ -0,0 +1,135 @@
+"""
+計測値と /metrics のテスト
+"""
+import json
+import logging
+import random
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from src.jaljalgotcha import main, metrics
+from src.jaljalgotcha.db.database import count_query
+from src.jaljalgotcha.db.pool import InstrumentedQueuePool, pool_metrics
+from src.jaljalgotcha.metrics import Histogram, Registry, log_sampled
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.services.video_service import VideoService
+
+
+def test_counter_and_gauge_render():
+    """カウンターとゲージがラベルごとに Prometheus のテキスト形式で出力されることのテスト"""
+    registry = Registry()
+    requests = registry.counter('requests_total', 'リクエスト数', ('status',))
+    size = registry.gauge('catalog_videos', '件数')
+    requests.inc(status=200)
+    requests.inc(2, status=200)
+    requests.inc(status='4"0\\0')
+    size.set(1.5)
+
+    assert registry.render() == (
+        '# HELP requests_total リクエスト数\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{status="200"} 3\n'
+        'requests_total{status="4\\"0\\\\0"} 1\n'
+        '# HELP catalog_videos 件数\n'
+        '# TYPE catalog_videos gauge\n'
+        'catalog_videos 1.5\n'
+    )
+
+
+def test_metric_validation():
+    """ラベルの過不足、カウンターの減少、名前の重複がエラーになることのテスト"""
+    registry = Registry()
+    counter = registry.counter('a_total', 'a', ('status',))
+
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.inc(-1, status=200)
+    with pytest.raises(ValueError):
+        registry.gauge('a_total', 'duplicate')
+
+
+def test_histogram_buckets():
+    """ヒストグラムが累積件数・合計・件数を出力することのテスト"""
+    histogram = Histogram('stage_seconds', '処理時間', ('stage',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage='fetch')
+
+    lines = histogram.render().splitlines()[2:]
+    assert lines == [
+        'stage_seconds_bucket{stage="fetch",le="0.1"} 2',
+        'stage_seconds_bucket{stage="fetch",le="1"} 3',
+        'stage_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'stage_seconds_sum{stage="fetch"} 3.65',
+        'stage_seconds_count{stage="fetch"} 4',
+    ]
+    with histogram.time(stage='select'):
+        pass
+    assert histogram.count(stage='select') == 1
+
+
+def test_log_sampled(caplog):
+    """割合に応じて構造化ログが出力されることのテスト"""
+    logger = logging.getLogger('test_metrics')
+    rng = random.Random(0)
+    with caplog.at_level(logging.INFO, logger='test_metrics'):
+        assert log_sampled(logger, 'combinations', rate=1.0, videos=10, mode='random')
+        assert not log_sampled(logger, 'combinations', rate=0.0, videos=10)
+        sampled = sum(log_sampled(logger, 'x', rate=0.1, rng=rng) for _ in range(1000))
+
+    assert json.loads(caplog.records[0].getMessage()) == {"event": "combinations", "mode": "random", "videos": 10}
+    assert caplog.records[0].fields == {"videos": 10, "mode": "random"}
+    assert 50 < sampled < 150
+
+
+def test_db_queries_are_counted():
+    """実行した SQL 文が種類ごとに数えられることのテスト"""
+    engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool)
+    event.listen(engine, 'before_cursor_execute', count_query)
+    before = metrics.DB_QUERIES.get(statement='SELECT')
+
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+        conn.execute(text("  SELECT 2"))
+
+    assert metrics.DB_QUERIES.get(statement='SELECT') == before + 2
+    names = {metric.name for metric in pool_metrics(engine)}
+    assert {'jaljalgotcha_db_pool_checkouts_total', 'jaljalgotcha_db_pool_checked_out'} <= names
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """モックリポジトリのサービスを使用するテストクライアントを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = [
+        Video(id="001", title="サンプル動画1", duration=120),
+        Video(id="002", title="サンプル動画2", duration=180),
+    ]
+    monkeypatch.setattr(main, 'get_db_video_service', lambda: VideoService(mock_repo))
+    return main.create_app().test_client()
+
+
+def test_metrics_endpoint_records_stages(client):
+    """/api/combinations の段階ごとの処理時間とリクエスト数が /metrics に出力されることのテスト"""
+    stages = ('parse', 'fetch', 'select', 'serialize')
+    before = {stage: metrics.COMBINATION_STAGE_SECONDS.count(stage=stage) for stage in stages}
+    ok_before = metrics.REQUESTS.get(endpoint='/api/combinations', status=200)
+    bad_before = metrics.REQUESTS.get(endpoint='/api/combinations', status=400)
+
+    assert client.get('/api/combinations?duration=5').status_code == 200
+    assert client.get('/api/combinations').status_code == 400
+
+    for stage in stages:
+        assert metrics.COMBINATION_STAGE_SECONDS.count(stage=stage) == before[stage] + 1
+    assert metrics.REQUESTS.get(endpoint='/api/combinations', status=200) == ok_before + 1
+    assert metrics.REQUESTS.get(endpoint='/api/combinations', status=400) == bad_before + 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert 'jaljalgotcha_combinations_stage_duration_seconds_count{stage="serialize"}' in body
+    assert 'jaljalgotcha_http_requests_total{endpoint="/api/combinations",status="400"}' in body
+    assert '# TYPE jaljalgotcha_catalog_videos gauge' in body
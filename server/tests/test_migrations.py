@@ -0,0 +1,126 @@
+"""
+データベースのマイグレーションのテスト
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from src.jaljalgotcha.db.migrations import MIGRATIONS, migrate, pending_migrations
+from src.jaljalgotcha.db.models_db import COVERED_COLUMNS, VIDEO_INDEXES
+from src.jaljalgotcha.repositories.video_repository import VIDEO_READ_COLUMNS, DbVideoRepository
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite の空のデータベースのエンジンを提供するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'videos.db'}")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine):
+    """videos テーブルのインデックス名の集合"""
+    return {index['name'] for index in inspect(engine).get_indexes('videos')}
+
+
+def query_plan(engine, filters):
+    """get_videos の SQL 文の実行計画（SQLite）"""
+    stmt = DbVideoRepository._filtered_select(VIDEO_READ_COLUMNS, filters)
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+    with engine.connect() as connection:
+        return ' / '.join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+def test_migrate_empty_database(engine):
+    """空のデータベースにすべてのマイグレーションが適用され、2回目は何もしないことのテスト"""
+    assert [migration.version for migration in migrate(engine)] == [migration.version for migration in MIGRATIONS]
+
+    assert {'videos', 'combination_pools', 'sync_states', 'schema_migrations'} <= set(inspect(engine).get_table_names())
+    assert index_names(engine) == {index.name for index in VIDEO_INDEXES}
+    assert pending_migrations(engine) == []
+    assert migrate(engine) == []
+
+
+def test_migrate_to_first_version(engine):
+    """バージョン1までの適用では後のバージョンのテーブルやインデックスを作成しないことのテスト"""
+    assert pending_migrations(engine) == list(MIGRATIONS)
+    # 未適用の確認では記録用のテーブルを作成しない
+    assert 'schema_migrations' not in inspect(engine).get_table_names()
+
+    assert [migration.version for migration in migrate(engine, target=1)] == [1]
+
+    tables = set(inspect(engine).get_table_names())
+    assert {'videos', 'combination_pools', 'sync_states', 'schema_migrations'} <= tables
+    assert 'catalog_versions' not in tables
+    assert index_names(engine) == set()
+    assert [migration.version for migration in pending_migrations(engine)] == [2, 3, 4]
+
+
+def covering_columns(engine):
+    """idx_duration_covering の列（SQLite の複合インデックス）"""
+    indexes = {index['name']: index for index in inspect(engine).get_indexes('videos')}
+    return indexes['idx_duration_covering']['column_names']
+
+
+def test_migrations_use_their_own_index_definitions(engine):
+    """各マイグレーションは適用したときの定義のインデックスを作成し、最後はモデルの定義と一致することのテスト"""
+    migrate(engine, target=2)
+    assert covering_columns(engine) == ['duration_seconds', 'video_id', 'title', 'thumbnail_url']
+
+    migrate(engine)
+    model_columns = [
+        [column.name for column in index.columns] for index in VIDEO_INDEXES if index.name == 'idx_duration_covering'
+    ]
+    assert covering_columns(engine) in model_columns
+    assert covering_columns(engine) == ['duration_seconds', *COVERED_COLUMNS]
+
+
+def test_migrate_existing_database(engine):
+    """マイグレーション導入前のテーブルにインデックスが追加され、時間のみのインデックスが置き換わることのテスト"""
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE videos (video_id TEXT PRIMARY KEY, channel_id TEXT NOT NULL, title TEXT NOT NULL,"
+            " duration_seconds INTEGER NOT NULL, view_count BIGINT DEFAULT 0, like_count BIGINT DEFAULT 0,"
+            " comment_count BIGINT DEFAULT 0, thumbnail_url TEXT, published_at TIMESTAMP, updated_at TIMESTAMP)"
+        ))
+        connection.execute(text("CREATE INDEX idx_like_count ON videos (like_count)"))
+        connection.execute(text("CREATE INDEX idx_duration_seconds ON videos (duration_seconds)"))
+        connection.execute(text(
+            "INSERT INTO videos (video_id, channel_id, title, duration_seconds) VALUES ('v1', 'c', '動画', 60)"
+        ))
+
+    assert [migration.version for migration in migrate(engine, target=1)] == [1]
+    assert index_names(engine) == {'idx_like_count', 'idx_duration_seconds'}
+
+    assert [migration.version for migration in migrate(engine)] == [2, 3, 4]
+    assert index_names(engine) == {index.name for index in VIDEO_INDEXES}
+    # 既存の行はそのまま読める
+    assert [video.id for video in DbVideoRepository(None, db_engine=engine).get_videos()] == ['v1']
+
+
+@pytest.mark.parametrize("filters, index", [
+    (None, 'COVERING INDEX idx_duration_covering'),
+    ({'max_duration': 300}, 'COVERING INDEX idx_duration_covering'),
+    ({'min_likes': 100, 'order_by': 'likes', 'order_dir': 'desc'}, 'INDEX idx_like_count'),
+    ({'min_views': 100, 'order_by': 'views'}, 'INDEX idx_view_count'),
+])
+def test_get_videos_uses_indexes(engine, filters, index):
+    """get_videos の絞り込み・並び替えでインデックスを使用し、並べ替えを行わないことのテスト"""
+    migrate(engine)
+
+    plan = query_plan(engine, filters)
+
+    assert f"USING {index}" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_postgresql_covering_index():
+    """PostgreSQL では時間のインデックスに読み込む列を INCLUDE で含めることのテスト"""
+    dialect = postgresql.dialect()
+    covering = [
+        str(CreateIndex(index).compile(dialect=dialect)) for index in VIDEO_INDEXES
+        if index.name == 'idx_duration_covering'
+    ]
+
+    assert "CREATE INDEX idx_duration_covering ON videos (duration_seconds) INCLUDE (video_id, title, thumbnail_url, like_count, view_count)" \
+        in covering
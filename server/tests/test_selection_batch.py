@@ -0,0 +1,102 @@
+"""
+NumPy による組み合わせ一括生成のテスト
+"""
+import random
+
+import numpy as np
+import pytest
+from src.jaljalgotcha.selection.batch import generate_best_selections
+
+
+@pytest.fixture
+def durations():
+    """ランダムな動画時間を提供するフィクスチャ"""
+    rng = random.Random(42)
+    return [rng.randint(30, 600) for _ in range(500)]
+
+
+def assert_greedy_result(durations, selection, target_duration, min_remaining=60):
+    """貪欲法として妥当な選択結果であることを確認する"""
+    # 同じ動画が重複して選ばれていない
+    assert len(set(selection.indices)) == len(selection.indices)
+
+    total_time = sum(durations[i] for i in selection.indices)
+    assert selection.total_time == total_time
+    assert selection.remaining_time == target_duration - total_time
+    assert total_time <= target_duration
+
+    # 残り時間が許容範囲内か、収まる未使用の動画が残っていない
+    if selection.remaining_time > min_remaining:
+        used = set(selection.indices)
+        assert all(
+            duration > selection.remaining_time
+            for i, duration in enumerate(durations) if i not in used
+        )
+
+
+@pytest.mark.parametrize("target_duration", [300, 1800, 60000])
+def test_generate_best_selections(durations, target_duration):
+    """上位の候補が残り時間の少ない順に返されることのテスト"""
+    selections = generate_best_selections(
+        durations, target_duration, attempts=5, candidates=300, rng=np.random.default_rng(0)
+    )
+
+    assert len(selections) == 5
+    remaining_times = [selection.remaining_time for selection in selections]
+    assert remaining_times == sorted(remaining_times)
+
+    for selection in selections:
+        assert_greedy_result(durations, selection, target_duration)
+
+
+def test_generate_across_chunks(durations, monkeypatch):
+    """候補が複数のチャンクに分かれても上位が選ばれることのテスト"""
+    monkeypatch.setattr('src.jaljalgotcha.selection.batch.CHUNK_ELEMENTS', len(durations) * 7)
+
+    selections = generate_best_selections(
+        durations, 1800, attempts=3, candidates=50, rng=np.random.default_rng(1)
+    )
+
+    assert len(selections) == 3
+    for selection in selections:
+        assert_greedy_result(durations, selection, 1800)
+
+
+def test_large_work_uses_index(durations, monkeypatch):
+    """候補数 × 動画数が上限を超える場合は一括生成せずに時間インデックスで生成することのテスト"""
+    monkeypatch.setattr('src.jaljalgotcha.selection.batch.MAX_BATCH_ELEMENTS', len(durations) * 10)
+    monkeypatch.setattr('src.jaljalgotcha.selection.batch._generate_chunk', None)
+
+    selections = generate_best_selections(
+        durations, 1800, attempts=3, candidates=50, rng=np.random.default_rng(2)
+    )
+
+    assert len(selections) == 3
+    remaining_times = [selection.remaining_time for selection in selections]
+    assert remaining_times == sorted(remaining_times)
+    for selection in selections:
+        assert_greedy_result(durations, selection, 1800)
+
+
+def test_first_pick_distribution():
+    """最初に選ばれる動画が収まる動画の中で一様に分布することのテスト"""
+    durations = [100, 200, 300, 400, 900]
+    counts = np.zeros(len(durations))
+    rng = np.random.default_rng(7)
+
+    for _ in range(200):
+        for selection in generate_best_selections(durations, 450, attempts=20, candidates=20, rng=rng):
+            counts[selection.indices[0]] += 1
+
+    # 900秒の動画は選ばれず、残りはほぼ均等（各1000回前後）
+    assert counts[4] == 0
+    assert np.all(np.abs(counts[:4] - 1000) < 150)
+
+
+def test_no_eligible_videos():
+    """目標時間以下の動画がない場合は空の選択結果を返すことのテスト"""
+    selections = generate_best_selections([600, 900], 300, attempts=2, candidates=10)
+
+    assert len(selections) == 2
+    assert all(selection.indices == [] for selection in selections)
+    assert all(selection.remaining_time == 300 for selection in selections)
@@ -0,0 +1,72 @@
+"""
+部分和の動的計画法による最適な組み合わせ探索のテスト
+"""
+import random
+from itertools import combinations
+
+import pytest
+from src.jaljalgotcha.selection.best_fit import find_best_fit_selections
+
+
+def brute_force_best_total(durations, target_duration):
+    """全探索で目標時間以下の最大の合計を求める（比較用）"""
+    best = 0
+    for size in range(len(durations) + 1):
+        for subset in combinations(durations, size):
+            total = sum(subset)
+            if best < total <= target_duration:
+                best = total
+    return best
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_best_total_matches_brute_force(seed):
+    """全探索と同じ最小の残り時間が得られることのテスト"""
+    rng = random.Random(seed)
+    durations = [rng.randint(60, 600) for _ in range(12)]
+    target_duration = rng.randint(300, 3000)
+
+    selections = find_best_fit_selections(durations, target_duration, 3, time_budget=5.0, rng=rng)
+
+    best_total = brute_force_best_total(durations, target_duration)
+    assert len(selections) == 3
+    for selection in selections:
+        assert selection.total_time == best_total
+        assert selection.remaining_time == target_duration - best_total
+        # 選ばれた動画の合計が一致し、重複がない
+        assert sum(durations[i] for i in selection.indices) == best_total
+        assert len(set(selection.indices)) == len(selection.indices)
+
+
+def test_finds_exact_fit_missed_by_greedy():
+    """貪欲法では残り時間が出る場合でもちょうど収まる組み合わせを見つけることのテスト"""
+    durations = [290, 250, 200, 150, 110]
+
+    selections = find_best_fit_selections(durations, 600, 5, time_budget=5.0, rng=random.Random(0))
+
+    for selection in selections:
+        assert selection.remaining_time == 0
+        assert sorted(durations[i] for i in selection.indices) in ([150, 200, 250], [110, 200, 290])
+
+
+def test_samples_different_combinations():
+    """同じ合計を作る複数の組み合わせからランダムに選ばれることのテスト"""
+    durations = [100, 200, 300, 400, 500, 600]
+
+    found = set()
+    rng = random.Random(3)
+    for _ in range(30):
+        for selection in find_best_fit_selections(durations, 700, 1, time_budget=5.0, rng=rng):
+            found.add(frozenset(selection.indices))
+
+    # 100+600, 200+500, 300+400, 100+200+400 の4通り
+    assert len(found) == 4
+
+
+def test_returns_none_when_budget_exceeded():
+    """制限時間を超えた場合は None を返すことのテスト"""
+    # 7の倍数のみなので、60000秒ちょうどには到達せず全件の計算が必要になる
+    rng = random.Random(0)
+    durations = [rng.randint(10, 90) * 7 for _ in range(500)]
+
+    assert find_best_fit_selections(durations, 60000, 3, time_budget=0.0) is None
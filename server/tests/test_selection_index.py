@@ -0,0 +1,134 @@
+"""
+時間順インデックスによる動画選択のテスト
+"""
+import random
+
+import pytest
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.selection.index import DurationIndex
+from src.jaljalgotcha.video import select_videos
+
+
+def naive_select_videos(videos, target_duration, min_remaining=60):
+    """従来のフィルタリングと削除による選択処理（比較用）"""
+    available_videos = sorted(videos, key=lambda video: video.duration)
+    selected_videos = []
+    total_duration = 0
+    remaining_duration = target_duration
+
+    while remaining_duration > min_remaining and available_videos:
+        filtered_videos = [video for video in available_videos if video.duration <= remaining_duration]
+        if not filtered_videos:
+            break
+        selected_video = random.choice(filtered_videos)
+        selected_videos.append(selected_video)
+        total_duration += selected_video.duration
+        remaining_duration = target_duration - total_duration
+        available_videos.remove(selected_video)
+
+    return selected_videos, total_duration, remaining_duration
+
+
+@pytest.fixture
+def random_videos():
+    """重複する時間を含むランダムな動画データを提供するフィクスチャ"""
+    rng = random.Random(1234)
+    return [
+        Video(id=f"{i:04d}", title=f"動画{i}", duration=rng.randint(30, 600))
+        for i in range(300)
+    ]
+
+
+@pytest.mark.parametrize("target_duration", [60, 300, 1800, 60000])
+def test_select_matches_naive_implementation(random_videos, target_duration):
+    """同じ乱数シードで従来の実装と同じ結果になることのテスト"""
+    for seed in range(20):
+        random.seed(seed)
+        expected = naive_select_videos(random_videos, target_duration)
+
+        random.seed(seed)
+        result = select_videos(random_videos, target_duration)
+
+        assert [video.id for video in result.videos] == [video.id for video in expected[0]]
+        assert result.total_time == expected[1]
+        assert result.remaining_time == expected[2]
+
+
+def test_select_many_restores_state(random_videos):
+    """各試行が独立しており、使用済み状態が次の試行に残らないことのテスト"""
+    index = DurationIndex([video.duration for video in random_videos])
+
+    total_duration = sum(video.duration for video in random_videos)
+    selections = index.select_many(total_duration + 600, 5, rng=random.Random(0))
+
+    # 目標時間が全動画の合計より大きいので、毎回すべての動画が選ばれる
+    for selection in selections:
+        assert sorted(selection.indices) == list(range(len(random_videos)))
+        assert selection.total_time == total_duration
+
+
+def test_iter_select_matches_select_many(random_videos):
+    """1組ずつの生成が select_many と同じ結果になり、遅延して生成されることのテスト"""
+    index = DurationIndex([video.duration for video in random_videos])
+
+    expected = index.select_many(1800, 20, rng=random.Random(3))
+    assert list(index.iter_select(1800, 20, rng=random.Random(3))) == expected
+
+    # 組み合わせの数が非常に多くても最初の1組はすぐに得られる
+    assert next(index.iter_select(1800, 10 ** 12)).total_time <= 1800
+
+
+def test_select_respects_remaining_time():
+    """残り時間を超える動画が選ばれないことのテスト"""
+    index = DurationIndex([500, 400, 100, 50])
+
+    for seed in range(50):
+        selection = index.select(450, min_remaining=0, rng=random.Random(seed))
+        assert selection.total_time <= 450
+        assert selection.remaining_time == 450 - selection.total_time
+        assert 0 not in selection.indices
+
+
+def test_empty_index():
+    """動画がない場合は空の選択結果を返すことのテスト"""
+    selection = DurationIndex([]).select(600)
+
+    assert selection.indices == []
+    assert selection.total_time == 0
+    assert selection.remaining_time == 600
+
+
+def test_unit_weights_match_unweighted(random_videos):
+    """すべて重み1の場合は重みなしと同じ乱数の消費で同じ結果になることのテスト"""
+    durations = [video.duration for video in random_videos]
+    unweighted = DurationIndex(durations)
+    weighted = DurationIndex(durations, weights=[1] * len(durations))
+
+    assert weighted.select_many(1800, 20, rng=random.Random(5)) == unweighted.select_many(1800, 20, rng=random.Random(5))
+
+
+def test_weighted_select_is_proportional():
+    """重みに比例した確率で選ばれ、選択済みの動画と残り時間を超える動画は除外されることのテスト"""
+    index = DurationIndex([100, 100, 100, 500], weights=[1, 2, 7, 1000])
+    rng = random.Random(0)
+
+    counts = [0, 0, 0, 0]
+    for selection in index.iter_select(150, 20000, min_remaining=0, rng=rng):
+        # 1本選ぶと残り時間は50秒になり、2本目は選べない
+        assert len(selection.indices) == 1
+        counts[selection.indices[0]] += 1
+
+    assert counts[3] == 0
+    assert [round(count / 20000, 1) for count in counts[:3]] == [0.1, 0.2, 0.7]
+
+    # 目標時間がすべての合計以上なら、重みによらずすべての動画が1回ずつ選ばれる
+    selection = index.select(2000, min_remaining=0, rng=rng)
+    assert sorted(selection.indices) == [0, 1, 2, 3]
+
+
+def test_invalid_weights():
+    """重みの長さが合わない場合と1未満の重みはエラーになることのテスト"""
+    with pytest.raises(ValueError):
+        DurationIndex([100, 200], weights=[1])
+    with pytest.raises(ValueError):
+        DurationIndex([100, 200], weights=[1, 0])
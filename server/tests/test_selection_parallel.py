@@ -0,0 +1,148 @@
+"""
+プロセスプールを使用した組み合わせの並列生成のテスト
+"""
+import threading
+from array import array
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import MagicMock
+
+import pytest
+from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.selection.parallel import ParallelSelector, batch_seeds
+from src.jaljalgotcha.services.catalog import VideoCatalog
+from src.jaljalgotcha.services.video_service import VideoService
+from src.jaljalgotcha.video import VideoTable
+
+DURATIONS = array('i', [30 * i for i in range(1, 41)])
+
+
+def segment_exists(name):
+    """共有メモリが存在するかどうか（接続してすぐに閉じる）"""
+    try:
+        try:
+            shm = SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+@pytest.fixture(scope="module")
+def selector():
+    """2つのワーカープロセスのセレクタを提供するフィクスチャ（起動に時間がかかるためモジュールで共有する）"""
+    selector = ParallelSelector(max_workers=2, batch_size=100)
+    yield selector
+    selector.close()
+
+
+def test_results_are_sorted_and_valid(selector):
+    """すべての組み合わせが目標時間以内で、残り時間が少ない順に並ぶことのテスト"""
+    selections = selector.select_many(1, DURATIONS, 1200, 350, seed=0)
+
+    assert len(selections) == 350
+    remaining = [selection.remaining_time for selection in selections]
+    assert remaining == sorted(remaining)
+    for selection in selections:
+        assert len(set(selection.indices)) == len(selection.indices)
+        assert sum(DURATIONS[position] for position in selection.indices) == selection.total_time
+        assert selection.total_time + selection.remaining_time == 1200
+
+
+def test_same_seed_is_reproducible_across_worker_counts(selector):
+    """同じシードとバッチサイズからはワーカー数によらず同じ結果になることのテスト"""
+    single = ParallelSelector(max_workers=1, batch_size=100)
+    try:
+        expected = single.select_many(1, DURATIONS, 1200, 350, seed=42)
+    finally:
+        single.close()
+
+    assert selector.select_many(1, DURATIONS, 1200, 350, seed=42) == expected
+    assert selector.select_many(1, DURATIONS, 1200, 350, seed=43) != expected
+
+
+def test_top(selector):
+    """top を指定すると全体の上位 top 件だけを返すことのテスト"""
+    everything = selector.select_many(1, DURATIONS, 1200, 500, seed=7)
+
+    assert selector.select_many(1, DURATIONS, 1200, 500, seed=7, top=10) == everything[:10]
+
+
+def test_segment_per_catalog_version(selector):
+    """共有メモリはバージョンごとに1回だけ作成し、古いものは削除することのテスト"""
+    selector.select_many('a', DURATIONS, 600, 10, seed=0)
+    names = {version: shm.name for version, shm, _ in selector._segments}
+    selector.select_many('a', DURATIONS, 600, 10, seed=1)
+    assert {version: shm.name for version, shm, _ in selector._segments} == names
+
+    selector.select_many('b', array('i', [600]), 600, 10, seed=0)
+    selections = selector.select_many('c', array('i', [60]), 600, 10, seed=0)
+
+    assert [version for version, _, _ in selector._segments] == ['b', 'c']
+    # 新しいバージョンの動画時間から選ばれる
+    assert all(selection.indices == [0] and selection.total_time == 60 for selection in selections)
+
+
+def test_segment_in_use_is_not_unlinked():
+    """処理中のタスクが参照する共有メモリは、新しいバージョンで追い出されても処理が終わるまで削除しないことのテスト"""
+    selector = ParallelSelector(max_workers=1, batch_size=100)
+    future = Future()
+    selector._executor = MagicMock()
+    selector._executor.submit.return_value = future
+    results = []
+    worker = threading.Thread(target=lambda: results.append(selector.select_many('a', DURATIONS, 600, 10, seed=0)))
+    worker.start()
+    try:
+        while not selector._executor.submit.called:
+            worker.join(0.01)
+        name = selector._segments[0][1].name
+        with selector._lock:
+            selector._segment_for('b', array('i', [600]))
+            selector._segment_for('c', array('i', [60]))
+
+        assert [version for version, _, _ in selector._segments] == ['b', 'c']
+        # 追い出されたが処理中のため、ワーカーはまだ接続できる
+        assert segment_exists(name)
+    finally:
+        future.set_result([])
+        worker.join()
+
+    assert results == [[]]
+    assert selector._retired == {} and selector._in_use == {}
+    assert not segment_exists(name)
+    selector._executor = None
+    selector.close()
+
+
+def test_batch_seeds_are_independent():
+    """バッチごとのシードは異なり、同じ親のシードからは同じになることのテスト"""
+    seeds = batch_seeds(0, 4)
+
+    assert len({tuple(seed) for seed in seeds}) == 4
+    assert batch_seeds(0, 4) == seeds
+    assert batch_seeds(0, 2) == seeds[:2]
+
+
+def test_service_uses_parallel_selector_for_large_attempts():
+    """カタログ使用時のランダム選択で組み合わせの数が下限以上の場合だけ並列に生成することのテスト"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_video_table.return_value = VideoTable.from_videos([
+        Video(id=f"{i:03d}", title=f"サンプル動画{i}", duration=30 * i) for i in range(1, 21)
+    ])
+    catalog = VideoCatalog(mock_repo, refresh_interval=0)
+    catalog.refresh()
+    parallel = MagicMock(spec=ParallelSelector)
+    parallel.select_many.side_effect = lambda *args, **kwargs: catalog.snapshot.index.select_many(600, 5)
+    service = VideoService(mock_repo, catalog=catalog, parallel_selector=parallel, parallel_min_attempts=100)
+
+    assert len(service.get_video_combinations(600, attempts=5)) == 5
+    parallel.select_many.assert_not_called()
+
+    combinations = service.get_video_combinations(600, attempts=5, candidates=500)
+    assert len(combinations) == 5
+    parallel.select_many.assert_called_once_with(
+        catalog.snapshot.version, catalog.snapshot.durations, 600, 500, top=5
+    )
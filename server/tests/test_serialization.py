@@ -0,0 +1,112 @@
+"""
+JSON シリアライズと組み合わせのレスポンス組み立てのテスト
+"""
+import json
+import threading
+
+import pytest
+from flask import Flask, jsonify
+from src.jaljalgotcha.models import Video, VideoCollection
+from src.jaljalgotcha.serialization import CombinationRenderer, dumps, escape_non_ascii
+from src.jaljalgotcha.utils import video_collection_to_dict
+
+
+@pytest.fixture
+def combinations():
+    """ASCII 以外の文字やサムネイルのない動画を含む組み合わせを提供するフィクスチャ"""
+    videos = [
+        Video(id="001", title="サンプル動画1 🎬", duration=120, url="https://www.youtube.com/watch?v=001",
+              thumbnail_url="https://example.com/001.jpg"),
+        Video(id="002", title='引用符 " と \\ と改行\n', duration=3725, url="https://www.youtube.com/watch?v=002"),
+        Video(id="003", title="制御文字\x01\x7f ", duration=59, url="https://www.youtube.com/watch?v=003",
+              thumbnail_url="https://example.com/003.jpg"),
+    ]
+    return [
+        VideoCollection(videos=videos[:2], total_time=3845, remaining_time=0),
+        VideoCollection(videos=[videos[2]], total_time=59, remaining_time=90000),
+        VideoCollection(videos=[], total_time=0, remaining_time=600),
+    ]
+
+
+def jsonify_body(combinations):
+    """従来の jsonify によるレスポンス本文"""
+    with Flask(__name__).app_context():
+        return jsonify([video_collection_to_dict(combo) for combo in combinations]).get_data(as_text=True)
+
+
+def test_render_matches_jsonify(combinations):
+    """組み立てたレスポンスが jsonify の出力とバイト単位で一致することのテスト"""
+    renderer = CombinationRenderer()
+
+    assert renderer.render(combinations, catalog_version=1) == jsonify_body(combinations)
+    # キャッシュした断片から組み立てても同じ
+    assert renderer.render(combinations, catalog_version=1) == jsonify_body(combinations)
+
+
+def test_render_ignores_stale_fragments(combinations):
+    """内容が変わった動画にはキャッシュした断片が使われないことのテスト"""
+    renderer = CombinationRenderer()
+    renderer.render(combinations, catalog_version=1)
+
+    updated = Video(id="001", title="新しいタイトル", duration=120, url="https://www.youtube.com/watch?v=001")
+    changed = [VideoCollection(videos=[updated], total_time=120, remaining_time=480)]
+
+    assert renderer.render(changed, catalog_version=1) == jsonify_body(changed)
+
+
+def test_render_keeps_fragments_per_version(combinations):
+    """断片はバージョンごとに保持し、新旧のバージョンが交互でも作り直さず、古いバージョンから破棄することのテスト"""
+    renderer = CombinationRenderer()
+    renderer.render(combinations, catalog_version=1)
+    first = renderer._fragments_for(1)
+    assert len(first) == 3
+
+    renderer.render(combinations[1:2], catalog_version=2)
+    assert list(renderer._fragments_for(2)) == ["003"]
+    # 古いバージョンのリクエストが混在しても断片は残っている
+    assert renderer.render(combinations, catalog_version=1) == jsonify_body(combinations)
+    assert renderer._fragments_for(1) is first
+
+    renderer.render(combinations, catalog_version=3)
+    assert list(renderer._fragments_by_version) == [1, 3]
+    assert 2 not in renderer._fragments_by_version
+
+
+def test_render_from_threads(combinations):
+    """複数のスレッドから新旧のバージョンで同時に変換しても結果が正しいことのテスト"""
+    renderer = CombinationRenderer()
+    expected = jsonify_body(combinations)
+    results = []
+
+    def render(version):
+        for _ in range(50):
+            results.append(renderer.render(combinations, catalog_version=version))
+
+    threads = [threading.Thread(target=render, args=(version % 3,)) for version in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [expected] * 300
+
+
+@pytest.mark.parametrize("value", ["abc", "日本語", "🎬", "\x7f\x80 ", 'a"b\\c\n\t\x01'])
+def test_escape_non_ascii(value):
+    """ensure_ascii=False の出力をエスケープすると ensure_ascii=True の出力と一致することのテスト"""
+    assert escape_non_ascii(json.dumps(value, ensure_ascii=False)) == json.dumps(value)
+
+
+def test_dumps_format():
+    """キーがソートされ、区切りに空白が入らないことのテスト"""
+    assert dumps({"b": 1, "a": [1, "あ"]}) == '{"a":[1,"\\u3042"],"b":1}'
+
+
+def test_iter_render_matches_dicts(combinations):
+    """1つずつ変換した JSON が video_collection_to_dict と同じ内容になることのテスト"""
+    renderer = CombinationRenderer()
+
+    lines = list(renderer.iter_render(iter(combinations), catalog_version=1))
+
+    assert [json.loads(line) for line in lines] == [video_collection_to_dict(combo) for combo in combinations]
+    assert all("\n" not in line for line in lines)
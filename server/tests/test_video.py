@@ -2,7 +2,7 @@
 動画処理モジュールのテスト
 """
 import pytest
-from src.jaljalgotcha.models import Video
+from src.jaljalgotcha.models import StringColumn, Video, VideoTable
 from src.jaljalgotcha.video import (
     sort_videos_by_duration,
     filter_videos_by_max_duration,
@@ -84,3 +84,36 @@ def test_get_video_combinations(sample_videos):
     # 残り時間が少ない順にソートされていることを確認
     remaining_times = [combo.remaining_time for combo in combinations]
     assert remaining_times == sorted(remaining_times)
+
+
+def test_video_table_views(sample_videos):
+    """列指向の一覧から元の動画と同じ内容の Video が参照時に作られることのテスト"""
+    table = VideoTable.from_videos(sample_videos)
+
+    assert len(table) == 5
+    assert list(table.durations) == [120, 180, 300, 240, 150]
+    assert table.durations.itemsize == 4
+    assert table[2] == Video(id="003", title="サンプル動画3", duration=300,
+                             url="https://www.youtube.com/watch?v=003")
+    assert table[-1].id == "005"
+    assert [video.id for video in table[1:3]] == ["002", "003"]
+
+
+def test_string_column():
+    """None や空文字列を含む文字列の列が保持されることのテスト"""
+    column = StringColumn(["あいう", None, "", "xyz"])
+
+    assert list(column) == ["あいう", None, "", "xyz"]
+    assert column[-1] == "xyz"
+
+
+def test_get_video_combinations_on_table(sample_videos):
+    """選択処理が列指向の一覧に対してそのまま動くことのテスト"""
+    table = VideoTable.from_videos(sample_videos)
+
+    combinations = get_video_combinations(table, 600, attempts=3)
+
+    assert len(combinations) == 3
+    for combo in combinations:
+        assert all(isinstance(video, Video) for video in combo.videos)
+        assert combo.total_time == sum(video.duration for video in combo.videos) <= 600
@@ -0,0 +1,109 @@
+"""
+VideoCatalogのテスト
+"""
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock
+from src.jaljalgotcha.services.catalog import VideoCatalog
+from src.jaljalgotcha.services.video_service import VideoService
+from src.jaljalgotcha.repositories.interfaces import VideoRepository
+from src.jaljalgotcha.models import Video, VideoTable
+
+
+@pytest.fixture
+def mock_video_repository():
+    """モックビデオリポジトリを提供するフィクスチャ"""
+    mock_repo = MagicMock(spec=VideoRepository)
+    mock_repo.get_videos.return_value = [
+        Video(id="001", title="サンプル動画1", duration=120),  # 2分
+        Video(id="002", title="サンプル動画2", duration=180),  # 3分
+        Video(id="003", title="サンプル動画3", duration=300),  # 5分
+    ]
+    # カタログは列指向の一覧を読み込む（既定の実装と同じく get_videos の結果を変換する）
+    mock_repo.get_video_table.side_effect = lambda filters=None: VideoTable.from_videos(mock_repo.get_videos(filters))
+    return mock_repo
+
+
+@pytest.fixture
+def catalog(mock_video_repository):
+    """VideoCatalogのインスタンスを提供するフィクスチャ"""
+    return VideoCatalog(mock_video_repository, refresh_interval=0)
+
+
+def test_snapshot_loads_lazily(catalog, mock_video_repository):
+    """初回参照時に読み込まれ、以降はリポジトリを参照しないことのテスト"""
+    assert catalog.status() == {"loaded": False}
+
+    snapshot = catalog.snapshot
+    assert snapshot.version == 1
+    assert len(snapshot) == 3
+
+    # 2回目以降は同じスナップショットを返す
+    assert catalog.snapshot is snapshot
+    mock_video_repository.get_videos.assert_called_once()
+
+
+def test_concurrent_first_use_loads_once(catalog, mock_video_repository):
+    """未読み込みのカタログを同時に参照しても読み込みは1回だけであることのテスト"""
+    load = mock_video_repository.get_video_table.side_effect
+
+    def slow_load(filters=None):
+        time.sleep(0.05)
+        return load(filters)
+
+    mock_video_repository.get_video_table.side_effect = slow_load
+    snapshots = []
+    threads = [threading.Thread(target=lambda: snapshots.append(catalog.snapshot)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_video_repository.get_video_table.call_count == 1
+    assert {snapshot.version for snapshot in snapshots} == {1}
+
+
+def test_refresh_swaps_snapshot(catalog, mock_video_repository):
+    """再構築で新しいスナップショットに差し替わることのテスト"""
+    old_snapshot = catalog.snapshot
+    mock_video_repository.get_videos.return_value = [
+        Video(id="004", title="サンプル動画4", duration=240),
+    ]
+
+    new_snapshot = catalog.refresh()
+
+    # 古いスナップショットは変更されない
+    assert len(old_snapshot) == 3
+    assert new_snapshot.version == old_snapshot.version + 1
+    assert catalog.snapshot is new_snapshot
+    assert catalog.status()["video_count"] == 1
+
+
+def test_refresh_failure_keeps_previous_snapshot(mock_video_repository):
+    """再構築に失敗しても古いスナップショットを使い続けることのテスト"""
+    catalog = VideoCatalog(mock_video_repository, refresh_interval=0)
+    catalog.start()
+    snapshot = catalog.snapshot
+
+    mock_video_repository.get_videos.side_effect = RuntimeError("DB接続エラー")
+    with pytest.raises(RuntimeError):
+        catalog.refresh()
+
+    assert catalog.snapshot is snapshot
+
+
+def test_service_uses_catalog_without_filters(catalog, mock_video_repository):
+    """フィルターなしの場合はカタログを使用することのテスト"""
+    video_service = VideoService(mock_video_repository, catalog=catalog)
+
+    video_service.get_video_combinations(target_duration=600)
+    video_service.get_video_combinations(target_duration=600)
+
+    # カタログの初回読み込みの1回のみ
+    mock_video_repository.get_videos.assert_called_once()
+
+    # フィルター付きの場合はリポジトリを参照する
+    video_service.get_video_combinations(target_duration=600, filters={'min_likes': 100})
+    assert mock_video_repository.get_videos.call_count == 2
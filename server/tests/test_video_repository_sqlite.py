@@ -0,0 +1,245 @@
+"""
+DbVideoRepository の読み込みと一括保存のテスト（SQLite を使用）
+"""
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from src.jaljalgotcha.db.models_db import Base, VideoModel
+from src.jaljalgotcha.models import Video, VideoTable
+from src.jaljalgotcha.repositories import video_repository as video_repository_module
+from src.jaljalgotcha.repositories.video_repository import VIDEO_READ_COLUMNS, DbVideoRepository, UpsertResult
+from src.jaljalgotcha.services.catalog_filter import CatalogFilter
+
+
+def make_video(video_id, title=None, duration=120, view_count=1000, like_count=10):
+    """テスト用の VideoModel を生成する"""
+    return VideoModel(
+        video_id=video_id,
+        channel_id="channel1",
+        title=title or f"動画{video_id}",
+        duration_seconds=duration,
+        view_count=view_count,
+        like_count=like_count,
+        comment_count=1,
+        thumbnail_url=f"https://example.com/{video_id}.jpg",
+        published_at=datetime(2023, 1, 1, tzinfo=timezone.utc),
+        updated_at=datetime(2023, 1, 2)
+    )
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """SQLite のエンジンを提供するフィクスチャ"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'videos.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def repository(engine):
+    """SQLite を使用したリポジトリを提供するフィクスチャ"""
+    return DbVideoRepository(MagicMock(), db_engine=engine)
+
+
+def stored_videos(engine):
+    """保存されている動画を動画IDから行への辞書で返す"""
+    with engine.connect() as connection:
+        return {row.video_id: row for row in connection.execute(select(VideoModel.__table__))}
+
+
+@pytest.mark.parametrize("native_upsert", [True, False])
+def test_upsert_counts(repository, engine, monkeypatch, native_upsert):
+    """追加・更新・変更なしの件数が正しく返されることのテスト"""
+    if not native_upsert:
+        # ON CONFLICT に対応していないデータベースと同じ経路を通す
+        monkeypatch.setattr(video_repository_module, 'UPSERT_DIALECTS', {})
+
+    result = repository.upsert_videos([make_video(f"{i:03d}") for i in range(5)])
+    assert result == UpsertResult(inserted=5, updated=0, unchanged=0)
+
+    result = repository.upsert_videos([
+        make_video("000"),
+        make_video("001", title="新しいタイトル"),
+        make_video("002", view_count=5000),
+        make_video("005"),
+    ])
+    assert result == UpsertResult(inserted=1, updated=2, unchanged=1)
+    assert result.changed == 3
+
+    videos = stored_videos(engine)
+    assert len(videos) == 6
+    assert videos["001"].title == "新しいタイトル"
+    assert videos["002"].view_count == 5000
+    # 公開日時は UTC のタイムゾーンなし日時として保存される
+    assert videos["000"].published_at == datetime(2023, 1, 1)
+    # 変更がない動画も確認日時として updated_at が進む
+    assert videos["000"].updated_at > datetime(2023, 1, 2)
+
+
+def test_upsert_uses_few_statements(repository, engine):
+    """チャンクごとに少数の文で書き込まれることのテスト"""
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    repository.upsert_videos([make_video(f"{i:04d}") for i in range(1000)], chunk_size=500)
+
+    # チャンクごとに既存行の取得と INSERT ... ON CONFLICT の2文（カタログのバージョンの更新を除く）
+    assert len([
+        sql for sql in statements
+        if sql.lstrip().upper().startswith(('SELECT', 'INSERT')) and 'catalog_versions' not in sql
+    ]) == 4
+    assert len(stored_videos(engine)) == 1000
+
+
+def test_upsert_deduplicates_within_batch(repository, engine):
+    """同じバッチ内で重複した動画は後のものが採用されることのテスト"""
+    result = repository.upsert_videos([make_video("001", title="古い"), make_video("001", title="新しい")])
+
+    assert result == UpsertResult(inserted=1)
+    assert stored_videos(engine)["001"].title == "新しい"
+
+
+def test_save_video_uses_upsert(repository, engine):
+    """save_video と save_videos が一括保存と同じ経路で保存されることのテスト"""
+    video = make_video("001")
+    assert repository.save_video(video) is video
+
+    videos = [make_video("001", title="更新"), make_video("002")]
+    assert repository.save_videos(videos) == videos
+
+    stored = stored_videos(engine)
+    assert stored["001"].title == "更新"
+    assert set(stored) == {"001", "002"}
+
+
+@pytest.mark.parametrize("trust_rows", [True, False])
+def test_get_videos_builds_videos_from_rows(engine, trust_rows):
+    """選択した列（いいね数・再生数を含む）から Video が作成され、型変換の有無で結果が変わらないことのテスト"""
+    repository = DbVideoRepository(MagicMock(), db_engine=engine, trust_rows=trust_rows)
+    repository.upsert_videos([make_video("001", duration=300), make_video("002", duration=120)])
+
+    videos = repository.get_videos()
+
+    assert videos == [
+        Video(id="002", title="動画002", duration=120, url="https://www.youtube.com/watch?v=002",
+              thumbnail_url="https://example.com/002.jpg", like_count=10, view_count=1000),
+        Video(id="001", title="動画001", duration=300, url="https://www.youtube.com/watch?v=001",
+              thumbnail_url="https://example.com/001.jpg", like_count=10, view_count=1000),
+    ]
+    assert all(type(video.duration) is int for video in videos)
+
+
+def test_get_videos_with_filters(repository):
+    """フィルタリング条件と並び順が適用されることのテスト"""
+    repository.upsert_videos([
+        make_video("001", duration=100, view_count=10, like_count=5),
+        make_video("002", duration=200, view_count=20, like_count=50),
+        make_video("003", duration=300, view_count=30, like_count=500),
+        make_video("004", duration=400, view_count=40, like_count=5000),
+    ])
+
+    videos = repository.get_videos({'max_duration': 300, 'min_views': 20, 'order_by': 'likes', 'order_dir': 'desc'})
+    assert [video.id for video in videos] == ["003", "002"]
+
+    videos = repository.get_videos({'min_likes': 50, 'order_by': 'views'})
+    assert [video.id for video in videos] == ["002", "003", "004"]
+
+
+@pytest.mark.parametrize("filters", [
+    {'min_likes': 0},
+    {'min_likes': 1},
+    {'min_views': 0, 'max_duration': 250},
+    {'min_views': 15},
+])
+def test_null_counts_match_catalog_filter(repository, filters):
+    """いいね数・再生数が NULL の動画はカタログの絞り込みと同じく0として扱うことのテスト"""
+    repository.upsert_videos([
+        make_video("001", duration=100, view_count=None, like_count=None),
+        make_video("002", duration=200, view_count=20, like_count=5),
+        make_video("003", duration=300, view_count=0, like_count=0),
+    ])
+
+    table = repository.get_video_table()
+    expected = [table.ids[i] for i in CatalogFilter.from_filters(filters).positions(table)]
+
+    assert [video.id for video in repository.get_videos(filters)] == expected
+
+
+def test_get_videos_limit_offset(repository):
+    """limit と offset が適用されることのテスト"""
+    repository.upsert_videos([make_video(f"{i:03d}", duration=100 * i) for i in range(1, 6)])
+
+    assert [video.id for video in repository.get_videos({'limit': 2})] == ["001", "002"]
+    assert [video.id for video in repository.get_videos({'limit': 2, 'offset': 3})] == ["004", "005"]
+    assert [video.id for video in repository.get_videos({'offset': 4, 'order_by': 'duration', 'order_dir': 'desc'})] \
+        == ["001"]
+
+
+@pytest.mark.parametrize("filters", [
+    None,
+    {'max_duration': 400},
+    {'order_by': 'duration', 'order_dir': 'desc'},
+    {'limit': 7, 'offset': 2},
+    {'limit': 6, 'offset': 1, 'order_by': 'duration', 'order_dir': 'desc'},
+    {'order_by': 'likes', 'order_dir': 'desc'},
+    {'min_views': 3, 'order_by': 'views', 'limit': 4},
+])
+def test_iter_videos_matches_get_videos(repository, filters):
+    """ページに分けて読み込んでも get_videos と同じ動画が同じ順で返されることのテスト"""
+    repository.upsert_videos([
+        make_video(f"{i:03d}", duration=100 * (i % 4 + 1) + i, view_count=i, like_count=i) for i in range(10)
+    ])
+
+    videos = list(repository.iter_videos(filters, batch_size=3))
+
+    assert videos == repository.get_videos(filters)
+
+
+@pytest.mark.parametrize("filters", [
+    None,
+    {'order_by': 'duration', 'order_dir': 'desc'},
+    {'limit': 5, 'offset': 2},
+    {'limit': 5, 'offset': 3, 'order_by': 'duration', 'order_dir': 'desc'},
+])
+def test_iter_videos_matches_get_videos_with_ties(repository, filters):
+    """同じ時間の動画があっても get_videos と iter_videos が同じ順（時間、動画ID）になることのテスト"""
+    # 動画IDの順と挿入順が異なるようにする
+    repository.upsert_videos([make_video(f"{i:03d}", duration=100 * (i % 3)) for i in (7, 2, 9, 4, 0, 5, 1, 8, 3, 6)])
+
+    videos = repository.get_videos(filters)
+    expected = sorted(videos, key=lambda video: (video.duration, video.id),
+                      reverse=bool(filters and filters.get('order_dir') == 'desc'))
+
+    assert [video.id for video in videos] == [video.id for video in expected]
+    assert list(repository.iter_videos(filters, batch_size=2)) == videos
+    # インデックスの走査順によらず、SQL 文でも動画IDを並び順に含める
+    order_by = str(DbVideoRepository._filtered_select(VIDEO_READ_COLUMNS, filters)).split("ORDER BY")[1]
+    assert "videos.video_id" in order_by
+
+
+def test_iter_videos_reads_pages(repository, engine):
+    """時間順ではページごとに batch_size 件までを読み込むクエリを実行し、同じ時間の動画を動画ID順に返すことのテスト"""
+    repository.upsert_videos([make_video(f"{i:03d}", duration=100) for i in range(10)])
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    videos = repository.iter_videos(batch_size=4)
+    assert next(videos).id == "000"
+    assert len(statements) == 1
+
+    assert [video.id for video in videos] == [f"{i:03d}" for i in range(1, 10)]
+    assert len(statements) == 3
+    assert all("LIMIT" in statement for statement in statements)
+
+
+def test_get_video_table(repository):
+    """列指向の一覧が get_videos と同じ動画・同じ順で読み込まれることのテスト"""
+    repository.upsert_videos([make_video("001", duration=300), make_video("002", duration=120)])
+
+    table = repository.get_video_table({'max_duration': 600})
+
+    assert isinstance(table, VideoTable)
+    assert table.ids == ("002", "001")
+    assert list(table) == repository.get_videos({'max_duration': 600})
@@ -77,4 +77,84 @@ def test_db_specific_filters(video_service, mock_video_repository):
     converted_filters = args[0]
     assert converted_filters['max_duration'] == 300
     assert converted_filters['min_likes'] == 100
-    assert converted_filters['min_views'] == 1000
\ No newline at end of file
+    assert converted_filters['min_views'] == 1000
+
+def test_candidates_returns_best_attempts(video_service, mock_video_repository):
+    """候補数を指定した場合に上位 attempts 件が返されることのテスト"""
+    combinations = video_service.get_video_combinations(target_duration=600, attempts=2, candidates=50)
+    
+    # attempts 件の組み合わせが残り時間の少ない順に返される
+    assert len(combinations) == 2
+    assert combinations[0].remaining_time <= combinations[1].remaining_time
+    
+    # 120 + 180 + 300 = 600 秒の組み合わせが見つかる
+    assert combinations[0].remaining_time == 0
+    assert combinations[0].total_time == 600
+
+
+def test_best_fit_mode(mock_video_repository):
+    """最適化モードで残り時間が最小の組み合わせが返されることのテスト"""
+    mock_video_repository.get_videos.return_value = [
+        Video(id="001", title="サンプル動画1", duration=290),
+        Video(id="002", title="サンプル動画2", duration=250),
+        Video(id="003", title="サンプル動画3", duration=200),
+        Video(id="004", title="サンプル動画4", duration=150),
+    ]
+    video_service = VideoService(mock_video_repository, best_fit_time_budget=5.0)
+    
+    combinations = video_service.get_video_combinations(target_duration=600, mode='best_fit')
+    
+    # 150 + 200 + 250 = 600 秒の組み合わせのみ
+    assert len(combinations) == 3
+    for combo in combinations:
+        assert combo.remaining_time == 0
+        assert sorted(video.id for video in combo.videos) == ["002", "003", "004"]
+
+
+def test_best_fit_falls_back_to_random(mock_video_repository):
+    """最適化モードが制限時間を超えた場合にランダム選択に切り替わることのテスト"""
+    video_service = VideoService(mock_video_repository, best_fit_time_budget=0.0)
+    mock_video_repository.get_videos.return_value = [
+        Video(id=f"{i:03d}", title=f"サンプル動画{i}", duration=(10 + i) * 7) for i in range(100)
+    ]
+    
+    combinations = video_service.get_video_combinations(target_duration=6000, mode='best_fit')
+    
+    assert len(combinations) == 3
+    for combo in combinations:
+        assert combo.total_time <= 6000
+
+
+def test_unknown_mode(video_service):
+    """不明な選択モードでエラーになることのテスト"""
+    with pytest.raises(ValueError):
+        video_service.get_video_combinations(target_duration=600, mode='unknown')
+
+
+def test_popularity_weighting(mock_video_repository):
+    """重み付けを指定した場合にいいね数・再生数が多い動画ほど選ばれやすいことのテスト"""
+    mock_video_repository.get_videos.return_value = [
+        Video(id="001", title="人気の動画", duration=120, like_count=10 ** 6, view_count=0),
+        Video(id="002", title="再生数の多い動画", duration=120, like_count=0, view_count=10 ** 6),
+        Video(id="003", title="普通の動画", duration=120),
+    ]
+    video_service = VideoService(mock_video_repository)
+
+    def first_picks(weighting, **kwargs):
+        combinations = video_service.get_video_combinations(
+            target_duration=150, attempts=3000, weighting=weighting, **kwargs
+        )
+        return [combo.videos[0].id for combo in combinations]
+
+    likes = first_picks('likes')
+    assert likes.count("001") > likes.count("002") * 2
+    views = first_picks('views')
+    assert views.count("002") > views.count("001") * 2
+    # 候補の一括生成でも重み付きのインデックスを使用する
+    assert len(first_picks('likes', candidates=4000)) == 3000
+
+
+def test_unknown_weighting(video_service):
+    """不明な重み付けでエラーになることのテスト"""
+    with pytest.raises(ValueError):
+        video_service.get_video_combinations(target_duration=600, weighting='unknown')